@@ -0,0 +1,124 @@
+'''
+Time the game loop spends in OnlineManager.update() with the server up,
+slow, or down, next to the round trip times and failed requests the
+manager's NetworkDiagnostics saw.
+
+Each scenario registers one OnlineManager, then runs a 60 FPS loop that
+moves the player every frame:
+
+    up    server.py
+    slow  a stub server that registers instantly but answers everything
+          else after `--delay` seconds, and has no /exchange or /stream,
+          so positions go out as individual POSTs
+    down  server.py, killed right after registering
+
+    python -m benchmarks.client_frame_time --duration 5 --delay 1
+'''
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.common import start_server, stop_server, free_port, percentile
+from src.utils import GameSettings, Direction
+
+FPS = 60
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 1.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/register"):
+            self._reply(200, {"id": 0})
+            return
+        if self.path.startswith("/stream"):
+            self._reply(404, {"error": "not_found"})
+            return
+        time.sleep(self.delay)
+        self._reply(200, {"epoch": 1, "seq": 0, "players": {}, "removed": [], "full": True})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        if self.path.startswith("/exchange"):
+            self._reply(404, {"error": "not_found"})
+            return
+        time.sleep(self.delay)
+        self._reply(200, {"success": True})
+
+    def _reply(self, code: int, obj: dict) -> None:
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def run_frames(manager, duration: float) -> list[float]:
+    # Seconds spent inside update() per frame
+    costs = []
+    x = 0.0
+    interval = 1.0 / FPS
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        frame_start = time.perf_counter()
+        x += 4.0
+        manager.update(x, 100.0, "map.tmx", Direction.RIGHT)
+        costs.append(time.perf_counter() - frame_start)
+        time.sleep(max(0.0, interval - (time.perf_counter() - frame_start)))
+    return costs
+
+def scenario(name: str, args: argparse.Namespace) -> None:
+    # Imported late so GameSettings is set before the manager reads it
+    from src.core.managers.online_manager import OnlineManager
+
+    proc = server = None
+    if name == "slow":
+        SlowHandler.delay = args.delay
+        server = ThreadingHTTPServer(("127.0.0.1", free_port()), SlowHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+    else:
+        proc, port = start_server()
+    GameSettings.ONLINE_SERVER_URL = f"http://127.0.0.1:{port}"
+
+    manager = OnlineManager()
+    manager.enter()
+    if name == "down":
+        stop_server(proc)
+        proc = None
+    time.sleep(0.5)
+    try:
+        costs = run_frames(manager, args.duration)
+    finally:
+        manager.exit()
+        if proc is not None:
+            stop_server(proc)
+        if server is not None:
+            server.shutdown()
+
+    ms = [c * 1000 for c in costs]
+    net = manager.diagnostics.snapshot()
+    print(f"{name:>6}{len(ms):>8}{percentile(ms, 50):>10.3f}{percentile(ms, 99):>10.3f}{max(ms):>10.3f}"
+          f"{manager.sent_updates:>8}{manager.collapsed_updates:>11}"
+          f"{net['rtt_p50_ms']:>10.1f}{net['rtt_p99_ms']:>10.1f}{net['failures']:>8}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of frames per scenario")
+    parser.add_argument("--delay", type=float, default=1.0, help="response delay of the slow server")
+    parser.add_argument("--scenarios", nargs="+", choices=["up", "slow", "down"], default=["up", "slow", "down"])
+    args = parser.parse_args()
+
+    print(f"{'server':>6}{'frames':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'sent':>8}{'collapsed':>11}"
+          f"{'rtt p50':>10}{'rtt p99':>10}{'failed':>8}")
+    for name in args.scenarios:
+        scenario(name, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+'''
+Share of frames dead reckoning still sends while the real Player walks.
+
+A Player is driven by held keys along a fixed route at 60 FPS, its dt taken
+from pygame's Clock.tick() like the game loop does, and every frame is
+handed to an OnlineManager registered with server.py. The route walks
+straight, turns, walks diagonally and stops, so each run includes the
+updates that direction changes force out. Fails with exit code 1 when more
+than --max-ratio of the frames were sent.
+
+    python -m benchmarks.dead_reckoning --modes stream poll --max-ratio 0.1
+'''
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame as pg
+
+from benchmarks.common import start_server, stop_server
+from src.utils import GameSettings
+
+FPS = 60
+# Held keys and for how many seconds
+ROUTE = (
+    ((pg.K_d,), 2.0),
+    ((pg.K_s,), 1.0),
+    ((pg.K_d, pg.K_s), 1.0),
+    ((), 0.5),
+    ((pg.K_a,), 1.5),
+)
+
+class OpenMap:
+    """Stands in for the current map: no walls, no teleports."""
+    path_name = "map.tmx"
+
+    def check_collision(self, rect: pg.Rect) -> bool:
+        return False
+
+    def check_teleport(self, position) -> None:
+        return None
+
+class Walker:
+    current_map: OpenMap
+
+    def __init__(self):
+        self.current_map = OpenMap()
+
+def run(mode: str, port: int) -> tuple[int, int]:
+    # Imported late so GameSettings is set before the manager reads it
+    from src.core.managers.online_manager import OnlineManager
+    from src.core.services import input_manager
+    from src.entities.player import Player
+
+    GameSettings.ONLINE_SERVER_URL = f"http://127.0.0.1:{port}"
+    GameSettings.ONLINE_STREAMING = mode == "stream"
+    manager = OnlineManager()
+    manager.enter()
+    walker = Walker()
+    player = Player(10 * GameSettings.TILE_SIZE, 10 * GameSettings.TILE_SIZE, walker)
+    frames = 0
+    try:
+        deadline = time.monotonic() + 5.0
+        while manager.player_id == -1 or (mode == "stream" and not manager.is_streaming):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"OnlineManager did not connect in {mode} mode")
+            time.sleep(0.05)
+        clock = pg.time.Clock()
+        clock.tick(FPS)
+        reckoned = manager.reckoned_updates
+        for keys, seconds in ROUTE:
+            for key in keys:
+                input_manager.handle_events(pg.event.Event(pg.KEYDOWN, key=key))
+            end = time.monotonic() + seconds
+            while time.monotonic() < end:
+                dt = clock.tick(FPS) / 1000
+                player.update(dt)
+                manager.update(player.position.x, player.position.y, walker.current_map.path_name,
+                               player.direction, player.velocity)
+                frames += 1
+            for key in keys:
+                input_manager.handle_events(pg.event.Event(pg.KEYUP, key=key))
+        sent = frames - (manager.reckoned_updates - reckoned)
+    finally:
+        manager.exit()
+    return frames, sent
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=["stream", "poll"], default=["stream", "poll"])
+    parser.add_argument("--max-ratio", type=float, default=0.1, help="most frames that may be sent, as a share")
+    args = parser.parse_args()
+
+    pg.init()
+    pg.display.set_mode((1, 1))
+    proc, port = start_server()
+    failed = False
+    try:
+        print(f"{'mode':>8}{'frames':>8}{'sent':>8}{'ratio':>8}")
+        for mode in args.modes:
+            frames, sent = run(mode, port)
+            ratio = sent / frames if frames else 1.0
+            failed = failed or ratio > args.max_ratio
+            print(f"{mode:>8}{frames:>8}{sent:>8}{ratio:>8.1%}")
+    finally:
+        stop_server(proc)
+        pg.quit()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
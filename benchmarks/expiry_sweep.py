@@ -0,0 +1,58 @@
+'''
+Lock hold time of one expiry sweep: the old full scan against the expiry queue.
+
+Most players are active; `--idle` of them have been silent for longer than
+the timeout and are due on this sweep.
+
+    python -m benchmarks.expiry_sweep --players 1000 10000 100000
+'''
+import argparse
+import random
+import time
+from collections import OrderedDict
+
+from server.playerHandler import PlayerHandler
+
+def make_handler(n_players: int, idle: float, timeout: float, seed: int) -> PlayerHandler:
+    rng = random.Random(seed)
+    handler = PlayerHandler(timeout_seconds=timeout)
+    for _ in range(n_players):
+        handler.register()
+    now = time.monotonic()
+    for p in handler.players.values():
+        if rng.random() < idle:
+            p.last_update = now - timeout - rng.uniform(0, 10)
+        else:
+            p.last_update = now - rng.uniform(0, timeout / 2)
+    # Rebuild the queue in deadline order, as steady state would have it
+    ordered = sorted(handler.players.values(), key=lambda p: p.last_update)
+    handler._expiry = OrderedDict((p.id, p.last_update + timeout) for p in ordered)
+    return handler
+
+def full_scan(handler: PlayerHandler) -> tuple[int, float]:
+    # The cleaner before the expiry queue: compare every player under the lock
+    with handler._lock:
+        start = time.perf_counter()
+        now = time.monotonic()
+        to_remove = [pid for pid, p in handler.players.items() if now - p.last_update >= handler.timeout]
+        for pid in to_remove:
+            handler._remove_locked(pid)
+        return len(to_remove), time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--idle", type=float, default=0.01, help="fraction of players that expire")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"{'players':>8}{'expired':>9}{'scan hold ms':>14}{'queue hold ms':>15}{'examined':>10}")
+    for n in args.players:
+        expired, scan_hold = full_scan(make_handler(n, args.idle, args.timeout, seed=n))
+        handler = make_handler(n, args.idle, args.timeout, seed=n)
+        handler.sweep()
+        stats = handler.last_sweep
+        print(f"{n:>8}{expired:>9}{scan_hold * 1000:>14.2f}{stats.lock_hold * 1000:>15.3f}{stats.examined:>10}")
+
+if __name__ == "__main__":
+    main()
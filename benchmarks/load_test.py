@@ -0,0 +1,443 @@
+'''
+Headless load test: thousands of simulated players against server.py.
+
+Every simulated player speaks the OnlineManager protocol: GET /register once,
+then each cycle POST /players with its position and GET /players, at `--rate`
+cycles per second. Players walk the walkable tiles of map.tmx and gym.tmx at
+the game's walking speed, pausing now and then like a real player would.
+
+The report covers throughput, latency percentiles per endpoint, error rate
+and the server's CPU and memory, read from /proc (Linux only). Save a run
+with --save and compare later runs against it with --baseline:
+
+    python -m benchmarks.load_test --players 1000 --duration 30 --save baseline.json
+    python -m benchmarks.load_test --players 1000 --duration 30 --baseline baseline.json
+
+By default the harness starts its own server.py; --server-args are passed to
+it. Point --url at a running server instead to test that one (pass its
+--server-pid to still get CPU and memory).
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pytmx
+
+from benchmarks.common import ROOT_DIR, start_server, stop_server, percentile
+from server.protocol import pack_dir
+
+# Same numbers as GameSettings.TILE_SIZE and the Player entity's walking speed
+TILE_SIZE = 64
+WALK_SPEED = 4.0 * TILE_SIZE * 1.5
+
+MAPS = {"map.tmx": 0.8, "gym.tmx": 0.2}
+# A request still unanswered after this long counts as an error
+REQUEST_TIMEOUT = 10.0
+STEPS = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+
+# ----------------------------------------------------------------------
+# Walking paths
+# ----------------------------------------------------------------------
+def load_walkable(map_name: str) -> list[tuple[int, int]]:
+    """Tiles not covered by a collision or house layer, as src.maps.Map decides."""
+    tmx = pytmx.TiledMap(str(ROOT_DIR / "assets" / "maps" / map_name))
+    blocked = set()
+    for layer in tmx.visible_layers:
+        if isinstance(layer, pytmx.TiledTileLayer) and ("collision" in layer.name.lower() or "house" in layer.name.lower()):
+            blocked.update((x, y) for x, y, gid in layer if gid != 0)
+    return [(x, y) for x in range(tmx.width) for y in range(tmx.height) if (x, y) not in blocked]
+
+class Walker:
+    """Tile by tile random walk: mostly keeps its heading, turns at walls, idles sometimes."""
+    map_name: str
+    x: float
+    y: float
+    direction: str
+    moving: bool
+
+    _walkable: set[tuple[int, int]]
+    _rng: random.Random
+    _tile: tuple[int, int]
+    _target: tuple[int, int]
+    _idle: float
+
+    def __init__(self, map_name: str, tiles: list[tuple[int, int]], rng: random.Random):
+        self.map_name = map_name
+        self._walkable = set(tiles)
+        self._rng = rng
+        self._tile = self._target = rng.choice(tiles)
+        self.x, self.y = self._tile[0] * TILE_SIZE, self._tile[1] * TILE_SIZE
+        self.direction = rng.choice(list(STEPS))
+        self.moving = False
+        self._idle = rng.uniform(0.0, 2.0)
+
+    def advance(self, dt: float) -> None:
+        while dt > 0:
+            if self._idle > 0:
+                spent = min(dt, self._idle)
+                self._idle -= spent
+                dt -= spent
+                self.moving = False
+                continue
+            if self._target == self._tile and not self._choose_next():
+                self._idle = self._rng.uniform(0.5, 2.0)
+                continue
+            self.moving = True
+            tx, ty = self._target[0] * TILE_SIZE, self._target[1] * TILE_SIZE
+            remaining = abs(tx - self.x) + abs(ty - self.y)
+            step = min(remaining, WALK_SPEED * dt)
+            dx, dy = STEPS[self.direction]
+            self.x += dx * step
+            self.y += dy * step
+            dt -= step / WALK_SPEED
+            if step >= remaining:
+                self.x, self.y = tx, ty
+                self._tile = self._target
+                if self._rng.random() < 0.03:
+                    self._idle = self._rng.uniform(0.5, 3.0)
+
+    def _choose_next(self) -> bool:
+        # Keep walking straight most of the time so paths look like a player's
+        options = [d for d in STEPS if self._neighbour(d) in self._walkable]
+        if not options:
+            return False
+        if self.direction not in options or self._rng.random() < 0.15:
+            self.direction = self._rng.choice(options)
+        self._target = self._neighbour(self.direction)
+        return True
+
+    def _neighbour(self, direction: str) -> tuple[int, int]:
+        dx, dy = STEPS[direction]
+        return (self._tile[0] + dx, self._tile[1] + dy)
+
+    @property
+    def dir_byte(self) -> int:
+        return pack_dir(self.direction, self.moving)
+
+# ----------------------------------------------------------------------
+# Minimal HTTP/1.1 client on asyncio streams, cheap enough for thousands of players
+# ----------------------------------------------------------------------
+class HttpError(Exception):
+    pass
+
+class Connection:
+    host: str
+    port: int
+    keep_alive: bool
+    _reader: asyncio.StreamReader | None
+    _writer: asyncio.StreamWriter | None
+
+    def __init__(self, host: str, port: int, keep_alive: bool):
+        self.host = host
+        self.port = port
+        self.keep_alive = keep_alive
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b"") -> tuple[int, bytes]:
+        if self._writer is None:
+            try:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                raise HttpError(str(e)) from e
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+        if body:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        if not self.keep_alive:
+            head += "Connection: close\r\n"
+        try:
+            self._writer.write(head.encode("ascii") + b"\r\n" + body)
+            status, data = await asyncio.wait_for(self._read_response(), REQUEST_TIMEOUT)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+            await self.close()
+            raise HttpError(str(e)) from e
+        if not self.keep_alive:
+            await self.close()
+        return status, data
+
+    async def _read_response(self) -> tuple[int, bytes]:
+        status_line = await self._reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, await self._reader.readexactly(length)
+
+    async def close(self) -> None:
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+# ----------------------------------------------------------------------
+# Simulated players
+# ----------------------------------------------------------------------
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: {"register": [], "post": [], "get": []})
+    errors: dict[str, int] = field(default_factory=lambda: {"register": 0, "post": 0, "get": 0})
+    bytes_received: int = 0
+    # Cycles before this moment belong to the ramp-up and are not recorded
+    measure_from: float = 0.0
+
+async def timed(conn: Connection, results: Results, kind: str, method: str, path: str, body: bytes = b"") -> bytes | None:
+    t0 = time.perf_counter()
+    try:
+        status, data = await conn.request(method, path, body)
+    except HttpError:
+        results.errors[kind] += 1
+        return None
+    if status != 200:
+        results.errors[kind] += 1
+        return None
+    if kind == "register" or time.monotonic() >= results.measure_from:
+        results.latencies[kind].append(time.perf_counter() - t0)
+        results.bytes_received += len(data)
+    return data
+
+async def simulate_player(host: str, port: int, walker: Walker, args: argparse.Namespace,
+                          results: Results, deadline: float) -> None:
+    conn = Connection(host, port, args.keep_alive)
+    data = await timed(conn, results, "register", "GET", "/register")
+    if data is None:
+        await conn.close()
+        return
+    pid = json.loads(data)["id"]
+
+    interval = 1.0 / args.rate
+    # Spread the players over the cycle instead of firing them in lockstep
+    await asyncio.sleep(random.uniform(0, interval))
+    last = time.monotonic()
+    try:
+        while time.monotonic() < deadline:
+            cycle_start = time.monotonic()
+            walker.advance(cycle_start - last)
+            last = cycle_start
+            body = json.dumps({
+                "id": pid, "x": walker.x, "y": walker.y,
+                "map": walker.map_name, "dir": walker.dir_byte,
+            }).encode("utf-8")
+            await timed(conn, results, "post", "POST", "/players", body)
+            await timed(conn, results, "get", "GET", "/players")
+            spent = time.monotonic() - cycle_start
+            if spent < interval:
+                await asyncio.sleep(interval - spent)
+    finally:
+        await conn.close()
+
+async def ramp_and_run(host: str, port: int, walkers: list[Walker], args: argparse.Namespace, results: Results) -> None:
+    start = time.monotonic()
+    results.measure_from = start + args.ramp
+    deadline = results.measure_from + args.duration
+    tasks = []
+    for i, walker in enumerate(walkers):
+        # Players join evenly over the ramp-up like a lobby filling up
+        delay = start + args.ramp * i / max(1, len(walkers)) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(simulate_player(host, port, walker, args, results, deadline)))
+    await asyncio.gather(*tasks)
+
+# ----------------------------------------------------------------------
+# Server CPU and memory from /proc
+# ----------------------------------------------------------------------
+class ProcSampler:
+    """
+    Samples CPU time and resident memory of a process and its children (the
+    workers of --mode processes) once per second. Memory is summed, so pages
+    shared between the processes count more than once.
+    """
+    pid: int
+    rss_samples: list[int]
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.rss_samples = []
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._cpu_start = self._cpu_seconds()
+        self._wall_start = time.monotonic()
+
+    @staticmethod
+    def _stat(pid: int) -> list[str] | None:
+        try:
+            # Fields after the command name, which may itself contain spaces
+            return Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+
+    def _children(self) -> list[int]:
+        children = []
+        for entry in Path("/proc").iterdir():
+            if entry.name.isdigit():
+                fields = self._stat(int(entry.name))
+                # ppid is field 4 of stat
+                if fields is not None and int(fields[1]) == self.pid:
+                    children.append(int(entry.name))
+        return children
+
+    def _cpu_seconds(self) -> float:
+        fields = self._stat(self.pid)
+        if fields is None:
+            return float("nan")
+        # utime, stime, cutime and cstime, fields 14 to 17 of stat
+        total = sum(int(f) for f in fields[11:15])
+        for child in self._children():
+            child_fields = self._stat(child)
+            if child_fields is not None:
+                total += int(child_fields[11]) + int(child_fields[12])
+        return total / self._ticks
+
+    def sample(self) -> None:
+        rss = 0
+        for pid in (self.pid, *self._children()):
+            try:
+                for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                    if line.startswith("VmRSS:"):
+                        rss += int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        self.rss_samples.append(rss)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            self.sample()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    def summary(self) -> dict:
+        cpu = self._cpu_seconds() - self._cpu_start
+        wall = time.monotonic() - self._wall_start
+        return {
+            "cpu_seconds": cpu,
+            "cpu_percent": 100.0 * cpu / wall if wall > 0 else float("nan"),
+            "rss_peak_mb": max(self.rss_samples, default=0) / 2**20,
+            "rss_end_mb": (self.rss_samples[-1] if self.rss_samples else 0) / 2**20,
+        }
+
+# ----------------------------------------------------------------------
+# Report
+# ----------------------------------------------------------------------
+def summarize(results: Results, elapsed: float, args: argparse.Namespace, server: dict | None) -> dict:
+    summary = {
+        "players": args.players, "rate": args.rate, "duration": elapsed,
+        "keep_alive": args.keep_alive, "server_args": args.server_args,
+        "bytes_received": results.bytes_received, "endpoints": {},
+    }
+    total_ok = total_err = 0
+    for kind, values in results.latencies.items():
+        errors = results.errors[kind]
+        total_ok += len(values)
+        total_err += errors
+        summary["endpoints"][kind] = {
+            "requests": len(values), "errors": errors,
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1e3,
+            "p90_ms": percentile(values, 90) * 1e3,
+            "p99_ms": percentile(values, 99) * 1e3,
+            "max_ms": max(values, default=float("nan")) * 1e3,
+        }
+    summary["throughput"] = total_ok / elapsed
+    summary["error_rate"] = total_err / max(1, total_ok + total_err)
+    summary["server"] = server
+    return summary
+
+def print_report(summary: dict, baseline: dict | None) -> None:
+    def delta(value: float, before: float | None) -> str:
+        if before is None or before != before or before == 0:
+            return ""
+        return f" ({(value - before) / before * 100:+.0f}%)"
+
+    base_eps = (baseline or {}).get("endpoints", {})
+    print(f"{summary['players']} players at {summary['rate']:g} cycles/s for {summary['duration']:.1f} s"
+          f"{', keep-alive' if summary['keep_alive'] else ''}")
+    print(f"  {'endpoint':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for kind, ep in summary["endpoints"].items():
+        print(f"  {kind:<10}{ep['requests']:>10}{ep['errors']:>8}{ep['throughput']:>10.1f}"
+              f"{ep['p50_ms']:>9.2f}{ep['p90_ms']:>9.2f}{ep['p99_ms']:>9.2f}{ep['max_ms']:>9.2f}")
+        before = base_eps.get(kind)
+        if before:
+            print(f"  {'':<10}{'':>10}{'':>8}{delta(ep['throughput'], before['throughput']):>10}"
+                  f"{delta(ep['p50_ms'], before['p50_ms']):>9}{delta(ep['p90_ms'], before['p90_ms']):>9}"
+                  f"{delta(ep['p99_ms'], before['p99_ms']):>9}{delta(ep['max_ms'], before['max_ms']):>9}")
+    base = baseline or {}
+    print(f"  throughput {summary['throughput']:.1f} req/s{delta(summary['throughput'], base.get('throughput'))}, "
+          f"error rate {summary['error_rate'] * 100:.2f}%, received {summary['bytes_received'] / 2**20:.1f} MiB")
+    server = summary["server"]
+    if server:
+        before = base.get("server") or {}
+        print(f"  server cpu {server['cpu_percent']:.0f}%{delta(server['cpu_percent'], before.get('cpu_percent'))}, "
+              f"rss peak {server['rss_peak_mb']:.1f} MiB{delta(server['rss_peak_mb'], before.get('rss_peak_mb'))}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=10.0, help="POST + GET cycles per player per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured at full load, after the ramp-up")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which players join")
+    parser.add_argument("--keep-alive", action="store_true",
+                        help="reuse one connection per player, as OnlineManager's requests.Session does; "
+                             "without it every request opens a new connection, like older clients")
+    parser.add_argument("--server-args", default="", help="extra arguments for the spawned server.py")
+    parser.add_argument("--url", help="test an already running server instead of spawning one")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url server, for CPU and memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="write the results as JSON, e.g. to record a baseline")
+    parser.add_argument("--baseline", type=Path, help="compare against results written by --save")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tiles = {name: load_walkable(name) for name in MAPS}
+    names = rng.choices(list(MAPS), weights=list(MAPS.values()), k=args.players)
+    walkers = [Walker(name, tiles[name], rng) for name in names]
+
+    proc = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port, server_pid = url.hostname or "127.0.0.1", url.port or 80, args.server_pid
+    else:
+        proc, port = start_server(*shlex.split(args.server_args))
+        host, server_pid = "127.0.0.1", proc.pid
+
+    async def run() -> dict | None:
+        sampler = ProcSampler(server_pid) if server_pid else None
+        stop = asyncio.Event()
+        sampling = asyncio.create_task(sampler.run(stop)) if sampler else None
+        await ramp_and_run(host, port, walkers, args, results)
+        stop.set()
+        if sampling:
+            await sampling
+        return sampler.summary() if sampler else None
+
+    results = Results()
+    try:
+        server = asyncio.run(run())
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+    summary = summarize(results, args.duration, args, server)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_report(summary, baseline)
+    if args.save:
+        args.save.write_text(json.dumps(summary, indent=2))
+        print(f"saved to {args.save}")
+
+if __name__ == "__main__":
+    main()
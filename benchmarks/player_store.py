@@ -0,0 +1,90 @@
+'''
+Per-operation cost of the dict-of-Players table (with its expiry queue and
+grid index) against the vectorized NumPy store (PlayerHandler(vectorized=True)).
+
+Players are spread over a few maps; `--idle` of them are past the timeout.
+Times are microseconds per call, averaged over `--repeat` calls.
+
+    python -m benchmarks.player_store --players 1000 10000 100000
+'''
+import argparse
+import random
+import time
+
+from server.playerHandler import PlayerHandler
+
+MAPS = ("map.tmx", "gym.tmx", "new_map.tmx", "house.tmx")
+MAP_SIZE = 64 * 64
+RADIUS = 1000.0
+
+def make_handler(n_players: int, vectorized: bool, idle: float, timeout: float, seed: int) -> PlayerHandler:
+    rng = random.Random(seed)
+    handler = PlayerHandler(timeout_seconds=timeout, grid_cell_size=None if vectorized else RADIUS,
+                            vectorized=vectorized)
+    for _ in range(n_players):
+        pid = handler.register()
+        handler.update(pid, rng.uniform(0, MAP_SIZE), rng.uniform(0, MAP_SIZE), rng.choice(MAPS), 0)
+    # Age the players in registration order so the expiry queue stays sorted
+    now = time.monotonic()
+    n_idle = int(n_players * idle)
+    with handler._lock:
+        for i, p in enumerate(handler.players.values()):
+            if i < n_idle:
+                p.last_update = now - timeout - 1
+            handler._touch_locked(p)
+    return handler
+
+def per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def measure(n_players: int, vectorized: bool, args: argparse.Namespace) -> dict[str, float]:
+    rng = random.Random(n_players)
+    handler = make_handler(n_players, vectorized, args.idle, args.timeout, seed=n_players)
+    pids = list(handler.players)
+    results = {}
+
+    def update():
+        handler.update(rng.choice(pids), rng.uniform(0, MAP_SIZE), rng.uniform(0, MAP_SIZE), rng.choice(MAPS), 1)
+    results["update"] = per_call(update, args.repeat * 10)
+
+    def area():
+        handler.area_state(rng.choice(MAPS), rng.uniform(0, MAP_SIZE), rng.uniform(0, MAP_SIZE), RADIUS)
+    results["area"] = per_call(area, args.repeat)
+
+    def on_map():
+        with handler._lock:
+            if vectorized:
+                handler._arrays.on_map(handler._array_map_ids[MAPS[0]]).tolist()
+            else:
+                list(handler._by_map[MAPS[0]])
+    results["on_map"] = per_call(on_map, args.repeat)
+
+    since = handler._seq - args.repeat * 10
+    results["changes"] = per_call(lambda: handler.changes_since(since, handler.epoch), args.repeat)
+
+    # One sweep that expires the idle players, then steady state sweeps with nothing due
+    results["sweep_due"] = per_call(handler.sweep, 1)
+    results["sweep_idle"] = per_call(handler.sweep, args.repeat)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--idle", type=float, default=0.01, help="fraction of players that expire")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    columns = ("update", "area", "on_map", "changes", "sweep_due", "sweep_idle")
+    print(f"{'players':>8}{'store':>8}" + "".join(f"{c + ' us':>14}" for c in columns))
+    for n in args.players:
+        for vectorized in (False, True):
+            results = measure(n, vectorized, args)
+            store = "numpy" if vectorized else "dict"
+            print(f"{n:>8}{store:>8}" + "".join(f"{results[c]:>14.1f}" for c in columns))
+
+if __name__ == "__main__":
+    main()
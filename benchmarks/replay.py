@@ -0,0 +1,516 @@
+'''
+Replays an online session recorded with GameSettings.ONLINE_RECORD_PATH
+(see src/core/managers/session_recorder.py), standing in for either side:
+
+    serve    a fake server answering from the recording, for running the
+             game or any client against it:
+                 python -m benchmarks.replay serve session.rec --port 8989
+    client   an OnlineManager driven with the recorded positions against
+             that fake server, reporting frame cost and network diagnostics:
+                 python -m benchmarks.replay client session.rec --speed 4
+    clients  `--clients` fake clients sending the recorded requests and
+             stream frames to server.py, reporting latency per endpoint:
+                 python -m benchmarks.replay clients session.rec --clients 50 --speed 4
+
+`--speed` replays the recorded timeline that many times faster.
+
+The fake server answers each request with the recorded response to the same
+method and path that was current at that point of the timeline, after the
+recorded server time, so a client that polls at a different rate still sees
+the recorded players. Each stream connection replays the next recorded
+stream session. Fake clients take the ids server.py gives them, and binary
+updates are re-sent with map names, since the map ids of the recorded
+server mean nothing to a fresh one.
+'''
+import argparse
+import bisect
+import http.client
+import json
+import shlex
+import socket
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlencode, parse_qsl
+
+from benchmarks.common import start_server, stop_server, percentile
+from server.protocol import (
+    FrameReader, ProtocolError, encode_frame, STREAM_PATH, STREAM_UPGRADE,
+    BINARY_CONTENT_TYPE, MAP_UNKNOWN, decode_state, decode_updates, encode_update, unpack_dir,
+)
+from src.core.managers.session_recorder import read_recording, decode_body
+
+FPS = 60
+REQUEST_TIMEOUT = 10.0
+
+def endpoint(method: str, path: str) -> str:
+    return f"{method} {urlsplit(path).path}"
+
+def stream_sessions(events: list[dict]) -> list[list[dict]]:
+    """The recorded stream connections, each as the events from its "open" on."""
+    sessions = []
+    current = None
+    for event in events:
+        if event["kind"] == "open":
+            current = [event]
+            sessions.append(current)
+        elif event["kind"] == "close":
+            current = None
+        elif current is not None and event["kind"] in ("send", "recv"):
+            current.append(event)
+    return sessions
+
+# ----------------------------------------------------------------------
+# Fake server
+# ----------------------------------------------------------------------
+class Recording:
+    """Recorded answers by endpoint and time, shared by the fake server's handler threads."""
+    speed: float
+    # Recorded HTTP events per endpoint, with their times for bisecting
+    answers: dict[str, list[dict]]
+    times: dict[str, list[float]]
+    sessions: list[list[dict]]
+
+    _origin: float | None
+    _connections: int
+    _lock: threading.Lock
+
+    def __init__(self, events: list[dict], speed: float):
+        self.speed = speed
+        self.answers = defaultdict(list)
+        self.times = defaultdict(list)
+        t0 = events[0]["t"] if events else 0.0
+        for event in events:
+            if event["kind"] == "http":
+                key = endpoint(event["method"], event["path"])
+                self.answers[key].append(event)
+                self.times[key].append(event["t"] - t0)
+        self.sessions = stream_sessions(events)
+        self._origin = None
+        self._connections = 0
+        self._lock = threading.Lock()
+
+    def answer(self, method: str, path: str) -> dict | None:
+        key = endpoint(method, path)
+        times = self.times.get(key)
+        if not times:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            # The timeline starts with the first request, like the recording did
+            if self._origin is None:
+                self._origin = now
+            elapsed = (now - self._origin) * self.speed
+        index = max(0, bisect.bisect_right(times, elapsed) - 1)
+        return self.answers[key][index]
+
+    def next_session(self) -> list[dict] | None:
+        if not self.sessions:
+            return None
+        with self._lock:
+            session = self.sessions[self._connections % len(self.sessions)]
+            self._connections += 1
+        return session
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    recording: Recording
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == STREAM_PATH and self.headers.get("Upgrade") == STREAM_UPGRADE:
+            self._stream()
+            return
+        self._replay()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        self._replay()
+
+    def _replay(self) -> None:
+        event = self.recording.answer(self.command, self.path)
+        if event is None:
+            data = json.dumps({"error": "not_found"}).encode("utf-8")
+            self.send_response(404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        # Took as long as the recorded server did
+        time.sleep(event.get("elapsed", 0.0) / self.recording.speed)
+        data = decode_body(event.get("response"))
+        self.send_response(event["status"])
+        for name, value in event.get("headers", {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self) -> None:
+        session = self.recording.next_session()
+        if session is None:
+            self._replay()
+            return
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Upgrade", STREAM_UPGRADE)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        sock = self.connection
+        send_lock = threading.Lock()
+        closed = threading.Event()
+
+        def send(msg: dict) -> None:
+            with send_lock:
+                sock.sendall(encode_frame(msg))
+
+        def answer_pings() -> None:
+            reader = FrameReader(sock)
+            try:
+                while (msg := reader.read()) is not None:
+                    if msg.get("type") == "ping":
+                        send({"type": "pong"})
+            except (OSError, ProtocolError):
+                pass
+            closed.set()
+
+        sock.settimeout(None)
+        threading.Thread(target=answer_pings, daemon=True).start()
+        opened = session[0]["t"]
+        started = time.monotonic()
+        try:
+            for event in session[1:]:
+                # Pongs are answered live, pings are the client's business
+                if event["kind"] != "recv" or event["msg"].get("type") in ("ping", "pong"):
+                    continue
+                delay = (event["t"] - opened) / self.recording.speed - (time.monotonic() - started)
+                if closed.wait(max(0.0, delay)):
+                    return
+                send(event["msg"])
+            closed.wait()
+        except OSError:
+            pass
+
+def start_fake_server(events: list[dict], speed: float, port: int = 0) -> ThreadingHTTPServer:
+    handler = type("Handler", (ReplayHandler,), {"recording": Recording(events, speed)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ----------------------------------------------------------------------
+# Replaying the client side
+# ----------------------------------------------------------------------
+def local_updates(events: list[dict]) -> list[tuple[float, float, float, str, int, tuple[float, float] | None]]:
+    """(t, x, y, map, direction byte, velocity) of every position the recorded client sent."""
+    updates = []
+    maps: list[str] = []
+    for event in events:
+        t = event["t"]
+        if event["kind"] == "send" and event["msg"].get("type") == "position":
+            msg = event["msg"]
+            velocity = (msg["vx"], msg["vy"]) if "vx" in msg else None
+            updates.append((t, msg["x"], msg["y"], msg["map"], msg.get("dir", 0), velocity))
+            continue
+        if event["kind"] != "http":
+            continue
+        response = event.get("response")
+        if response and response.get("type") == BINARY_CONTENT_TYPE:
+            maps = decode_state(decode_body(response))["maps"]
+        request = event.get("request")
+        if not request or event["method"] != "POST":
+            continue
+        body = decode_body(request)
+        if request.get("type") == BINARY_CONTENT_TYPE:
+            for _, x, y, map_id, direction, name, velocity in decode_updates(body):
+                name = name or (maps[map_id] if map_id < len(maps) else "")
+                updates.append((t, x, y, name, direction, velocity))
+        else:
+            data = json.loads(body)
+            for u in data.get("updates", [data]):
+                if "x" in u:
+                    velocity = (u["vx"], u["vy"]) if "vx" in u else None
+                    updates.append((t, u["x"], u["y"], u["map"], u.get("dir", 0), velocity))
+    return updates
+
+def run_client(events: list[dict], args: argparse.Namespace) -> None:
+    # Imported late so GameSettings is set before the manager reads it
+    from src.utils import GameSettings, Direction, Position
+    from src.core.managers.online_manager import OnlineManager
+
+    updates = local_updates(events)
+    if not updates:
+        raise SystemExit("the recording has no positions sent by the client")
+    server = start_fake_server(events, args.speed)
+    GameSettings.ONLINE_SERVER_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    GameSettings.ONLINE_RECORD_PATH = ""
+    # Only try /stream if the recorded client streamed
+    GameSettings.ONLINE_STREAMING = bool(stream_sessions(events))
+
+    t0 = events[0]["t"]
+    times = [(u[0] - t0) / args.speed for u in updates]
+    duration = times[-1]
+    manager = OnlineManager()
+    manager.enter()
+    costs = []
+    seen = 0
+    try:
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < duration:
+            frame_start = time.perf_counter()
+            _, x, y, map_name, dir_byte, velocity = updates[max(0, bisect.bisect_right(times, elapsed) - 1)]
+            name, _ = unpack_dir(dir_byte)
+            manager.update(x, y, map_name, Direction[name.upper()],
+                           Position(*velocity) if velocity is not None else None)
+            costs.append(time.perf_counter() - frame_start)
+            seen = max(seen, len(manager.get_list_players()))
+            time.sleep(max(0.0, 1.0 / FPS - (time.perf_counter() - frame_start)))
+    finally:
+        manager.exit()
+        server.shutdown()
+
+    ms = [c * 1000 for c in costs]
+    net = manager.diagnostics.snapshot()
+    print(f"replayed {duration:.1f} s: {len(updates)} recorded positions, {len(ms)} frames")
+    print(f"update() p50 {percentile(ms, 50):.3f} ms  p99 {percentile(ms, 99):.3f} ms  max {max(ms):.3f} ms")
+    print(f"rtt p50 {net['rtt_p50_ms']:.1f} ms  p99 {net['rtt_p99_ms']:.1f} ms  requests {net['requests']}  "
+          f"failed {net['failures']}  in {net['bytes_in']} B  out {net['bytes_out']} B  remote players {seen}")
+
+# ----------------------------------------------------------------------
+# Fake clients against server.py
+# ----------------------------------------------------------------------
+class Results:
+    latencies: dict[str, list[float]]
+    errors: dict[str, int]
+    frames_sent: int
+    frames_received: int
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.frames_sent = 0
+        self.frames_received = 0
+        self._lock = threading.Lock()
+
+    def frame(self, sent: bool) -> None:
+        with self._lock:
+            if sent:
+                self.frames_sent += 1
+            else:
+                self.frames_received += 1
+
+    def add(self, key: str, seconds: float | None) -> None:
+        with self._lock:
+            if seconds is None:
+                self.errors[key] += 1
+            else:
+                self.latencies[key].append(seconds * 1000)
+
+class ReplayClient:
+    """One fake client: the recorded requests and stream frames, sent under its own player id."""
+    host: str
+    port: int
+    speed: float
+    results: Results
+    player_id: int | None
+
+    _events: list[dict]
+    _conn: http.client.HTTPConnection
+    _maps: list[str]
+    _stream: socket.socket | None
+
+    def __init__(self, events: list[dict], host: str, port: int, speed: float, results: Results):
+        self._events = events
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.results = results
+        self.player_id = None
+        self._conn = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+        self._maps = []
+        self._stream = None
+
+    def run(self, stop: threading.Event) -> None:
+        t0 = self._events[0]["t"]
+        start = time.monotonic()
+        try:
+            for event in self._events:
+                delay = (event["t"] - t0) / self.speed - (time.monotonic() - start)
+                if stop.wait(max(0.0, delay)):
+                    return
+                kind = event["kind"]
+                if kind == "http":
+                    self._request(event)
+                elif kind == "open":
+                    self._open_stream()
+                elif kind == "send" and self._stream is not None:
+                    self._send(event["msg"])
+                elif kind == "close":
+                    self._close_stream()
+        finally:
+            self._close_stream()
+            self._conn.close()
+
+    def _request(self, event: dict) -> None:
+        response = event.get("response")
+        if response and response.get("type") == BINARY_CONTENT_TYPE:
+            # Map table of the recorded server, to name the maps in binary updates
+            self._maps = decode_state(decode_body(response))["maps"]
+        path, body, headers = self._remap(event)
+        key = endpoint(event["method"], path)
+        started = time.perf_counter()
+        try:
+            self._conn.request(event["method"], path, body=body or None, headers=headers)
+            resp = self._conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self._conn.close()
+            self.results.add(key, None)
+            return
+        self.results.add(key, time.perf_counter() - started if resp.status < 500 else None)
+        if urlsplit(path).path == "/register" and resp.status == 200:
+            self.player_id = json.loads(data)["id"]
+
+    def _remap(self, event: dict) -> tuple[str, bytes, dict]:
+        parts = urlsplit(event["path"])
+        query = [(k, str(self.player_id) if k == "id" else v) for k, v in parse_qsl(parts.query)]
+        path = parts.path + (f"?{urlencode(query)}" if query else "")
+        request = event.get("request")
+        if not request:
+            return path, b"", {}
+        body = decode_body(request)
+        headers = {"Content-Type": request.get("type", "application/json")}
+        if request.get("type") == BINARY_CONTENT_TYPE:
+            body = b"".join(
+                encode_update(self.player_id or 0, x, y, MAP_UNKNOWN, direction,
+                              name or (self._maps[map_id] if map_id < len(self._maps) else ""), velocity)
+                for _, x, y, map_id, direction, name, velocity in decode_updates(body)
+            )
+        elif self.player_id is not None:
+            data = json.loads(body)
+            if "id" in data:
+                data["id"] = self.player_id
+                body = json.dumps(data).encode("utf-8")
+        return path, body, headers
+
+    def _open_stream(self) -> None:
+        self._close_stream()
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=REQUEST_TIMEOUT)
+            sock.sendall(
+                f"GET {STREAM_PATH} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Connection: Upgrade\r\nUpgrade: {STREAM_UPGRADE}\r\n\r\n".encode("ascii")
+            )
+            response = b""
+            while b"\r\n\r\n" not in response:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise ProtocolError("connection closed during upgrade")
+                response += chunk
+            head, rest = response.split(b"\r\n\r\n", 1)
+            if b" 101 " not in head.split(b"\r\n", 1)[0] + b" ":
+                raise ProtocolError("upgrade refused")
+        except (OSError, ProtocolError):
+            self.results.add("stream", None)
+            return
+        sock.settimeout(None)
+        self._stream = sock
+        threading.Thread(target=self._read_stream, args=(sock, rest), daemon=True).start()
+
+    def _read_stream(self, sock: socket.socket, initial: bytes) -> None:
+        reader = FrameReader(sock, initial)
+        try:
+            while reader.read() is not None:
+                self.results.frame(sent=False)
+        except (OSError, ProtocolError):
+            pass
+
+    def _send(self, msg: dict) -> None:
+        if msg.get("type") == "hello":
+            msg = {**msg, "id": self.player_id}
+        try:
+            self._stream.sendall(encode_frame(msg))
+        except OSError:
+            self.results.add("stream", None)
+            self._close_stream()
+            return
+        self.results.frame(sent=True)
+
+    def _close_stream(self) -> None:
+        sock, self._stream = self._stream, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+def run_clients(events: list[dict], args: argparse.Namespace) -> None:
+    proc = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname or "127.0.0.1", url.port or 80
+    else:
+        proc, port = start_server(*shlex.split(args.server_args))
+        host = "127.0.0.1"
+
+    results = Results()
+    stop = threading.Event()
+    clients = [ReplayClient(events, host, port, args.speed, results) for _ in range(args.clients)]
+    threads = [threading.Thread(target=c.run, args=(stop,), daemon=True) for c in clients]
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        if proc is not None:
+            stop_server(proc)
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.clients} clients replayed {elapsed:.1f} s")
+    print(f"{'endpoint':<22}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for key in sorted(results.latencies.keys() | results.errors.keys()):
+        ms = results.latencies.get(key, [])
+        print(f"{key:<22}{len(ms):>8}{percentile(ms, 50):>10.2f}{percentile(ms, 99):>10.2f}{results.errors.get(key, 0):>8}")
+    if results.frames_sent or results.frames_received:
+        print(f"stream frames sent {results.frames_sent}, received {results.frames_received}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["serve", "client", "clients"])
+    parser.add_argument("recording", help="file written with ONLINE_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay this many times faster than recorded")
+    parser.add_argument("--port", type=int, default=8989, help="port of the fake server (serve)")
+    parser.add_argument("--clients", type=int, default=10, help="fake clients (clients)")
+    parser.add_argument("--url", help="server to replay against instead of starting server.py (clients)")
+    parser.add_argument("--server-args", default="", help="arguments for the started server.py (clients)")
+    args = parser.parse_args()
+
+    events = read_recording(args.recording)
+    if not events:
+        raise SystemExit(f"{args.recording} holds no events")
+    if args.mode == "serve":
+        server = start_fake_server(events, args.speed, args.port)
+        print(f"replaying {len(events)} events on http://127.0.0.1:{server.server_address[1]}, Ctrl-C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif args.mode == "client":
+        run_client(events, args)
+    else:
+        run_clients(events, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+'''
+Request latency of server.py against the number of simulated clients.
+
+Every simulated client behaves like OnlineManager: it registers once, then
+each cycle POSTs its position and GETs /players over one keep-alive
+connection, pacing itself to `--rate` cycles per second.
+
+    python -m benchmarks.server_latency --modes single pool --clients 1 8 32 64
+'''
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+
+from benchmarks.common import start_server, stop_server, percentile
+
+def run_client(port: int, rate: float, stop: threading.Event, latencies: list[float], errors: list[int]) -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    try:
+        conn.request("GET", "/register")
+        pid = json.loads(conn.getresponse().read())["id"]
+    except (OSError, http.client.HTTPException, ValueError, KeyError):
+        errors.append(1)
+        return
+
+    x, y = random.uniform(0, 2000), random.uniform(0, 1000)
+    interval = 1.0 / rate
+    local: list[float] = []
+    while not stop.is_set():
+        cycle_start = time.perf_counter()
+        x += random.choice((-4, 0, 4))
+        y += random.choice((-4, 0, 4))
+        body = json.dumps({"id": pid, "x": x, "y": y, "map": "map.tmx"})
+        try:
+            t0 = time.perf_counter()
+            conn.request("POST", "/players", body=body, headers=headers)
+            conn.getresponse().read()
+            t1 = time.perf_counter()
+            conn.request("GET", "/players")
+            conn.getresponse().read()
+            t2 = time.perf_counter()
+            local.append(t1 - t0)
+            local.append(t2 - t1)
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+        spent = time.perf_counter() - cycle_start
+        if spent < interval:
+            stop.wait(interval - spent)
+    conn.close()
+    latencies.extend(local)
+
+def measure(port: int, n_clients: int, duration: float, rate: float) -> tuple[list[float], int]:
+    stop = threading.Event()
+    latencies: list[float] = []
+    errors: list[int] = []
+    threads = [
+        threading.Thread(target=run_client, args=(port, rate, stop, latencies, errors), daemon=True)
+        for _ in range(n_clients)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=15)
+    return latencies, len(errors)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["single", "threaded", "pool"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 8, 32, 64])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per measurement")
+    parser.add_argument("--rate", type=float, default=50.0, help="POST+GET cycles per client per second")
+    parser.add_argument("--workers", type=int, default=128)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'clients':>8}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode in args.modes:
+        proc, port = start_server("--mode", mode, "--workers", str(args.workers))
+        try:
+            for n in args.clients:
+                latencies, errors = measure(port, n, args.duration, args.rate)
+                print(
+                    f"{mode:<10}{n:>8}{len(latencies):>10}{len(latencies) / args.duration:>10.0f}"
+                    f"{percentile(latencies, 50) * 1000:>10.2f}{percentile(latencies, 99) * 1000:>10.2f}{errors:>8}",
+                    flush=True
+                )
+        finally:
+            stop_server(proc)
+
+if __name__ == "__main__":
+    main()
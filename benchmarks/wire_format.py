@@ -0,0 +1,86 @@
+'''
+Bytes and encode/decode time of the JSON and binary /players encodings.
+
+Measures both directions: the state a poll returns (server encodes, client
+decodes) and a single position update (client encodes, server decodes).
+
+    python -m benchmarks.wire_format --players 10 100 1000
+'''
+import argparse
+import json
+import random
+import timeit
+
+from server.protocol import (
+    encode_state, decode_state, encode_update, decode_update, pack_dir, DIRECTIONS,
+)
+
+MAPS = ["map.tmx", "gym.tmx"]
+
+def make_state(n_players: int) -> dict:
+    players = {}
+    for pid in range(n_players):
+        players[pid] = {
+            "id": pid,
+            "x": random.randrange(0, 66) * 64 + random.choice((0.0, 16.5, 32.25)),
+            "y": random.randrange(0, 39) * 64 + random.choice((0.0, 16.5, 32.25)),
+            "map": random.choice(MAPS),
+            "dir": pack_dir(random.choice(DIRECTIONS), random.random() < 0.5),
+        }
+    return {"epoch": 123456, "seq": 98765, "players": players, "removed": [], "full": True}
+
+def per_call(fn, number: int) -> float:
+    return timeit.timeit(fn, number=number) / number
+
+def bench_state(n_players: int, number: int) -> None:
+    state = make_state(n_players)
+    json_body = json.dumps(state).encode("utf-8")
+    binary_body = encode_state(state, MAPS)
+
+    json_encode = per_call(lambda: json.dumps(state).encode("utf-8"), number)
+    binary_encode = per_call(lambda: encode_state(state, MAPS), number)
+    json_decode = per_call(lambda: json.loads(json_body), number)
+    binary_decode = per_call(lambda: decode_state(binary_body), number)
+
+    print(f"state, {n_players} players")
+    print(f"  {'':<8}{'bytes':>10}{'B/player':>10}{'encode us':>12}{'decode us':>12}")
+    for name, body, enc, dec in (
+        ("json", json_body, json_encode, json_decode),
+        ("binary", binary_body, binary_encode, binary_decode),
+    ):
+        print(f"  {name:<8}{len(body):>10}{len(body) / max(1, n_players):>10.1f}{enc * 1e6:>12.1f}{dec * 1e6:>12.1f}")
+    print(f"  binary is {len(json_body) / len(binary_body):.1f}x smaller, "
+          f"{json_encode / binary_encode:.1f}x encode, {json_decode / binary_decode:.1f}x decode")
+
+def bench_update(number: int) -> None:
+    body = {"id": 4242, "x": 1234.25, "y": 567.5, "map": "map.tmx", "dir": pack_dir("left", True)}
+    json_body = json.dumps(body).encode("utf-8")
+    binary_body = encode_update(4242, 1234.25, 567.5, 0, body["dir"])
+
+    def parse_json():
+        data = json.loads(json_body.decode("utf-8"))
+        return int(data["id"]), float(data["x"]), float(data["y"]), str(data["map"]), int(data["dir"])
+
+    json_encode = per_call(lambda: json.dumps(body).encode("utf-8"), number)
+    binary_encode = per_call(lambda: encode_update(4242, 1234.25, 567.5, 0, body["dir"]), number)
+    json_decode = per_call(parse_json, number)
+    binary_decode = per_call(lambda: decode_update(binary_body), number)
+
+    print("single position update")
+    print(f"  {'':<8}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+    print(f"  {'json':<8}{len(json_body):>10}{json_encode * 1e6:>12.2f}{json_decode * 1e6:>12.2f}")
+    print(f"  {'binary':<8}{len(binary_body):>10}{binary_encode * 1e6:>12.2f}{binary_decode * 1e6:>12.2f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--number", type=int, default=200, help="repetitions per timing")
+    args = parser.parse_args()
+
+    random.seed(0)
+    for n in args.players:
+        bench_state(n, args.number)
+    bench_update(args.number * 50)
+
+if __name__ == "__main__":
+    main()
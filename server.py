@@ -1,40 +1,140 @@
-from server.playerHandler import PlayerHandler
+from server.playerHandler import PlayerHandler, Update, TIMEOUT_TIME, CHECK_INTERVAL_TIME, SNAPSHOT_INTERVAL, TICK_RATE
+from server.playerStore import PlayerStore, FLUSH_INTERVAL, SNAPSHOT_INTERVAL as STORE_SNAPSHOT_INTERVAL
+from server.httpServer import PooledHTTPServer, create_server, fork_workers, DEFAULT_WORKERS
+from server.sharedPlayerTable import SharedPlayerTable, TableFullError, DEFAULT_CAPACITY
+from server.snapshot import Snapshot
+from server.protocol import (
+    STREAM_PATH, STREAM_UPGRADE, BINARY_CONTENT_TYPE, MAP_UNKNOWN,
+    ProtocolError, encode_state, decode_update, decode_updates,
+)
+from server.streamSession import StreamSession
+from server.metrics import Counter, Histogram, render as render_metrics
+from server.accessLog import AccessLog
+from server.rateLimiter import RateLimiter, UPDATE_RATE, UPDATE_BURST
 
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import argparse
 import json
+import math
+import os
+import signal
+import time
 PORT = 8989
+IDLE_TIMEOUT = 30.0
+# Spatial grid cell for area of interest queries, in pixels (8 tiles)
+GRID_CELL_SIZE = 512.0
+
+# Log one request in this many, 0 for none
+ACCESS_LOG_SAMPLE = 100
+
+PLAYER_HANDLER = PlayerHandler(grid_cell_size=GRID_CELL_SIZE)
+ACCESS_LOG = AccessLog(ACCESS_LOG_SAMPLE)
+RATE_LIMITER: RateLimiter | None = RateLimiter()
+
+ROUTES = ("/", "/register", "/players", "/exchange", "/metrics", STREAM_PATH)
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REQUESTS = Counter("monstergo_http_requests_total", "HTTP requests by route and status", ("method", "route", "code"))
+REQUEST_LATENCY = Histogram("monstergo_http_request_duration_seconds", "Time to handle a request, streams excluded",
+                            ("method", "route"))
 
-PLAYER_HANDLER = PlayerHandler()
-PLAYER_HANDLER.start()
-    
 class Handler(BaseHTTPRequestHandler):
-    # def log_message(self, fmt, *args):
-    #     return
+    # Keep-alive: every response carries a Content-Length
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = IDLE_TIMEOUT
+    disable_nagle_algorithm = True
+
+    _status: int
+
+    def log_request(self, code="-", size="-"):
+        if ACCESS_LOG.sampled():
+            super().log_request(code, size)
+
+    def log_message(self, fmt, *args):
+        ACCESS_LOG.info(f"{self.address_string()} - - [{self.log_date_time_string()}] {fmt % args}")
+
+    def log_error(self, fmt, *args):
+        ACCESS_LOG.error(f"{self.address_string()} - - [{self.log_date_time_string()}] {fmt % args}")
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
 
     def do_GET(self):
-        if self.path == "/":
+        self._measured("GET", self._get)
+
+    def do_POST(self):
+        self._measured("POST", self._post)
+
+    def _measured(self, method: str, handle) -> None:
+        start = time.perf_counter()
+        self._status = 0
+        try:
+            handle()
+        finally:
+            route = urlsplit(self.path).path
+            if route not in ROUTES:
+                route = "other"
+            REQUESTS.inc(method, route, str(self._status))
+            if route != STREAM_PATH:
+                REQUEST_LATENCY.observe(time.perf_counter() - start, method, route)
+
+    def _get(self):
+        url = urlsplit(self.path)
+        path = url.path
+        query = parse_qs(url.query)
+
+        if path == "/":
             self._json(200, {"status": "ok"})
             return
-            
-        if self.path == "/register":
-            pid = PLAYER_HANDLER.register()
+
+        if path == "/register":
+            try:
+                pid = PLAYER_HANDLER.register()
+            except TableFullError:
+                self._json(503, {"error": "server_full"})
+                return
             self._json(200, {"message": "registration successful", "id": pid})
             return
 
-        if self.path == "/players":
-            self._json(200, {"players": PLAYER_HANDLER.list_players()})
+        if path == "/players":
+            self._players(query)
+            return
+
+        if path == STREAM_PATH:
+            self._stream()
+            return
+
+        if path == "/metrics":
+            body = render_metrics([
+                REQUESTS, REQUEST_LATENCY, *PLAYER_HANDLER.metrics(),
+                *([RATE_LIMITER.rejected] if RATE_LIMITER else []),
+            ])
+            self._send_bytes(200, body, METRICS_CONTENT_TYPE)
             return
 
         self._json(404, {"error": "not_found"})
 
-    def do_POST(self):
-        if self.path != "/players":
+    def _post(self):
+        # Always consume the body so the kept-alive connection stays in sync
+        length = int(self.headers.get("Content-Length", "0"))
+        body = self.rfile.read(length)
+
+        url = urlsplit(self.path)
+        if url.path == "/exchange":
+            self._exchange(body, parse_qs(url.query))
+            return
+
+        if url.path != "/players":
             self._json(404, {"error": "not_found"})
             return
 
-        length = int(self.headers.get("Content-Length", "0"))
+        if self.headers.get("Content-Type", "") == BINARY_CONTENT_TYPE:
+            self._post_binary(body)
+            return
+
         try:
-            body = self.rfile.read(length)
             data = json.loads(body.decode("utf-8"))
         except Exception:
             self._json(400, {"error": "invalid_json"})
@@ -50,26 +150,296 @@ class Handler(BaseHTTPRequestHandler):
             x = float(data["x"])
             y = float(data["y"])
             map_name = str(data["map"])
-        except (ValueError, TypeError):
+            direction = int(data["dir"]) & 0xFF if "dir" in data else None
+            velocity = (float(data["vx"]), float(data["vy"])) if "vx" in data else None
+        except (ValueError, TypeError, KeyError):
             self._json(400, {"error": "bad_fields"})
             return
+        if self._rate_limited(pid):
+            return
 
-        ok = PLAYER_HANDLER.update(pid, x, y, map_name)
+        ok = PLAYER_HANDLER.update(pid, x, y, map_name, direction, velocity)
         if not ok:
             self._json(404, {"error": "player_not_found"})
             return
 
         self._json(200, {"success": True})
 
+    def _post_binary(self, body: bytes) -> None:
+        try:
+            pid, x, y, map_id, direction, map_name, velocity = decode_update(body)
+        except ProtocolError:
+            self._json(400, {"error": "bad_fields"})
+            return
+        if self._rate_limited(pid):
+            return
+        if map_id != MAP_UNKNOWN:
+            map_name = PLAYER_HANDLER.map_name(map_id)
+            if map_name is None:
+                self._json(400, {"error": "unknown_map"})
+                return
+
+        if not PLAYER_HANDLER.update(pid, x, y, map_name, direction, velocity):
+            self._json(404, {"error": "player_not_found"})
+            return
+        self._send_bytes(204, b"", BINARY_CONTENT_TYPE)
+
+    def _exchange(self, body: bytes, query: dict[str, list[str]]) -> None:
+        # One round trip: apply the client's queued updates, then answer like GET /players
+        # with the same query parameters
+        try:
+            if self.headers.get("Content-Type", "") == BINARY_CONTENT_TYPE:
+                pid, updates = self._decode_binary_updates(body, query)
+            else:
+                data = json.loads(body.decode("utf-8"))
+                pid = int(data["id"])
+                updates = [
+                    (
+                        float(u["x"]), float(u["y"]), str(u["map"]),
+                        int(u["dir"]) & 0xFF if "dir" in u else None,
+                        (float(u["vx"]), float(u["vy"])) if "vx" in u else None,
+                    )
+                    for u in data.get("updates", [])
+                ]
+        except (ProtocolError, ValueError, TypeError, KeyError, AttributeError):
+            self._json(400, {"error": "bad_fields"})
+            return
+        if updates and self._rate_limited(pid):
+            return
+
+        if not PLAYER_HANDLER.apply_updates(pid, updates):
+            self._json(404, {"error": "player_not_found"})
+            return
+        self._players(query)
+
+    def _decode_binary_updates(self, body: bytes, query: dict[str, list[str]]) -> tuple[int, list[Update]]:
+        records = decode_updates(body)
+        if not records:
+            # Nothing queued: the id comes from the query string
+            return int(query["id"][0]), []
+        if any(r[0] != records[0][0] for r in records):
+            raise ValueError("updates must all carry the same player id")
+        updates = []
+        for _, x, y, map_id, direction, map_name, velocity in records:
+            if map_id != MAP_UNKNOWN:
+                map_name = PLAYER_HANDLER.map_name(map_id)
+                if map_name is None:
+                    raise ValueError(f"unknown map id {map_id}")
+            updates.append((x, y, map_name, direction, velocity))
+        return records[0][0], updates
+
+    def _players(self, query: dict[str, list[str]]) -> None:
+        # /players?since=<seq>&epoch=<epoch> answers with changes only
+        # /players?map=<name>&x=<x>&y=<y>&radius=<r> limits the answer to an area of interest
+        try:
+            since = int(query["since"][0]) if "since" in query else None
+            epoch = int(query["epoch"][0]) if "epoch" in query else None
+            if "map" in query:
+                map_name = query["map"][0]
+                x = float(query["x"][0])
+                y = float(query["y"][0])
+                radius = float(query["radius"][0])
+        except (KeyError, ValueError):
+            self._json(400, {"error": "bad_query"})
+            return
+
+        if "map" in query:
+            state = PLAYER_HANDLER.area_state(map_name, x, y, radius, since, epoch)
+        elif since is None:
+            self._snapshot(PLAYER_HANDLER.snapshot())
+            return
+        else:
+            state = PLAYER_HANDLER.changes_since(since, epoch)
+
+        if BINARY_CONTENT_TYPE in self.headers.get("Accept", ""):
+            # Read the table after the state so it covers every map in it
+            data = encode_state(state, list(PLAYER_HANDLER.map_table()))
+            self._send_bytes(200, data, BINARY_CONTENT_TYPE)
+        else:
+            self._json(200, state)
+
+    def _snapshot(self, snap: Snapshot) -> None:
+        # The same encoded bytes go to every reader; unchanged polls get a bodiless 304
+        binary = BINARY_CONTENT_TYPE in self.headers.get("Accept", "")
+        etag = f'{snap.etag[:-1]}-bin"' if binary else snap.etag
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        if binary:
+            self._send_bytes(200, snap.binary_body, BINARY_CONTENT_TYPE, etag)
+        else:
+            self._send_bytes(200, snap.json_body, "application/json", etag)
+
+    def _stream(self) -> None:
+        # A stream holds its thread for its whole lifetime, which would block single mode,
+        # and its listener only hears changes made in its own process
+        if self.protocol_version != "HTTP/1.1" or not PLAYER_HANDLER.streaming:
+            self._json(503, {"error": "streaming_unavailable"})
+            return
+        if self.headers.get("Upgrade", "").lower() != STREAM_UPGRADE:
+            self._json(426, {"error": "upgrade_required", "upgrade": STREAM_UPGRADE})
+            return
+        self.send_response(101)
+        self.send_header("Upgrade", STREAM_UPGRADE)
+        self.send_header("Connection", "Upgrade")
+        self.end_headers()
+        # The socket now belongs to the stream until either side hangs up
+        self.close_connection = True
+        session = StreamSession(PLAYER_HANDLER, self.connection, RATE_LIMITER)
+        if isinstance(self.server, PooledHTTPServer):
+            # Not on a pool worker, which it would hold for the whole session
+            self.detach(session.run)
+        else:
+            session.run()
+
+    def _rate_limited(self, pid: int) -> bool:
+        # Checked before the update touches the player table
+        if RATE_LIMITER is None:
+            return False
+        wait = RATE_LIMITER.allow(pid)
+        if not wait:
+            return False
+        data = json.dumps({"error": "rate_limited"}).encode("utf-8")
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Retry-After", str(math.ceil(wait)))
+        self.end_headers()
+        self.wfile.write(data)
+        return True
+
     # Utility for JSON responses
     def _json(self, code: int, obj: object) -> None:
-        data = json.dumps(obj).encode("utf-8")
+        self._send_bytes(code, json.dumps(obj).encode("utf-8"), "application/json")
+
+    def _send_bytes(self, code: int, data: bytes, content_type: str, etag: str | None = None) -> None:
         self.send_response(code)
-        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Type", content_type)
         self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
         self.end_headers()
-        self.wfile.write(data)
+        if data:
+            self.wfile.write(data)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Monster Go online server")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--mode", choices=["single", "threaded", "pool", "processes"], default="pool",
+                        help="single: one request at a time, threaded: thread per connection, pool: bounded worker pool, "
+                             "processes: several pool mode processes sharing the player table")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of worker threads in pool mode, per process in processes mode")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes in processes mode")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY,
+                        help="player slots of the shared table in processes mode")
+    parser.add_argument("--grid-cell", type=float, default=GRID_CELL_SIZE,
+                        help="spatial grid cell size in pixels for area queries, 0 to only index by map")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="answer expiry sweeps and area queries from NumPy arrays (needs numpy)")
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="oldest the shared /players snapshot may get, in seconds")
+    parser.add_argument("--tick-rate", type=float, nargs="?", const=TICK_RATE, default=0.0,
+                        help=f"apply updates and publish snapshots at this fixed rate per second (default {TICK_RATE:g} "
+                             "when given without a value); off unless set")
+    parser.add_argument("--persist-dir", help="keep the player registry in this directory across restarts")
+    parser.add_argument("--persist-flush", type=float, default=FLUSH_INTERVAL,
+                        help="seconds between fsynced appends to the registry log")
+    parser.add_argument("--persist-snapshot", type=float, default=STORE_SNAPSHOT_INTERVAL,
+                        help="seconds between compact registry snapshots")
+    parser.add_argument("--rate-limit", type=float, default=UPDATE_RATE,
+                        help="position updates per second allowed per player, 0 for no limit")
+    parser.add_argument("--rate-burst", type=float, default=UPDATE_BURST,
+                        help="position updates a player may send at once before the rate limit applies")
+    parser.add_argument("--access-log-sample", type=int, default=ACCESS_LOG_SAMPLE,
+                        help="log one request in this many, 0 to disable the access log")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_TIME,
+                        help="seconds without an update before a player is dropped")
+    parser.add_argument("--check-interval", type=float, default=CHECK_INTERVAL_TIME,
+                        help="seconds between expiry sweeps")
+    args = parser.parse_args()
+    if args.mode == "processes" and (args.tick_rate or args.persist_dir):
+        parser.error("--tick-rate and --persist-dir need a single process, not --mode processes")
+    return args
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+def serve_processes(args: argparse.Namespace, table: SharedPlayerTable) -> None:
+    # Bind once, then fork workers that all accept on the same socket; this
+    # process only supervises them and sweeps expired players
+    server = create_server(("0.0.0.0", args.port), Handler, mode="pool", workers=args.workers)
+    signal.signal(signal.SIGTERM, _terminate)
+
+    def on_fork() -> None:
+        table.forked()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        ACCESS_LOG.start()
+
+    children = fork_workers(server, args.processes, on_fork)
+    ACCESS_LOG.start()
+    table.start()
+    print(f"[Server] Running on localhost with port {args.port} ({args.processes} processes)", flush=True)
+    try:
+        while children:
+            pid, status = os.wait()
+            children.remove(pid)
+            ACCESS_LOG.error(f"worker {pid} exited with status {status}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Another signal must not cut the cleanup short and leak the shared memory
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+            server.server_close()
+            table.stop()
+            ACCESS_LOG.stop()
+        finally:
+            table.close()
 
 if __name__ == "__main__":
-    print(f"[Server] Running on localhost with port {PORT}")
-    HTTPServer(("0.0.0.0", PORT), Handler).serve_forever()
+    args = parse_args()
+    ACCESS_LOG = AccessLog(args.access_log_sample)
+    RATE_LIMITER = RateLimiter(args.rate_limit, args.rate_burst) if args.rate_limit > 0 else None
+    if args.mode == "processes":
+        PLAYER_HANDLER = SharedPlayerTable(
+            capacity=args.capacity,
+            timeout_seconds=args.timeout,
+            check_interval_seconds=args.check_interval,
+            snapshot_interval=args.snapshot_interval,
+        )
+        serve_processes(args, PLAYER_HANDLER)
+    else:
+        PLAYER_HANDLER = PlayerHandler(
+            timeout_seconds=args.timeout,
+            check_interval_seconds=args.check_interval,
+            grid_cell_size=args.grid_cell or None,
+            snapshot_interval=args.snapshot_interval,
+            tick_rate=args.tick_rate or None,
+            vectorized=args.vectorized,
+            store=PlayerStore(args.persist_dir, flush_interval=args.persist_flush, snapshot_interval=args.persist_snapshot)
+            if args.persist_dir else None,
+        )
+        ACCESS_LOG.start()
+        PLAYER_HANDLER.start()
+        server = create_server(("0.0.0.0", args.port), Handler, mode=args.mode, workers=args.workers)
+        ticking = f", {args.tick_rate:g} ticks/s" if args.tick_rate else ""
+        print(f"[Server] Running on localhost with port {args.port} ({args.mode} mode{ticking})", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            PLAYER_HANDLER.stop()
+            ACCESS_LOG.stop()
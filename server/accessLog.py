@@ -0,0 +1,49 @@
+import itertools
+import logging
+import logging.handlers
+import queue
+import sys
+
+class AccessLog:
+    """
+    Sampled access log written by a background thread.
+
+    Request threads only format the line and put it on a queue; the
+    QueueListener thread does the slow write to stderr. Only every
+    `sample_every`-th request is logged (0 logs none); errors always are.
+    """
+    sample_every: int
+
+    _logger: logging.Logger
+    _listener: logging.handlers.QueueListener
+    _counter: itertools.count
+
+    def __init__(self, sample_every: int = 100, stream=None):
+        self.sample_every = sample_every
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = logging.handlers.QueueListener(log_queue, handler)
+
+        self._logger = logging.getLogger(f"monstergo.access.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        # next() on itertools.count is atomic, so no lock is needed to sample
+        self._counter = itertools.count()
+
+    def start(self) -> None:
+        self._listener.start()
+
+    def stop(self) -> None:
+        # Flushes whatever is still queued
+        self._listener.stop()
+
+    def sampled(self) -> bool:
+        return self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+
+    def info(self, line: str) -> None:
+        self._logger.info(line)
+
+    def error(self, line: str) -> None:
+        self._logger.error(line)
@@ -0,0 +1,249 @@
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, ThreadingHTTPServer
+from typing import Callable
+
+DEFAULT_WORKERS = 128
+# Selectors that see sockets registered while another thread waits in select()
+LIVE_SELECTORS = ("EpollSelector", "KqueueSelector", "DevpollSelector")
+# Kept-alive connections idle this long are closed, unless the handler sets its own timeout
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+class _OneRequestAtATime:
+    """
+    Mixed into the pool's handler class: serves the requests the client has
+    already sent, then hands a kept-alive connection back to the server
+    instead of blocking its worker until the next one arrives.
+    """
+    parked: bool = False
+    # Runs on a thread of its own once the handler is done, see detach()
+    detached: Callable[[], None] | None = None
+
+    def detach(self, run: Callable[[], None]) -> None:
+        """Hand the connection to `run` on its own thread, outside the pool; the socket is closed when it returns."""
+        self.close_connection = True
+        self.detached = run
+
+    def handle(self) -> None:
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if not self._request_pending():
+                self.parked = True
+                return
+            self.handle_one_request()
+
+    def _request_pending(self) -> bool:
+        # A non-blocking peek: pipelined bytes may already sit in rfile's buffer,
+        # where the server's selector would never see them
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that hands every request to a bounded thread pool.
+
+    A worker serves one request at a time, and connections that outlive
+    their request, like upgraded streams, are detached to their own thread. Between requests a kept-alive
+    connection is parked in a selector and goes back to the pool when the
+    client sends its next request, so `max_workers` bounds the requests
+    handled at the same time, not the number of connected clients. Parked
+    connections are closed after the handler's idle timeout.
+    """
+    request_queue_size = 256
+    allow_reuse_address = True
+
+    _pool: ThreadPoolExecutor
+    _idle_timeout: float
+    # Parked connections in the order they went idle: socket -> (client address, parked at)
+    _parked: OrderedDict[socket.socket, tuple[object, float]]
+    _parked_lock: threading.Lock
+    # Created on the first parked connection, so forked children get their own
+    _selector: selectors.BaseSelector | None
+    _wake_r: socket.socket | None
+    _wake_w: socket.socket | None
+    _live_registration: bool
+    _closed: bool
+
+    def __init__(self, server_address, handler_class, *, max_workers: int = DEFAULT_WORKERS):
+        handler_class = type(handler_class.__name__, (_OneRequestAtATime, handler_class), {})
+        super().__init__(server_address, handler_class)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="HTTPWorker")
+        self._idle_timeout = handler_class.timeout or DEFAULT_IDLE_TIMEOUT
+        self._parked = OrderedDict()
+        self._parked_lock = threading.Lock()
+        self._selector = None
+        self._wake_r = self._wake_w = None
+        self._closed = False
+
+    def process_request(self, request, client_address) -> None:
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address) -> None:
+        handler = None
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+        if handler is not None and handler.detached is not None:
+            threading.Thread(target=self._run_detached, args=(handler.detached, request, client_address),
+                             name="HTTPDetached", daemon=True).start()
+            return
+        if handler is not None and handler.parked and self._park(request, client_address):
+            return
+        self.shutdown_request(request)
+
+    def _run_detached(self, run: Callable[[], None], request, client_address) -> None:
+        try:
+            run()
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def _park(self, request: socket.socket, client_address) -> bool:
+        with self._parked_lock:
+            if self._closed:
+                return False
+            if self._selector is None:
+                self._selector = selectors.DefaultSelector()
+                self._live_registration = type(self._selector).__name__ in LIVE_SELECTORS
+                self._wake_r, self._wake_w = socket.socketpair()
+                self._wake_r.setblocking(False)
+                self._wake_w.setblocking(False)
+                self._selector.register(self._wake_r, selectors.EVENT_READ)
+                threading.Thread(target=self._watch_parked, name="HTTPIdle", daemon=True).start()
+            self._parked[request] = (client_address, time.monotonic())
+            self._selector.register(request, selectors.EVENT_READ)
+        if not self._live_registration:
+            # select() and poll() only see sockets registered before they were called
+            try:
+                self._wake_w.send(b"\0")
+            except OSError:
+                pass
+        return True
+
+    def _watch_parked(self) -> None:
+        try:
+            while self._serve_parked():
+                pass
+        finally:
+            self._selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def _serve_parked(self) -> bool:
+        with self._parked_lock:
+            if self._closed:
+                return False
+            oldest = next(iter(self._parked.values()), None)
+        timeout = self._idle_timeout if oldest is None else max(0.0, oldest[1] + self._idle_timeout - time.monotonic())
+        events = self._selector.select(timeout)
+        ready = []
+        expired = []
+        now = time.monotonic()
+        with self._parked_lock:
+            if self._closed:
+                return False
+            for key, _ in events:
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                client_address, _ = self._parked.pop(key.fileobj)
+                self._selector.unregister(key.fileobj)
+                ready.append((key.fileobj, client_address))
+            while self._parked:
+                request, (_, parked_at) = next(iter(self._parked.items()))
+                if now - parked_at < self._idle_timeout:
+                    break
+                del self._parked[request]
+                self._selector.unregister(request)
+                expired.append(request)
+        for request, client_address in ready:
+            # The next request, or the client hanging up
+            try:
+                self._pool.submit(self._process_request_worker, request, client_address)
+            except RuntimeError:
+                # The pool was shut down meanwhile
+                self.shutdown_request(request)
+        for request in expired:
+            self.shutdown_request(request)
+        return True
+
+    def server_close(self) -> None:
+        super().server_close()
+        with self._parked_lock:
+            self._closed = True
+            parked = list(self._parked)
+            self._parked.clear()
+        if self._wake_w is not None:
+            # The watcher closes the selector on its way out
+            try:
+                self._wake_w.send(b"\0")
+            except OSError:
+                pass
+        for request in parked:
+            self.shutdown_request(request)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_server(address: tuple[str, int], handler_class, *, mode: str = "pool", workers: int = DEFAULT_WORKERS) -> HTTPServer:
+    """
+    mode:
+        single   - one request at a time (the original behaviour)
+        threaded - one thread per connection, unbounded
+        pool     - bounded worker pool of `workers` threads
+    """
+    server: HTTPServer
+    if mode == "single":
+        # A kept-alive connection would starve every other client here
+        single_handler = type(handler_class.__name__, (handler_class,), {"protocol_version": "HTTP/1.0"})
+        server = HTTPServer(address, single_handler)
+    elif mode == "threaded":
+        server = ThreadingHTTPServer(address, handler_class)
+    elif mode == "pool":
+        server = PooledHTTPServer(address, handler_class, max_workers=workers)
+    else:
+        raise ValueError(f"Unknown server mode: {mode}")
+    return server
+
+
+def fork_workers(server: HTTPServer, processes: int, on_fork: Callable[[], None] | None = None) -> list[int]:
+    """
+    Fork `processes` children that all accept on the already bound `server`
+    socket (POSIX only). Fork before starting any thread in the parent; each
+    child runs `on_fork` and then serves until it is told to stop.
+    """
+    pids = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                if on_fork is not None:
+                    on_fork()
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                code = 1
+            finally:
+                # Skip the parent's atexit handlers, which own the shared state
+                os._exit(code)
+        pids.append(pid)
+    return pids
@@ -0,0 +1,161 @@
+'''
+Minimal metrics in the Prometheus text exposition format, stdlib only.
+
+Metrics are plain objects owned by whoever updates them; `render()` turns any
+collection of them into the body of a /metrics answer.
+'''
+import bisect
+import threading
+import time
+from typing import Callable, Iterable
+
+# Seconds, from 50 us up; wide enough for both lock waits and HTTP requests
+TIME_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+LabelValues = tuple[str, ...]
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    name: str
+    help: str
+    labels: tuple[str, ...]
+    _values: dict[LabelValues, float]
+    _lock: threading.Lock
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, count in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(count)}")
+        return lines
+
+class Histogram:
+    name: str
+    help: str
+    labels: tuple[str, ...]
+    buckets: tuple[float, ...]
+    # Per label set: non-cumulative bucket counts (last one is +Inf), sum
+    _series: dict[LabelValues, tuple[list[int], list[float]]]
+    _lock: threading.Lock
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, (list(counts), total[0])) for values, (counts, total) in self._series.items())
+        for values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+class Gauge:
+    """Read at scrape time from `read`, which returns a value or a {label values: value} dict."""
+    name: str
+    help: str
+    labels: tuple[str, ...]
+    _read: Callable[[], float | dict[LabelValues, float]]
+
+    def __init__(self, name: str, help: str, read: Callable[[], float | dict[LabelValues, float]],
+                 labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._read = read
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        value = self._read()
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for values, v in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(v)}")
+        return lines
+
+Metric = Counter | Histogram | Gauge
+
+def render(metrics: Iterable[Metric]) -> bytes:
+    lines: list[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+class TimedLock:
+    """
+    threading.Lock used as a context manager that records how long callers
+    waited for it and how long they held it. Both are observed after release,
+    so measuring never lengthens the critical section.
+    """
+    _lock: threading.Lock
+    _wait: Histogram
+    _hold: Histogram
+    _acquired_at: float
+    _waited: float
+
+    def __init__(self, wait: Histogram, hold: Histogram):
+        self._lock = threading.Lock()
+        self._wait = wait
+        self._hold = hold
+        self._acquired_at = 0.0
+        self._waited = 0.0
+
+    def __enter__(self) -> "TimedLock":
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._acquired_at = time.perf_counter()
+        self._waited = self._acquired_at - start
+        return self
+
+    def __exit__(self, *exc) -> None:
+        held = time.perf_counter() - self._acquired_at
+        waited = self._waited
+        self._lock.release()
+        self._wait.observe(waited)
+        self._hold.observe(held)
@@ -0,0 +1,123 @@
+try:
+    import numpy as np
+except ImportError:  # optional, only needed for PlayerHandler(vectorized=True)
+    np = None
+
+INITIAL_CAPACITY = 1024
+# Map id for players that have not sent a position yet
+NO_MAP = -1
+# Empty slots hold values no query matches, so queries need no liveness mask
+FREE_MAP = -2
+FREE_LAST_UPDATE = float("inf")
+FREE_VERSION = -1
+
+class PlayerArrays:
+    """
+    Struct-of-arrays copy of the player table in preallocated NumPy arrays,
+    one slot per player, so sweeps and interest queries run as vectorized
+    comparisons instead of Python loops over Player objects.
+
+    Freed slots go on a free list and are reused; an empty slot has id -1
+    and the FREE_ values. The arrays double in size when they run out of
+    slots. Not thread safe: PlayerHandler only calls it with its lock held.
+    """
+    ids: "np.ndarray"
+    x: "np.ndarray"
+    y: "np.ndarray"
+    map_ids: "np.ndarray"
+    dirs: "np.ndarray"
+    last_update: "np.ndarray"
+    versions: "np.ndarray"
+
+    _slots: dict[int, int]
+    _free: list[int]
+    _used: int
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        if np is None:
+            raise RuntimeError("the vectorized player store needs numpy (pip install numpy)")
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.map_ids = np.full(capacity, FREE_MAP, dtype=np.int32)
+        self.dirs = np.zeros(capacity, dtype=np.uint8)
+        self.last_update = np.full(capacity, FREE_LAST_UPDATE, dtype=np.float64)
+        self.versions = np.full(capacity, FREE_VERSION, dtype=np.int64)
+        self._slots = {}
+        self._free = []
+        # Slots past this were never used, so queries only look at [:_used]
+        self._used = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.ids)
+
+    def put(self, pid: int, x: float, y: float, map_id: int, direction: int, last_update: float, version: int) -> None:
+        slot = self._slots.get(pid)
+        if slot is None:
+            slot = self._allocate()
+            self._slots[pid] = slot
+            self.ids[slot] = pid
+        self.x[slot] = x
+        self.y[slot] = y
+        self.map_ids[slot] = map_id
+        self.dirs[slot] = direction
+        self.last_update[slot] = last_update
+        self.versions[slot] = version
+
+    def touch(self, pid: int, last_update: float) -> None:
+        slot = self._slots.get(pid)
+        if slot is not None:
+            self.last_update[slot] = last_update
+
+    def remove(self, pid: int) -> None:
+        slot = self._slots.pop(pid, None)
+        if slot is None:
+            return
+        self.ids[slot] = -1
+        self.map_ids[slot] = FREE_MAP
+        self.last_update[slot] = FREE_LAST_UPDATE
+        self.versions[slot] = FREE_VERSION
+        self._free.append(slot)
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._used == self.capacity:
+            self._grow()
+        slot = self._used
+        self._used += 1
+        return slot
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+        for name, fill in (("ids", -1), ("x", 0), ("y", 0), ("map_ids", FREE_MAP),
+                           ("dirs", 0), ("last_update", FREE_LAST_UPDATE), ("versions", FREE_VERSION)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    # Vectorized queries, each returning player ids
+    def expired(self, deadline: float) -> "np.ndarray":
+        """Players whose last update is at or before `deadline`."""
+        n = self._used
+        return self.ids[:n][self.last_update[:n] <= deadline]
+
+    def on_map(self, map_id: int) -> "np.ndarray":
+        n = self._used
+        return self.ids[:n][self.map_ids[:n] == map_id]
+
+    def in_radius(self, map_id: int, x: float, y: float, radius: float) -> "np.ndarray":
+        n = self._used
+        dx = self.x[:n] - x
+        dy = self.y[:n] - y
+        mask = (self.map_ids[:n] == map_id) & (dx * dx + dy * dy <= radius * radius)
+        return self.ids[:n][mask]
+
+    def changed_since(self, version: int) -> "np.ndarray":
+        n = self._used
+        return self.ids[:n][self.versions[:n] > version]
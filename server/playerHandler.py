@@ -1,11 +1,29 @@
 import threading
 import time
 import copy
+import random
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterable, Optional
+
+from server.metrics import Counter, Gauge, Histogram, Metric, TimedLock
+from server.playerArrays import PlayerArrays, NO_MAP
+from server.playerStore import PlayerStore
+from server.protocol import MAX_MAPS, COORD_SCALE, quantize_velocity
+from server.snapshot import Snapshot
 
 TIMEOUT_TIME = 60.0
 CHECK_INTERVAL_TIME = 10.0
+# Oldest a shared /players snapshot may get while the state keeps changing
+SNAPSHOT_INTERVAL = 0.02
+# Default rate of the optional tick loop, in ticks per second
+TICK_RATE = 20.0
+# Removed ids remembered for delta polls; older `since` values get a full resync
+MAX_TOMBSTONES = 4096
+# Area queries move a player along its reported velocity for at most this long
+# after its last update, and look this much further out for candidates
+MAX_DEAD_RECKONING = 1.0
+DEAD_RECKONING_SLACK = 512.0
 
 @dataclass
 class Player:
@@ -14,35 +32,210 @@ class Player:
     y: float
     map: str
     last_update: float
+    # Facing direction and walking flag, see server.protocol.pack_dir
+    dir: int = 0
+    # Global sequence number of this player's last change
+    version: int = 0
+    # Spatial grid cell, only tracked when the handler has a grid
+    cell: tuple[int, int] | None = None
+    # Velocity the client reported with its position, in pixels per second,
+    # and when that position arrived
+    vx: float = 0.0
+    vy: float = 0.0
+    moved_at: float = 0.0
 
-    def update(self, x: float, y: float, map: str) -> None:
-        if x != self.x or y != self.y or map != self.map:
-            self.last_update = time.monotonic()
+    def update(self, x: float, y: float, map: str, dir: int | None = None,
+               velocity: tuple[float, float] | None = None) -> bool:
+        if dir is None:
+            dir = self.dir
+        vx, vy = velocity or (0.0, 0.0)
+        # On the binary format's grid, so float noise in a client's velocity is no change
+        vx, vy = quantize_velocity(vx) / COORD_SCALE, quantize_velocity(vy) / COORD_SCALE
+        changed = x != self.x or y != self.y or map != self.map or dir != self.dir or vx != self.vx or vy != self.vy
+        if changed:
+            self.last_update = self.moved_at = time.monotonic()
         self.x = x
         self.y = y
         self.map = map
+        self.dir = dir
+        self.vx = vx
+        self.vy = vy
+        return changed
+
+    def to_dict(self) -> dict:
+        d = {
+            "id": self.id,
+            "x": self.x,
+            "y": self.y,
+            "map": self.map,
+            "dir": self.dir
+        }
+        if self.vx or self.vy:
+            d["vx"] = self.vx
+            d["vy"] = self.vy
+        return d
+
+    def position_at(self, now: float) -> tuple[float, float]:
+        """Where the player should be by now, dead reckoned from its last update."""
+        if not (self.vx or self.vy):
+            return self.x, self.y
+        elapsed = min(max(0.0, now - self.moved_at), MAX_DEAD_RECKONING)
+        return self.x + self.vx * elapsed, self.y + self.vy * elapsed
 
-    def is_inactive(self) -> bool:
+    def in_radius(self, x: float, y: float, radius: float, now: float | None = None) -> bool:
+        px, py = (self.x, self.y) if now is None else self.position_at(now)
+        dx = px - x
+        dy = py - y
+        return dx * dx + dy * dy <= radius * radius
+
+    def is_inactive(self, timeout: float = TIMEOUT_TIME) -> bool:
         now = time.monotonic()
-        return (now - self.last_update) >= TIMEOUT_TIME
+        return (now - self.last_update) >= timeout
+
 
+@dataclass
+class SweepStats:
+    examined: int = 0       # expiry queue entries looked at
+    expired: int = 0        # players removed
+    lock_hold: float = 0.0  # seconds the lock was held
+    duration: float = 0.0   # seconds including the wait for the lock
+
+
+# Called with (player id, player dict) on change and (player id, None) on removal
+PlayerListener = Callable[[int, Optional[dict]], None]
+
+# One position update from a client: x, y, map, direction byte (None keeps the
+# current one) and velocity (None when the client does not report one)
+Update = tuple[float, float, str, int | None, tuple[float, float] | None]
+
+def coalesce_updates(updates: list[Update], direction: int | None = None) -> Update:
+    # Only the newest position survives; a direction sent earlier is kept
+    for _, _, _, d, _ in updates:
+        if d is not None:
+            direction = d
+    x, y, map_name, _, velocity = updates[-1]
+    return x, y, map_name, direction, velocity
 
 class PlayerHandler:
-    _lock: threading.Lock
+    # Listeners see every change, so /stream can be served
+    streaming = True
+
+    _lock: TimedLock
     _stop_event: threading.Event
     _thread: threading.Thread | None
+    _listeners: tuple[PlayerListener, ...]
     
     players: Dict[int, Player]
     _next_id: int
 
-    def __init__(self, *, timeout_seconds: float = 120.0, check_interval_seconds: float = 5.0):
-        self._lock = threading.Lock()
+    # Expiry queue: id -> deadline, ordered by deadline. Every player has the
+    # same timeout, so moving a player to the end whenever it is seen keeps the
+    # order, and a sweep stops at the first deadline still in the future.
+    timeout: float
+    check_interval: float
+    _expiry: OrderedDict[int, float]
+    last_sweep: SweepStats
+    max_sweep_hold: float
+
+    # Encoded full state shared by all readers, see snapshot()
+    snapshot_interval: float
+    _snapshot: Snapshot | None
+    _snapshot_time: float
+    _snapshot_lock: threading.Lock
+
+    # Tick mode: updates wait in a buffer, coalesced per player, and are
+    # applied together once per tick, which then publishes one snapshot
+    tick_rate: float | None
+    tick: int
+    _tick_thread: threading.Thread | None
+    _pending: Dict[int, Update]
+    _pending_lock: threading.Lock
+
+    # Delta tracking: ids ordered by their last change, oldest first
+    epoch: int
+    _seq: int
+    _changes: OrderedDict[int, int]
+    _tombstones: OrderedDict[int, int]
+    _horizon: int
+
+    # Interest management: ids per map, and optionally per grid cell inside each map
+    grid_cell_size: float | None
+    _by_map: Dict[str, set[int]]
+    _grid: Dict[str, Dict[tuple[int, int], set[int]]]
+
+    # Vectorized mode: a NumPy copy of the table answers sweeps and area
+    # queries, replacing the expiry queue and the grid
+    _arrays: PlayerArrays | None
+    _array_map_ids: Dict[str, int]
+
+    # Interned map names for the binary protocol; the index is the map id
+    _map_table: tuple[str, ...]
+    _map_ids: Dict[str, int]
+
+    # Optional persistence of registrations and map changes
+    store: PlayerStore | None
+
+    # Instrumentation, exposed through metrics()
+    lock_wait: Histogram
+    lock_hold: Histogram
+    sweep_duration: Histogram
+    expired_total: Counter
+    snapshot_builds: Counter
+
+    def __init__(self, *, timeout_seconds: float = TIMEOUT_TIME, check_interval_seconds: float = CHECK_INTERVAL_TIME,
+                 grid_cell_size: float | None = None, snapshot_interval: float = SNAPSHOT_INTERVAL,
+                 tick_rate: float | None = None, store: PlayerStore | None = None, vectorized: bool = False):
+        self.lock_wait = Histogram("monstergo_player_lock_wait_seconds", "Time spent waiting for the player state lock")
+        self.lock_hold = Histogram("monstergo_player_lock_hold_seconds", "Time the player state lock was held")
+        self.sweep_duration = Histogram("monstergo_sweep_duration_seconds", "Duration of expiry sweeps, including the lock wait")
+        self.expired_total = Counter("monstergo_players_expired_total", "Players removed after timing out")
+        self.snapshot_builds = Counter("monstergo_snapshot_builds_total", "Full state snapshots encoded")
+
+        self._lock = TimedLock(self.lock_wait, self.lock_hold)
         self._stop_event = threading.Event()
         self._thread = None
+        self._listeners = ()
         
         self.players = {}
         self._next_id = 0
-        
+
+        self.timeout = timeout_seconds
+        self.check_interval = check_interval_seconds
+        self._expiry = OrderedDict()
+        self.last_sweep = SweepStats()
+        self.max_sweep_hold = 0.0
+
+        self.snapshot_interval = snapshot_interval
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._snapshot_lock = threading.Lock()
+
+        self.tick_rate = tick_rate or None
+        self.tick = 0
+        self._tick_thread = None
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+        # Identifies this server run, so clients never mix sequences across restarts
+        self.epoch = random.getrandbits(31)
+        self._seq = 0
+        self._changes = OrderedDict()
+        self._tombstones = OrderedDict()
+        self._horizon = 0
+
+        self._arrays = PlayerArrays() if vectorized else None
+        self._array_map_ids = {}
+        self.grid_cell_size = None if vectorized else (grid_cell_size or None)
+        self._by_map = {}
+        self._grid = {}
+
+        self._map_table = ()
+        self._map_ids = {}
+
+        self.store = store
+        if store is not None:
+            self._restore(*store.load())
+
     # Threading
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
@@ -50,48 +243,442 @@ class PlayerHandler:
         self._stop_event.clear()
         self._thread = threading.Thread(target=self._cleaner, name="PlayerCleaner", daemon=True)
         self._thread.start()
+        if self.tick_rate is not None:
+            self._tick_thread = threading.Thread(target=self._ticker, name="PlayerTicker", daemon=True)
+            self._tick_thread.start()
+        if self.store is not None:
+            self.store.start(self._export)
 
     def stop(self) -> None:
         self._stop_event.set()
         if self._thread:
             self._thread.join(timeout=2.0)
+        if self._tick_thread:
+            self._tick_thread.join(timeout=2.0)
+        if self.store is not None:
+            self.store.stop()
+
+    # Persistence
+    def _restore(self, next_id: int, players: dict[int, dict]) -> None:
+        # Restored players get a fresh timeout, so their clients have time to come back
+        now = time.monotonic()
+        self._next_id = next_id
+        for data in players.values():
+            p = Player(data["id"], float(data["x"]), float(data["y"]), data["map"], now, int(data.get("dir", 0)))
+            self.players[p.id] = p
+            self._touch_locked(p)
+            if p.map:
+                self._intern_map_locked(p.map)
+            self._index_locked(p)
+            self._mark_changed_locked(p)
+
+    def _export(self) -> tuple[dict, list[dict]]:
+        # The store's pending entries are drained under the same lock, so the
+        # snapshot covers exactly the entries up to this point
+        with self._lock:
+            state = {"next_id": self._next_id, "players": [p.to_dict() for p in self.players.values()]}
+            return state, self.store.drain()
+
+    def _ticker(self) -> None:
+        # Fixed schedule: a slow tick delays the next one but never shifts the rate
+        period = 1.0 / self.tick_rate
+        next_tick = time.monotonic() + period
+        while not self._stop_event.wait(max(0.0, next_tick - time.monotonic())):
+            self.run_tick()
+            next_tick += period
+            if next_tick < time.monotonic():
+                # Too far behind, skip the missed ticks instead of bursting
+                next_tick = time.monotonic() + period
+
+    def run_tick(self) -> int:
+        """Apply the buffered updates under one lock and publish the tick's snapshot."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        changed: list[tuple[int, dict]] = []
+        with self._lock:
+            for pid, update in pending.items():
+                p = self.players.get(pid)
+                if p is None:
+                    # Expired while its update waited
+                    continue
+                state = self._apply_locked(p, [update])
+                if state is not None:
+                    changed.append((pid, state))
+            self.tick += 1
+            snap = self._snapshot
+            full = map_table = None
+            if snap is None or snap.seq != self._seq:
+                # Only copied here, encoding waits until the lock is released
+                full, map_table = self._full_state_locked(), list(self._map_table)
+            tick = self.tick
+        if full is not None:
+            self._snapshot = Snapshot(full, map_table)
+            self._snapshot_time = time.monotonic()
+            self.snapshot_builds.inc()
+        for pid, state in changed:
+            self._notify(pid, state)
+        return tick
 
     def _cleaner(self) -> None:
-        while not self._stop_event.wait(CHECK_INTERVAL_TIME):
+        while not self._stop_event.wait(self.check_interval):
+            for pid in self.sweep():
+                self._notify(pid, None)
+
+    def sweep(self) -> list[int]:
+        """Remove timed out players, touching only the ones that are due."""
+        stats = SweepStats()
+        removed: list[int] = []
+        start = time.perf_counter()
+        with self._lock:
+            acquired = time.perf_counter()
             now = time.monotonic()
-            to_remove: list[int] = []
-            with self._lock:
-                for pid, p in list(self.players.items()):
-                    if now - p.last_update >= TIMEOUT_TIME:
-                        to_remove.append(pid)
-                for pid in to_remove:
-                    _ = self.players.pop(pid, None)
+            if self._arrays is not None:
+                stats.examined = len(self._arrays)
+                removed = self._arrays.expired(now - self.timeout).tolist()
+                for pid in removed:
+                    self._remove_locked(pid)
+            expiry = self._expiry
+            while expiry:
+                pid, deadline = next(iter(expiry.items()))
+                stats.examined += 1
+                if deadline > now:
+                    break
+                self._remove_locked(pid)
+                removed.append(pid)
+            stats.lock_hold = time.perf_counter() - acquired
+        stats.duration = time.perf_counter() - start
+        stats.expired = len(removed)
+        self.last_sweep = stats
+        self.max_sweep_hold = max(self.max_sweep_hold, stats.lock_hold)
+        self.sweep_duration.observe(stats.duration)
+        self.expired_total.inc(amount=stats.expired)
+        return removed
+
+    def metrics(self) -> list[Metric]:
+        """Everything worth scraping, with gauges read live at render time."""
+        def snapshot_bytes() -> dict[tuple[str, ...], float]:
+            snap = self._snapshot
+            if snap is None:
+                return {}
+            sizes = {("json",): len(snap.json_body)}
+            if snap.binary_built:
+                sizes[("binary",)] = len(snap.binary_body)
+            return sizes
+
+        return [
+            Gauge("monstergo_players", "Players currently registered", lambda: len(self.players)),
+            Gauge("monstergo_stream_listeners", "Open /stream sessions", lambda: len(self._listeners)),
+            Gauge("monstergo_state_seq", "Sequence number of the newest change", lambda: self._seq),
+            Gauge("monstergo_tick", "Ticks run so far, 0 unless in tick mode", lambda: self.tick),
+            Gauge("monstergo_pending_updates", "Players with an update waiting for the next tick", lambda: len(self._pending)),
+            Gauge("monstergo_snapshot_bytes", "Size of the current full state snapshot", snapshot_bytes, ("encoding",)),
+            Gauge("monstergo_last_sweep_examined", "Expiry queue entries looked at by the last sweep",
+                  lambda: self.last_sweep.examined),
+            Gauge("monstergo_last_sweep_lock_hold_seconds", "Lock hold of the last expiry sweep",
+                  lambda: self.last_sweep.lock_hold),
+            self.expired_total,
+            self.sweep_duration,
+            self.snapshot_builds,
+            self.lock_wait,
+            self.lock_hold,
+        ]
+
+    # Listeners
+    def add_listener(self, listener: PlayerListener) -> None:
+        with self._lock:
+            self._listeners = self._listeners + (listener,)
+
+    def remove_listener(self, listener: PlayerListener) -> None:
+        with self._lock:
+            self._listeners = tuple(l for l in self._listeners if l is not listener)
+
+    def _notify(self, pid: int, state: Optional[dict]) -> None:
+        # Runs outside the lock; the tuple is replaced, never mutated
+        for listener in self._listeners:
+            listener(pid, state)
                     
+    # Delta tracking, callers hold the lock
+    def _mark_changed_locked(self, p: Player) -> None:
+        self._seq += 1
+        p.version = self._seq
+        self._changes[p.id] = self._seq
+        self._changes.move_to_end(p.id)
+        if self._arrays is not None:
+            map_id = self._array_map_ids.setdefault(p.map, len(self._array_map_ids)) if p.map else NO_MAP
+            self._arrays.put(p.id, p.x, p.y, map_id, p.dir, p.last_update, p.version)
+
+    def _touch_locked(self, p: Player) -> None:
+        # Call whenever last_update moves forward
+        if self._arrays is not None:
+            self._arrays.touch(p.id, p.last_update)
+            return
+        self._expiry[p.id] = p.last_update + self.timeout
+        self._expiry.move_to_end(p.id)
+
+    def _remove_locked(self, pid: int) -> None:
+        p = self.players.pop(pid, None)
+        if p is None:
+            return
+        self._expiry.pop(pid, None)
+        if self._arrays is not None:
+            self._arrays.remove(pid)
+        self._unindex_locked(p, p.map, p.cell)
+        if self.store is not None:
+            self.store.record({"op": "remove", "id": pid})
+        self._seq += 1
+        self._changes.pop(pid, None)
+        self._tombstones[pid] = self._seq
+        while len(self._tombstones) > MAX_TOMBSTONES:
+            _, seq = self._tombstones.popitem(last=False)
+            self._horizon = seq
+
+    # Map interning
+    def map_table(self) -> tuple[str, ...]:
+        # Replaced, never mutated, so readers need no lock
+        return self._map_table
+
+    def map_name(self, map_id: int) -> str | None:
+        table = self._map_table
+        return table[map_id] if 0 <= map_id < len(table) else None
+
+    def _intern_map_locked(self, map_name: str) -> None:
+        if map_name in self._map_ids or len(self._map_table) >= MAX_MAPS:
+            return
+        self._map_ids[map_name] = len(self._map_table)
+        self._map_table = self._map_table + (map_name,)
+
+    # Map and grid indexes, callers hold the lock
+    def _cell_of(self, x: float, y: float) -> tuple[int, int] | None:
+        if self.grid_cell_size is None:
+            return None
+        return (int(x // self.grid_cell_size), int(y // self.grid_cell_size))
+
+    def _index_locked(self, p: Player) -> None:
+        self._by_map.setdefault(p.map, set()).add(p.id)
+        p.cell = self._cell_of(p.x, p.y)
+        if p.cell is not None:
+            self._grid.setdefault(p.map, {}).setdefault(p.cell, set()).add(p.id)
+
+    def _unindex_locked(self, p: Player, map_name: str, cell: tuple[int, int] | None) -> None:
+        ids = self._by_map.get(map_name)
+        if ids is not None:
+            ids.discard(p.id)
+            if not ids:
+                del self._by_map[map_name]
+        if cell is not None:
+            cells = self._grid.get(map_name, {})
+            ids = cells.get(cell)
+            if ids is not None:
+                ids.discard(p.id)
+                if not ids:
+                    del cells[cell]
+                if not cells:
+                    self._grid.pop(map_name, None)
+
+    def _area_players_locked(self, map_name: str, x: float, y: float, radius: float) -> list[Player]:
+        # Candidates come from the stored positions, widened by how far a
+        # player may have walked since; the final check uses dead reckoning
+        now = time.monotonic()
+        reach = radius + DEAD_RECKONING_SLACK
+        players = self.players
+        candidates: Iterable[int]
+        if self._arrays is not None:
+            map_id = self._array_map_ids.get(map_name)
+            if map_id is None:
+                return []
+            candidates = self._arrays.in_radius(map_id, x, y, reach).tolist()
+        elif self.grid_cell_size is None:
+            candidates = self._by_map.get(map_name, ())
+        else:
+            cells = self._grid.get(map_name, {})
+            size = self.grid_cell_size
+            cx0, cx1 = int((x - reach) // size), int((x + reach) // size)
+            cy0, cy1 = int((y - reach) // size), int((y + reach) // size)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) >= len(cells):
+                # The area covers most of the map, walking the occupied cells is cheaper
+                candidates = [pid for ids in cells.values() for pid in ids]
+            else:
+                candidates = [
+                    pid
+                    for cx in range(cx0, cx1 + 1)
+                    for cy in range(cy0, cy1 + 1)
+                    for pid in cells.get((cx, cy), ())
+                ]
+        return [p for p in (players[pid] for pid in candidates) if p.in_radius(x, y, radius, now)]
+
     # API
     def register(self) -> int:
         with self._lock:
             pid = self._next_id
             self._next_id += 1
-            self.players[pid] = Player(pid, 0.0, 0.0, "", time.monotonic())
+            p = Player(pid, 0.0, 0.0, "", time.monotonic())
+            self.players[pid] = p
+            self._touch_locked(p)
+            self._index_locked(p)
+            self._mark_changed_locked(p)
+            if self.store is not None:
+                self.store.record({"op": "register", "id": pid})
             return pid
 
-    def update(self, pid: int, x: float, y: float, map_name: str) -> bool:
+    def update(self, pid: int, x: float, y: float, map_name: str, direction: int | None = None,
+               velocity: tuple[float, float] | None = None) -> bool:
+        return self.apply_updates(pid, [(x, y, map_name, direction, velocity)])
+
+    def apply_updates(self, pid: int, updates: list[Update]) -> bool:
+        """
+        Apply a client's queued (x, y, map, direction, velocity) updates under one lock.
+        Only the newest position of the batch is applied. In tick mode it is
+        only buffered until the next tick.
+        """
+        if self.tick_rate is not None:
+            return self._buffer_updates(pid, updates)
+        if updates:
+            updates = [coalesce_updates(updates)]
         with self._lock:
             p = self.players.get(pid)
             if not p:
                 return False
-            else:
-                p.update(float(x), float(y), str(map_name))
-                return True
+            state = self._apply_locked(p, updates)
+        if state is not None:
+            self._notify(pid, state)
+        return True
+
+    def _buffer_updates(self, pid: int, updates: list[Update]) -> bool:
+        # A dict lookup is atomic, so the writer lock stays free between ticks
+        if pid not in self.players:
+            return False
+        if not updates:
+            return True
+        with self._pending_lock:
+            pending = self._pending.get(pid)
+            self._pending[pid] = coalesce_updates(updates, pending[3] if pending else None)
+        return True
+
+    def _apply_locked(self, p: Player, updates: list[Update]) -> dict | None:
+        old_map, old_cell = p.map, p.cell
+        changed = False
+        for x, y, map_name, direction, velocity in updates:
+            changed = p.update(float(x), float(y), str(map_name), direction, velocity) or changed
+        if not changed:
+            # Still counts as a heartbeat
+            p.last_update = time.monotonic()
+            self._touch_locked(p)
+            return None
+        self._touch_locked(p)
+        if p.map != old_map:
+            self._intern_map_locked(p.map)
+            if self.store is not None:
+                # Positions within a map only reach the periodic snapshot
+                self.store.record({"op": "map", "id": p.id, "map": p.map, "x": p.x, "y": p.y})
+        if p.map != old_map or self._cell_of(p.x, p.y) != old_cell:
+            self._unindex_locked(p, old_map, old_cell)
+            self._index_locked(p)
+        self._mark_changed_locked(p)
+        return p.to_dict()
+
+    def heartbeat(self, pid: int) -> bool:
+        """Keep an idle but connected player from timing out."""
+        with self._lock:
+            p = self.players.get(pid)
+            if not p:
+                return False
+            p.last_update = time.monotonic()
+            self._touch_locked(p)
+            return True
 
     def list_players(self) -> dict:
         with self._lock:
             player_list = {}
             for p in self.players.values():
-                player_list[p.id] = {
-                    "id": p.id,
-                    "x": p.x,
-                    "y": p.y,
-                    "map": p.map
-                }
+                player_list[p.id] = p.to_dict()
             return player_list
+
+    def full_state(self) -> dict:
+        """Every player plus the epoch and sequence to poll deltas from."""
+        with self._lock:
+            return self._full_state_locked()
+
+    def snapshot(self) -> Snapshot:
+        """
+        The full state, encoded once and shared by every reader. It is rebuilt
+        only after the state changed and at most once per snapshot_interval,
+        so it may lag that long behind. The fast path reads two attributes and
+        takes no lock; a rebuild holds the writer lock only to copy the players.
+        In tick mode the snapshot published by the last tick is returned as is.
+        """
+        snap = self._snapshot
+        if self.tick_rate is not None and snap is not None:
+            return snap
+        if snap is not None and self._snapshot_fresh(snap):
+            return snap
+        with self._snapshot_lock:
+            # Another reader may have rebuilt it while we waited
+            snap = self._snapshot
+            if snap is not None and self._snapshot_fresh(snap):
+                return snap
+            state = self.full_state()
+            snap = Snapshot(state, list(self._map_table))
+            self._snapshot = snap
+            self._snapshot_time = time.monotonic()
+            self.snapshot_builds.inc()
+            return snap
+
+    def _snapshot_fresh(self, snap: Snapshot) -> bool:
+        return snap.seq == self._seq or time.monotonic() - self._snapshot_time < self.snapshot_interval
+
+    def _full_state_locked(self) -> dict:
+        players = {p.id: p.to_dict() for p in self.players.values()}
+        return self._stamp_locked({"epoch": self.epoch, "seq": self._seq, "players": players, "removed": [], "full": True})
+
+    def _stamp_locked(self, state: dict) -> dict:
+        # Tick mode numbers every answer with the tick it reflects
+        if self.tick_rate is not None:
+            state["tick"] = self.tick
+        return state
+
+    def changes_since(self, since: int, epoch: int | None = None) -> dict:
+        """
+        Players changed and ids removed after sequence `since`, walking the
+        change log backwards so the cost is O(changed players). If the
+        sequence is from another server run or older than the remembered
+        removals, the answer is the full player list with "full" set.
+        """
+        with self._lock:
+            seq = self._seq
+            if epoch != self.epoch or since < self._horizon or since > seq:
+                return self._full_state_locked()
+
+            players = {}
+            for pid, version in reversed(self._changes.items()):
+                if version <= since:
+                    break
+                players[pid] = self.players[pid].to_dict()
+            removed = []
+            for pid, removed_at in reversed(self._tombstones.items()):
+                if removed_at <= since:
+                    break
+                removed.append(pid)
+            return self._stamp_locked({"epoch": self.epoch, "seq": seq, "players": players, "removed": removed, "full": False})
+
+    def area_state(self, map_name: str, x: float, y: float, radius: float,
+                   since: int | None = None, epoch: int | None = None) -> dict:
+        """
+        Players on `map_name` within `radius` of (x, y). "ids" lists everyone
+        in the area; "players" holds the full entries, limited to those changed
+        after `since` when the sequence is still valid. Clients drop any id
+        missing from "ids", so the answer is O(players in the area).
+        """
+        with self._lock:
+            area = self._area_players_locked(map_name, x, y, radius)
+            seq = self._seq
+            full = since is None or epoch != self.epoch or since > seq
+            players = {p.id: p.to_dict() for p in area if full or p.version > since}
+            return self._stamp_locked({
+                "epoch": self.epoch, "seq": seq,
+                "players": players, "ids": [p.id for p in area], "full": full,
+            })
+
+    def player_area(self, pid: int) -> tuple[str, float, float] | None:
+        with self._lock:
+            p = self.players.get(pid)
+            return (p.map, *p.position_at(time.monotonic())) if p else None
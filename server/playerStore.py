@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+# How often buffered log entries are written and fsynced
+FLUSH_INTERVAL = 0.2
+# How often the whole registry is written as a compact snapshot, which also
+# lets the log start over
+SNAPSHOT_INTERVAL = 30.0
+
+SNAPSHOT_FILE = "players.snapshot"
+
+# Returns the registry ({"next_id", "players"}) together with the log entries
+# recorded up to that point, both taken under the owner's lock
+ExportFn = Callable[[], tuple[dict, list[dict]]]
+
+class PlayerStore:
+    """
+    Crash-safe persistence of the player registry.
+
+    The owner records registrations, map changes and removals with `record()`,
+    which only appends to a buffer. A background thread writes the buffer to
+    an append-only log and fsyncs it every `flush_interval` seconds, and every
+    `snapshot_interval` seconds replaces everything with a compact snapshot.
+
+    Snapshot and log share a generation number: the snapshot of generation G
+    is followed by `players.G.log`. Recovery loads the snapshot and replays
+    only that log, stopping at a torn last line.
+    """
+    directory: Path
+    flush_interval: float
+    snapshot_interval: float
+    generation: int
+
+    _lock: threading.Lock
+    _pending: list[dict]
+    _log: BinaryIO | None
+    _export: ExportFn | None
+    _stop_event: threading.Event
+    _thread: threading.Thread | None
+
+    def __init__(self, directory: str | Path, *, flush_interval: float = FLUSH_INTERVAL,
+                 snapshot_interval: float = SNAPSHOT_INTERVAL):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._log = None
+        self._export = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # Recovery
+    def load(self) -> tuple[int, dict[int, dict]]:
+        """Returns (next id, players by id) as of the last fsynced write."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        next_id, players = 0, {}
+        snapshot_path = self.directory / SNAPSHOT_FILE
+        if snapshot_path.exists():
+            data = json.loads(snapshot_path.read_text(encoding="utf-8"))
+            self.generation = data["generation"]
+            next_id = data["next_id"]
+            players = {p["id"]: p for p in data["players"]}
+
+        log_path = self._log_path(self.generation)
+        if log_path.exists():
+            with open(log_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write from the crash; nothing after it was fsynced either
+                        break
+                    next_id = self._replay(entry, next_id, players)
+
+        # Logs of other generations are leftovers from a crash mid-snapshot
+        for path in self.directory.glob("players.*.log"):
+            if path != log_path:
+                path.unlink()
+        self._log = open(log_path, "ab")
+        return next_id, players
+
+    @staticmethod
+    def _replay(entry: dict, next_id: int, players: dict[int, dict]) -> int:
+        op, pid = entry["op"], entry["id"]
+        if op == "register":
+            players[pid] = {"id": pid, "x": 0.0, "y": 0.0, "map": "", "dir": 0}
+            next_id = max(next_id, pid + 1)
+        elif op == "map" and pid in players:
+            players[pid].update(x=entry["x"], y=entry["y"], map=entry["map"])
+        elif op == "remove":
+            players.pop(pid, None)
+        return next_id
+
+    # Recording, cheap enough to call with the owner's lock held
+    def record(self, entry: dict) -> None:
+        with self._lock:
+            self._pending.append(entry)
+
+    def drain(self) -> list[dict]:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    # Background writer
+    def start(self, export: ExportFn) -> None:
+        if self._log is None:
+            self.load()
+        self._export = export
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._writer, name="PlayerStore", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _writer(self) -> None:
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() >= next_snapshot:
+                self.write_snapshot()
+                next_snapshot = time.monotonic() + self.snapshot_interval
+        # Leave a compact snapshot behind so the next start replays nothing
+        self.write_snapshot()
+        self._log.close()
+        self._log = None
+
+    def flush(self) -> None:
+        self._append(self.drain())
+
+    def _append(self, entries: list[dict]) -> None:
+        if not entries:
+            return
+        self._log.write(b"".join(json.dumps(e, separators=(",", ":")).encode("utf-8") + b"\n" for e in entries))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def write_snapshot(self) -> None:
+        state, tail = self._export()
+        # Until the new snapshot is in place the old one plus this log must stay complete
+        self._append(tail)
+
+        generation = self.generation + 1
+        data = {"generation": generation, **state}
+        tmp_path = self.directory / (SNAPSHOT_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.directory / SNAPSHOT_FILE)
+        self._fsync_directory()
+
+        old_log, old_generation = self._log, self.generation
+        self._log = open(self._log_path(generation), "ab")
+        self.generation = generation
+        old_log.close()
+        self._log_path(old_generation).unlink(missing_ok=True)
+
+    def _fsync_directory(self) -> None:
+        # Makes the rename itself durable; not every platform can open a directory
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _log_path(self, generation: int) -> Path:
+        return self.directory / f"players.{generation}.log"
@@ -0,0 +1,299 @@
+'''
+Wire protocol shared by server.py and the game's OnlineManager.
+
+Streaming channel: a client sends `GET /stream` with `Upgrade: monstergo-stream`,
+waits for `101 Switching Protocols`, and from then on both sides exchange
+frames on the same socket. A frame is a 4 byte big-endian length followed by
+that many bytes of UTF-8 JSON object, which always carries a "type":
+
+    client -> server   {"type": "hello", "id": 3}
+                       {"type": "position", "x": 10.0, "y": 20.0, "map": "map.tmx", "vx": 384.0, "vy": 0.0}
+                       {"type": "ping"}
+    server -> client   {"type": "players", "players": {...}, "removed": [...], "full": bool}
+                       {"type": "error", "error": "player_not_found"}
+                       {"type": "ping"}
+                       {"type": "pong"}
+
+A server running ticks adds the current "tick" to every "players" frame.
+"vx"/"vy" are optional: a client that sends its velocity only reports again
+when it changes or its position drifts from the prediction, and everyone else
+extrapolates in between. Player entries carry them while they are non-zero.
+Either side sends a ping after HEARTBEAT_INTERVAL seconds without traffic and
+drops the connection after HEARTBEAT_TIMEOUT seconds of silence. The server
+answers a client's ping with a pong, so the client can measure round trips.
+'''
+import json
+import socket
+import struct
+
+STREAM_PATH = "/stream"
+STREAM_UPGRADE = "monstergo-stream"
+
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 10.0
+
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 1 << 20
+
+class ProtocolError(Exception):
+    pass
+
+def encode_frame(msg: dict) -> bytes:
+    payload = json.dumps(msg, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+class FrameReader:
+    """
+    Reads frames from a socket. A socket timeout propagates to the caller but
+    keeps any partially received frame, so reading can resume afterwards.
+    """
+    _sock: socket.socket
+    _buf: bytearray
+    # Bytes read from the socket so far
+    received: int
+
+    def __init__(self, sock: socket.socket, initial: bytes = b""):
+        self._sock = sock
+        self._buf = bytearray(initial)
+        self.received = len(initial)
+
+    def read(self) -> dict | None:
+        """Return the next frame, or None once the peer closed the connection."""
+        while True:
+            frame = self._pop_frame()
+            if frame is not None:
+                return frame
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                return None
+            self.received += len(chunk)
+            self._buf += chunk
+
+    def _pop_frame(self) -> dict | None:
+        if len(self._buf) < FRAME_HEADER.size:
+            return None
+        (length,) = FRAME_HEADER.unpack_from(self._buf)
+        if length > MAX_FRAME_SIZE:
+            raise ProtocolError(f"frame too large: {length} bytes")
+        end = FRAME_HEADER.size + length
+        if len(self._buf) < end:
+            return None
+        payload = bytes(self._buf[FRAME_HEADER.size:end])
+        del self._buf[:end]
+        try:
+            msg = json.loads(payload.decode("utf-8"))
+        except ValueError as e:
+            raise ProtocolError(f"invalid frame: {e}") from e
+        if not isinstance(msg, dict):
+            raise ProtocolError("frame is not a JSON object")
+        return msg
+
+# ----------------------------------------------------------------------
+# Binary encoding for /players, negotiated with the Accept and
+# Content-Type headers. JSON stays the default.
+#
+# State (GET /players), little-endian:
+#     header   u8 version, u8 flags, u32 epoch, u32 seq
+#     tick     u32 server tick (only with FLAG_TICK, when the server runs ticks)
+#     maps     u8 count, then per map u8 length + UTF-8 name; the index is the map id
+#     players  u32 count, then RECORD each, followed by VELOCITY with FLAG_VELOCITY
+#     removed  u32 count, then u32 ids
+#     ids      u32 count, then u32 ids (only with FLAG_IDS, for area queries)
+# Update (POST /players): one RECORD, then VELOCITY when the direction byte has
+# VELOCITY_FLAG, then u8 length + UTF-8 map name when the map id is MAP_UNKNOWN.
+# POST /exchange takes several updates back to back.
+# ----------------------------------------------------------------------
+BINARY_CONTENT_TYPE = "application/x-monstergo"
+BINARY_VERSION = 1
+
+FLAG_FULL = 0x01
+FLAG_IDS = 0x02
+FLAG_TICK = 0x04
+FLAG_VELOCITY = 0x08
+
+# id, x, y, map id, direction byte
+RECORD = struct.Struct("<IHHBB")
+# vx, vy in quarter pixels per second
+VELOCITY = struct.Struct("<hh")
+STATE_HEADER = struct.Struct("<BBII")
+COUNT = struct.Struct("<I")
+U8 = struct.Struct("<B")
+
+# Coordinates travel in quarter pixels, which covers maps up to 16384 px
+COORD_SCALE = 4
+COORD_MAX = 0xFFFF
+VELOCITY_MAX = 0x7FFF
+MAP_UNKNOWN = 0xFF
+MAX_MAPS = MAP_UNKNOWN
+
+# Direction byte: direction index in the low bits, MOVING_FLAG while walking.
+# VELOCITY_FLAG only appears on the wire in binary updates
+DIRECTIONS = ("none", "up", "down", "left", "right")
+MOVING_FLAG = 0x80
+VELOCITY_FLAG = 0x40
+
+def pack_dir(direction: str, moving: bool) -> int:
+    index = DIRECTIONS.index(direction) if direction in DIRECTIONS else 0
+    return index | (MOVING_FLAG if moving else 0)
+
+def unpack_dir(value: int) -> tuple[str, bool]:
+    index = value & ~MOVING_FLAG
+    return (DIRECTIONS[index] if index < len(DIRECTIONS) else "none"), bool(value & MOVING_FLAG)
+
+def quantize(value: float) -> int:
+    return min(COORD_MAX, max(0, round(value * COORD_SCALE)))
+
+def quantize_velocity(value: float) -> int:
+    return min(VELOCITY_MAX, max(-VELOCITY_MAX, round(value * COORD_SCALE)))
+
+def encode_state(state: dict, map_table: list[str]) -> bytes:
+    map_ids = {name: i for i, name in enumerate(map_table)}
+    flags = (
+        (FLAG_FULL if state.get("full") else 0)
+        | (FLAG_IDS if "ids" in state else 0)
+        | (FLAG_TICK if "tick" in state else 0)
+    )
+    players = state["players"]
+    with_velocity = any("vx" in p for p in players.values())
+    if with_velocity:
+        flags |= FLAG_VELOCITY
+    out = bytearray(STATE_HEADER.pack(BINARY_VERSION, flags, state["epoch"], state["seq"]))
+    if "tick" in state:
+        out += COUNT.pack(state["tick"])
+
+    out += U8.pack(len(map_table))
+    for name in map_table:
+        raw = name.encode("utf-8")
+        out += U8.pack(len(raw)) + raw
+
+    out += COUNT.pack(len(players))
+    pack = RECORD.pack
+    for p in players.values():
+        out += pack(
+            p["id"], quantize(p["x"]), quantize(p["y"]),
+            map_ids.get(p["map"], MAP_UNKNOWN), p.get("dir", 0)
+        )
+        if with_velocity:
+            out += VELOCITY.pack(quantize_velocity(p.get("vx", 0.0)), quantize_velocity(p.get("vy", 0.0)))
+
+    removed = state.get("removed", [])
+    out += COUNT.pack(len(removed))
+    out += struct.pack(f"<{len(removed)}I", *removed)
+    if "ids" in state:
+        ids = state["ids"]
+        out += COUNT.pack(len(ids))
+        out += struct.pack(f"<{len(ids)}I", *ids)
+    return bytes(out)
+
+def decode_state(data: bytes) -> dict:
+    """Inverse of encode_state, giving the same shape as the JSON answer plus "maps"."""
+    try:
+        version, flags, epoch, seq = STATE_HEADER.unpack_from(data)
+        if version != BINARY_VERSION:
+            raise ProtocolError(f"unsupported binary version {version}")
+        offset = STATE_HEADER.size
+        tick = None
+        if flags & FLAG_TICK:
+            (tick,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+
+        (n_maps,) = U8.unpack_from(data, offset)
+        offset += 1
+        maps = []
+        for _ in range(n_maps):
+            (length,) = U8.unpack_from(data, offset)
+            offset += 1
+            maps.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        (n_players,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        players = {}
+        if flags & FLAG_VELOCITY:
+            for _ in range(n_players):
+                pid, qx, qy, map_id, direction = RECORD.unpack_from(data, offset)
+                qvx, qvy = VELOCITY.unpack_from(data, offset + RECORD.size)
+                offset += RECORD.size + VELOCITY.size
+                p = players[pid] = {
+                    "id": pid, "x": qx / COORD_SCALE, "y": qy / COORD_SCALE,
+                    "map": maps[map_id] if map_id < n_maps else "", "dir": direction,
+                }
+                if qvx or qvy:
+                    p["vx"], p["vy"] = qvx / COORD_SCALE, qvy / COORD_SCALE
+        else:
+            end = offset + n_players * RECORD.size
+            for pid, qx, qy, map_id, direction in RECORD.iter_unpack(data[offset:end]):
+                players[pid] = {
+                    "id": pid, "x": qx / COORD_SCALE, "y": qy / COORD_SCALE,
+                    "map": maps[map_id] if map_id < n_maps else "", "dir": direction,
+                }
+            offset = end
+
+        (n_removed,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        removed = list(struct.unpack_from(f"<{n_removed}I", data, offset))
+        offset += 4 * n_removed
+
+        state = {
+            "epoch": epoch, "seq": seq, "players": players,
+            "removed": removed, "full": bool(flags & FLAG_FULL), "maps": maps,
+        }
+        if tick is not None:
+            state["tick"] = tick
+        if flags & FLAG_IDS:
+            (n_ids,) = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            state["ids"] = list(struct.unpack_from(f"<{n_ids}I", data, offset))
+        return state
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ProtocolError(f"invalid binary state: {e}") from e
+
+def encode_update(pid: int, x: float, y: float, map_id: int, direction: int, map_name: str = "",
+                  velocity: tuple[float, float] | None = None) -> bytes:
+    if velocity is None:
+        data = RECORD.pack(pid, quantize(x), quantize(y), map_id, direction)
+    else:
+        data = RECORD.pack(pid, quantize(x), quantize(y), map_id, direction | VELOCITY_FLAG)
+        data += VELOCITY.pack(quantize_velocity(velocity[0]), quantize_velocity(velocity[1]))
+    if map_id == MAP_UNKNOWN:
+        raw = map_name.encode("utf-8")
+        data += U8.pack(len(raw)) + raw
+    return data
+
+BinaryUpdate = tuple[int, float, float, int, int, str, tuple[float, float] | None]
+
+def decode_update(data: bytes) -> BinaryUpdate:
+    """
+    Returns (id, x, y, map id, direction, map name, velocity); the name is only
+    set for MAP_UNKNOWN and the velocity is None unless the client sent one.
+    """
+    update, _ = _decode_update_at(data, 0)
+    return update
+
+def decode_updates(data: bytes) -> list[BinaryUpdate]:
+    updates = []
+    offset = 0
+    while offset < len(data):
+        update, offset = _decode_update_at(data, offset)
+        updates.append(update)
+    return updates
+
+def _decode_update_at(data: bytes, offset: int) -> tuple[BinaryUpdate, int]:
+    try:
+        pid, qx, qy, map_id, direction = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        velocity = None
+        if direction & VELOCITY_FLAG:
+            direction &= ~VELOCITY_FLAG
+            qvx, qvy = VELOCITY.unpack_from(data, offset)
+            offset += VELOCITY.size
+            velocity = (qvx / COORD_SCALE, qvy / COORD_SCALE)
+        map_name = ""
+        if map_id == MAP_UNKNOWN:
+            (length,) = U8.unpack_from(data, offset)
+            offset += 1
+            map_name = data[offset:offset + length].decode("utf-8")
+            offset += length
+        return (pid, qx / COORD_SCALE, qy / COORD_SCALE, map_id, direction, map_name, velocity), offset
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ProtocolError(f"invalid binary update: {e}") from e
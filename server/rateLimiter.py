@@ -0,0 +1,79 @@
+import threading
+import time
+
+from server.metrics import Counter
+
+# Position updates per second a player may send, and how many may arrive at once.
+# A client at 60 FPS posting every frame stays under both.
+UPDATE_RATE = 60.0
+UPDATE_BURST = 120.0
+# Buckets idle this long are full again and can be forgotten
+IDLE_SECONDS = 60.0
+
+class TokenBucket:
+    """Allows `rate` events per second on average and up to `burst` at once."""
+    rate: float
+    burst: float
+    tokens: float
+    stamp: float
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until the next event would be allowed."""
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+class RateLimiter:
+    """
+    One token bucket per key (the player id). `allow()` only takes this
+    object's own lock, never the player table's, so rejecting a flood costs
+    a dict lookup and a few float operations.
+    """
+    rate: float
+    burst: float
+    rejected: Counter
+
+    _buckets: dict[int, TokenBucket]
+    _lock: threading.Lock
+    _next_prune: float
+
+    def __init__(self, rate: float = UPDATE_RATE, burst: float = UPDATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.rejected = Counter("monstergo_rate_limited_total", "Position updates rejected by the per-player rate limit")
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_prune = time.monotonic() + IDLE_SECONDS
+
+    def allow(self, key: int) -> float:
+        """0 if the event is allowed, otherwise the seconds to wait before retrying."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if bucket.take(now):
+                if now >= self._next_prune:
+                    self._prune_locked(now)
+                return 0.0
+            wait = bucket.retry_after()
+        self.rejected.inc()
+        return wait
+
+    def _prune_locked(self, now: float) -> None:
+        # Keys of players that left would otherwise pile up forever
+        self._buckets = {k: b for k, b in self._buckets.items() if now - b.stamp < IDLE_SECONDS}
+        self._next_prune = now + IDLE_SECONDS
@@ -0,0 +1,453 @@
+import multiprocessing
+import multiprocessing.synchronize
+import random
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from server.metrics import Gauge, Histogram, Metric
+from server.playerHandler import TIMEOUT_TIME, CHECK_INTERVAL_TIME, SNAPSHOT_INTERVAL, SweepStats, Update, coalesce_updates
+from server.protocol import MAX_MAPS, COORD_SCALE, quantize_velocity
+from server.snapshot import Snapshot
+
+DEFAULT_CAPACITY = 65536
+# Writers to a slot serialize on one of these, readers never lock
+LOCK_STRIPES = 64
+
+# Header: magic, capacity, high water mark, map count, epoch, seq, horizon, expired count,
+# free queue head and length
+HEADER = struct.Struct("<IIIII4xQQQII")
+MAGIC = 0x4D475054
+HWM_OFFSET = 8
+MAP_COUNT_OFFSET = 12
+SEQ_OFFSET = 24
+HORIZON_OFFSET = 32
+EXPIRED_OFFSET = 40
+FREE_HEAD_OFFSET = 48
+FREE_COUNT_OFFSET = 52
+
+MAP_NAME_SIZE = 64
+MAPS_OFFSET = 64
+RECORDS_OFFSET = MAPS_OFFSET + MAX_MAPS * MAP_NAME_SIZE + 64
+
+# Slot: seqlock counter, state, direction, map id, player id, x, y, last_update, version,
+# and the reported velocity in quarter pixels per second
+RECORD = struct.Struct("<IBBHIdddQhh")
+BODY = struct.Struct("<BBHIdddQhh")
+SLOT_SEQ = struct.Struct("<I44x")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+
+# After the slots: the queue of freed slots (capacity entries), then the slot
+# written by each of the last CHANGE_LOG commits, indexed by sequence number
+CHANGE_LOG = 4096
+
+FREE, LIVE, REMOVED = 0, 1, 2
+# Map id of a player that has not sent a position yet
+NO_MAP = 0xFFFF
+
+class TableFullError(RuntimeError):
+    """Every slot holds a live player."""
+
+class SharedPlayerTable:
+    """
+    Player state in a fixed-record `multiprocessing.shared_memory` table, for
+    the multi-process server. It answers the same calls server.py makes on a
+    PlayerHandler, from any process forked after it was created.
+
+    Every slot carries a sequence lock: a writer makes the counter odd, writes
+    the record and makes it even again, and readers retry until they see the
+    same even value before and after reading. Writers of a slot serialize on
+    one of LOCK_STRIPES process-shared locks; registration, removal, the global
+    sequence and the map table each have their own lock, always taken in the
+    order alloc -> stripe -> seq or stripe -> map.
+
+    A player's slot is its id modulo the capacity, so lookups need no shared
+    index. A freed slot keeps the removed player's id and version as its
+    tombstone until it is reused, which then moves the delta horizon. Freed
+    slots are queued and reused oldest first, before the table grows, so
+    scans only cover as many slots as were ever live at once. Delta polls
+    read the changed slots from the change log instead of scanning.
+
+    Streams, tick mode and persistence stay with the single-process
+    PlayerHandler: they rely on in-process listeners and buffers.
+    """
+    streaming = False
+
+    capacity: int
+    timeout: float
+    check_interval: float
+    snapshot_interval: float
+    epoch: int
+    last_sweep: SweepStats
+
+    _shm: shared_memory.SharedMemory
+    _buf: memoryview
+    _owner: bool
+    _free_offset: int
+    _log_offset: int
+    _alloc_lock: multiprocessing.synchronize.Lock
+    _seq_lock: multiprocessing.synchronize.Lock
+    _map_lock: multiprocessing.synchronize.Lock
+    _stripes: list[multiprocessing.synchronize.Lock]
+
+    # Per process caches
+    _map_table: tuple[str, ...]
+    _scan_cache: tuple[int, list[tuple]] | None
+    _snapshot: Snapshot | None
+    _snapshot_time: float
+    _snapshot_lock: threading.Lock
+
+    _stop_event: threading.Event
+    _thread: threading.Thread | None
+    sweep_duration: Histogram
+
+    def __init__(self, *, capacity: int = DEFAULT_CAPACITY, timeout_seconds: float = TIMEOUT_TIME,
+                 check_interval_seconds: float = CHECK_INTERVAL_TIME, snapshot_interval: float = SNAPSHOT_INTERVAL):
+        self.capacity = capacity
+        self.timeout = timeout_seconds
+        self.check_interval = check_interval_seconds
+        self.snapshot_interval = snapshot_interval
+        self.epoch = random.getrandbits(31)
+        self.last_sweep = SweepStats()
+
+        self._free_offset = RECORDS_OFFSET + capacity * RECORD.size
+        self._log_offset = self._free_offset + capacity * U32.size
+        self._shm = shared_memory.SharedMemory(create=True, size=self._log_offset + CHANGE_LOG * U32.size)
+        self._buf = self._shm.buf
+        self._owner = True
+        HEADER.pack_into(self._buf, 0, MAGIC, capacity, 0, 0, self.epoch, 0, 0, 0, 0, 0)
+
+        self._alloc_lock = multiprocessing.Lock()
+        self._seq_lock = multiprocessing.Lock()
+        self._map_lock = multiprocessing.Lock()
+        self._stripes = [multiprocessing.Lock() for _ in range(LOCK_STRIPES)]
+
+        self._map_table = ()
+        self._scan_cache = None
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._snapshot_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.sweep_duration = Histogram("monstergo_sweep_duration_seconds", "Duration of expiry sweeps")
+
+    # Lifecycle; the cleaner only runs in the process that created the table
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._cleaner, name="PlayerCleaner", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def close(self) -> None:
+        """Detach; the creating process also frees the shared memory."""
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def forked(self) -> None:
+        # Called in a worker right after fork, so it never unlinks the table
+        self._owner = False
+
+    # Header fields
+    def _seq(self) -> int:
+        return U64.unpack_from(self._buf, SEQ_OFFSET)[0]
+
+    def _hwm(self) -> int:
+        return U32.unpack_from(self._buf, HWM_OFFSET)[0]
+
+    def _commit(self, slot: int, state: int, direction: int, map_id: int, pid: int,
+                x: float, y: float, last_update: float, qvx: int = 0, qvy: int = 0) -> int:
+        # Caller holds the slot's stripe lock. The new sequence is published only
+        # after the record is written, so a reader that sees it also sees the record
+        with self._seq_lock:
+            seq = self._seq() + 1
+            self._write_slot(slot, state, direction, map_id, pid, x, y, last_update, seq, qvx, qvy)
+            U32.pack_into(self._buf, self._log_offset + seq % CHANGE_LOG * U32.size, slot)
+            U64.pack_into(self._buf, SEQ_OFFSET, seq)
+            return seq
+
+    # Slots
+    def _slot_offset(self, slot: int) -> int:
+        return RECORDS_OFFSET + slot * RECORD.size
+
+    def _read_slot(self, slot: int) -> tuple:
+        """(state, dir, map id, id, x, y, last_update, version, vx, vy), consistent via the seqlock."""
+        offset = self._slot_offset(slot)
+        buf = self._buf
+        while True:
+            before = U32.unpack_from(buf, offset)[0]
+            if before & 1:
+                time.sleep(0)
+                continue
+            body = BODY.unpack_from(buf, offset + 4)
+            if U32.unpack_from(buf, offset)[0] == before:
+                return body
+
+    def _write_slot(self, slot: int, *body) -> None:
+        # Caller holds the slot's stripe lock
+        offset = self._slot_offset(slot)
+        seq = U32.unpack_from(self._buf, offset)[0]
+        U32.pack_into(self._buf, offset, (seq + 1) & 0xFFFFFFFF)
+        BODY.pack_into(self._buf, offset + 4, *body)
+        U32.pack_into(self._buf, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _stripe(self, slot: int) -> multiprocessing.synchronize.Lock:
+        return self._stripes[slot % LOCK_STRIPES]
+
+    def _scan(self) -> list[tuple]:
+        """
+        Every used slot as (state, dir, map id, id, x, y, last_update, version, vx, vy).
+        Copies the table twice and only re-reads, through the seqlock, the
+        slots whose counter was odd or moved between the two copies.
+        Cached per process until the global sequence moves.
+        """
+        seq = self._seq()
+        cached = self._scan_cache
+        if cached is not None and cached[0] == seq:
+            return cached[1]
+        start = RECORDS_OFFSET
+        end = start + self._hwm() * RECORD.size
+        first = bytes(self._buf[start:end])
+        second = bytes(self._buf[start:end])
+        records = []
+        for slot, (rec, (seq_after,)) in enumerate(zip(RECORD.iter_unpack(first), SLOT_SEQ.iter_unpack(second))):
+            if rec[0] & 1 or rec[0] != seq_after:
+                records.append(self._read_slot(slot))
+            else:
+                records.append(rec[1:])
+        self._scan_cache = (seq, records)
+        return records
+
+    # Map interning
+    def map_table(self) -> tuple[str, ...]:
+        count = U32.unpack_from(self._buf, MAP_COUNT_OFFSET)[0]
+        if count != len(self._map_table):
+            names = []
+            for i in range(count):
+                raw = bytes(self._buf[MAPS_OFFSET + i * MAP_NAME_SIZE:MAPS_OFFSET + (i + 1) * MAP_NAME_SIZE])
+                names.append(raw.rstrip(b"\0").decode("utf-8"))
+            self._map_table = tuple(names)
+        return self._map_table
+
+    def map_name(self, map_id: int) -> str | None:
+        table = self.map_table()
+        return table[map_id] if 0 <= map_id < len(table) else None
+
+    def _map_id(self, map_name: str) -> int:
+        if not map_name:
+            return NO_MAP
+        table = self.map_table()
+        if map_name in table:
+            return table.index(map_name)
+        raw = map_name.encode("utf-8")
+        with self._map_lock:
+            table = self.map_table()
+            if map_name in table:
+                return table.index(map_name)
+            count = len(table)
+            if count >= MAX_MAPS or len(raw) >= MAP_NAME_SIZE:
+                # Table full: the player still moves, but on a map nobody else can see
+                return NO_MAP
+            offset = MAPS_OFFSET + count * MAP_NAME_SIZE
+            self._buf[offset:offset + len(raw)] = raw
+            U32.pack_into(self._buf, MAP_COUNT_OFFSET, count + 1)
+            return count
+
+    def _to_dict(self, rec: tuple) -> dict:
+        _, direction, map_id, pid, x, y, _, _, qvx, qvy = rec
+        d = {"id": pid, "x": x, "y": y, "map": self.map_name(map_id) or "", "dir": direction}
+        if qvx or qvy:
+            d["vx"], d["vy"] = qvx / COORD_SCALE, qvy / COORD_SCALE
+        return d
+
+    # API, same shape as PlayerHandler
+    def register(self) -> int:
+        with self._alloc_lock:
+            head = U32.unpack_from(self._buf, FREE_HEAD_OFFSET)[0]
+            free = U32.unpack_from(self._buf, FREE_COUNT_OFFSET)[0]
+            hwm = self._hwm()
+            if free:
+                # Reuse the oldest tombstone; removals newer than it stay visible to delta polls
+                slot = U32.unpack_from(self._buf, self._free_offset + head * U32.size)[0]
+                U32.pack_into(self._buf, FREE_HEAD_OFFSET, (head + 1) % self.capacity)
+                U32.pack_into(self._buf, FREE_COUNT_OFFSET, free - 1)
+                _, _, _, old_pid, _, _, _, version, *_ = self._read_slot(slot)
+                pid = old_pid + self.capacity
+                horizon = U64.unpack_from(self._buf, HORIZON_OFFSET)[0]
+                U64.pack_into(self._buf, HORIZON_OFFSET, max(horizon, version))
+            elif hwm < self.capacity:
+                slot, pid = hwm, hwm
+                U32.pack_into(self._buf, HWM_OFFSET, hwm + 1)
+            else:
+                raise TableFullError("player table is full")
+            with self._stripe(slot):
+                self._commit(slot, LIVE, 0, NO_MAP, pid, 0.0, 0.0, time.monotonic())
+        return pid
+
+    def update(self, pid: int, x: float, y: float, map_name: str, direction: int | None = None,
+               velocity: tuple[float, float] | None = None) -> bool:
+        return self.apply_updates(pid, [(x, y, map_name, direction, velocity)])
+
+    def apply_updates(self, pid: int, updates: list[Update]) -> bool:
+        slot = pid % self.capacity
+        with self._stripe(slot):
+            state, cur_dir, map_id, slot_pid, cur_x, cur_y, _, version, cur_qvx, cur_qvy = self._read_slot(slot)
+            if state != LIVE or slot_pid != pid:
+                return False
+            if not updates:
+                return True
+            x, y, map_name, new_dir, velocity = coalesce_updates(updates, cur_dir)
+            vx, vy = velocity or (0.0, 0.0)
+            qvx, qvy = quantize_velocity(vx), quantize_velocity(vy)
+            new_map = self._map_id(str(map_name))
+            new_x, new_y = float(x), float(y)
+            if (new_x, new_y, new_map, new_dir, qvx, qvy) == (cur_x, cur_y, map_id, cur_dir, cur_qvx, cur_qvy):
+                # Still counts as a heartbeat
+                self._write_slot(slot, LIVE, cur_dir, map_id, pid, cur_x, cur_y, time.monotonic(), version, cur_qvx, cur_qvy)
+                return True
+            self._commit(slot, LIVE, new_dir, new_map, pid, new_x, new_y, time.monotonic(), qvx, qvy)
+        return True
+
+    def heartbeat(self, pid: int) -> bool:
+        slot = pid % self.capacity
+        with self._stripe(slot):
+            state, direction, map_id, slot_pid, x, y, _, version, qvx, qvy = self._read_slot(slot)
+            if state != LIVE or slot_pid != pid:
+                return False
+            self._write_slot(slot, LIVE, direction, map_id, pid, x, y, time.monotonic(), version, qvx, qvy)
+        return True
+
+    def full_state(self) -> dict:
+        seq = self._seq()
+        players = {rec[3]: self._to_dict(rec) for rec in self._scan() if rec[0] == LIVE}
+        return {"epoch": self.epoch, "seq": seq, "players": players, "removed": [], "full": True}
+
+    def list_players(self) -> dict:
+        return self.full_state()["players"]
+
+    def snapshot(self) -> Snapshot:
+        snap = self._snapshot
+        if snap is not None and self._snapshot_fresh(snap):
+            return snap
+        with self._snapshot_lock:
+            snap = self._snapshot
+            if snap is not None and self._snapshot_fresh(snap):
+                return snap
+            snap = Snapshot(self.full_state(), list(self.map_table()))
+            self._snapshot = snap
+            self._snapshot_time = time.monotonic()
+            return snap
+
+    def _snapshot_fresh(self, snap: Snapshot) -> bool:
+        return snap.seq == self._seq() or time.monotonic() - self._snapshot_time < self.snapshot_interval
+
+    def changes_since(self, since: int, epoch: int | None = None) -> dict:
+        seq = self._seq()
+        horizon = U64.unpack_from(self._buf, HORIZON_OFFSET)[0]
+        if epoch != self.epoch or since < horizon or since > seq:
+            return self.full_state()
+        players = {}
+        removed = []
+        for rec in self._changed_since(since, seq):
+            if rec[7] <= since:
+                continue
+            if rec[0] == LIVE:
+                players[rec[3]] = self._to_dict(rec)
+            elif rec[0] == REMOVED:
+                removed.append(rec[3])
+        return {"epoch": self.epoch, "seq": seq, "players": players, "removed": removed, "full": False}
+
+    def _changed_since(self, since: int, seq: int) -> list[tuple]:
+        # The slots of commits since+1..seq from the change log, or a scan
+        # when the log has already wrapped past them
+        if seq - since >= CHANGE_LOG:
+            return self._scan()
+        log = self._log_offset
+        slots = {U32.unpack_from(self._buf, log + s % CHANGE_LOG * U32.size)[0] for s in range(since + 1, seq + 1)}
+        if self._seq() - since >= CHANGE_LOG:
+            # Overwritten while we read it
+            return self._scan()
+        return [self._read_slot(slot) for slot in slots]
+
+    def area_state(self, map_name: str, x: float, y: float, radius: float,
+                   since: int | None = None, epoch: int | None = None) -> dict:
+        seq = self._seq()
+        table = self.map_table()
+        map_id = table.index(map_name) if map_name in table else -1
+        full = since is None or epoch != self.epoch or since > seq
+        r2 = radius * radius
+        players = {}
+        ids = []
+        for rec in self._scan():
+            if rec[0] != LIVE or rec[2] != map_id:
+                continue
+            dx, dy = rec[4] - x, rec[5] - y
+            if dx * dx + dy * dy > r2:
+                continue
+            ids.append(rec[3])
+            if full or rec[7] > since:
+                players[rec[3]] = self._to_dict(rec)
+        return {"epoch": self.epoch, "seq": seq, "players": players, "ids": ids, "full": full}
+
+    def player_area(self, pid: int) -> tuple[str, float, float] | None:
+        state, _, map_id, slot_pid, x, y, *_ = self._read_slot(pid % self.capacity)
+        if state != LIVE or slot_pid != pid:
+            return None
+        return (self.map_name(map_id) or "", x, y)
+
+    # Expiry
+    def _cleaner(self) -> None:
+        while not self._stop_event.wait(self.check_interval):
+            self.sweep()
+
+    def sweep(self) -> list[int]:
+        """
+        Remove timed out players. The deadline queue of PlayerHandler cannot
+        be shared between processes, so this scans the table; readers never
+        wait for it and writers only for the one slot being removed.
+        """
+        stats = SweepStats()
+        start = time.perf_counter()
+        removed: list[int] = []
+        deadline = time.monotonic() - self.timeout
+        for slot, rec in enumerate(self._scan()):
+            stats.examined += 1
+            if rec[0] != LIVE or rec[6] > deadline:
+                continue
+            with self._alloc_lock, self._stripe(slot):
+                state, direction, map_id, pid, x, y, last_update, *_ = self._read_slot(slot)
+                if state != LIVE or last_update > deadline:
+                    continue
+                self._commit(slot, REMOVED, direction, map_id, pid, x, y, last_update)
+                # Queued in removal order, so the head is always the oldest tombstone
+                head = U32.unpack_from(self._buf, FREE_HEAD_OFFSET)[0]
+                free = U32.unpack_from(self._buf, FREE_COUNT_OFFSET)[0]
+                U32.pack_into(self._buf, self._free_offset + (head + free) % self.capacity * U32.size, slot)
+                U32.pack_into(self._buf, FREE_COUNT_OFFSET, free + 1)
+                expired = U64.unpack_from(self._buf, EXPIRED_OFFSET)[0]
+                U64.pack_into(self._buf, EXPIRED_OFFSET, expired + 1)
+                removed.append(pid)
+        stats.duration = time.perf_counter() - start
+        stats.expired = len(removed)
+        self.last_sweep = stats
+        self.sweep_duration.observe(stats.duration)
+        return removed
+
+    def metrics(self) -> list[Metric]:
+        return [
+            Gauge("monstergo_players", "Players currently registered",
+                  lambda: sum(1 for rec in self._scan() if rec[0] == LIVE)),
+            Gauge("monstergo_player_slots_used", "Slots of the shared table ever used", self._hwm),
+            Gauge("monstergo_state_seq", "Sequence number of the newest change", self._seq),
+            Gauge("monstergo_players_expired", "Players removed after timing out, all processes",
+                  lambda: U64.unpack_from(self._buf, EXPIRED_OFFSET)[0]),
+        ]
@@ -0,0 +1,46 @@
+import json
+import threading
+
+from server.protocol import encode_state
+
+class Snapshot:
+    """
+    Immutable, already encoded full player state.
+
+    One instance is shared by every reader until the next rebuild, so a
+    /players poll only copies a reference. The binary body is encoded once,
+    the first time someone asks for it.
+    """
+    epoch: int
+    seq: int
+    etag: str
+    json_body: bytes
+
+    _state: dict
+    _map_table: list[str]
+    _binary_body: bytes | None
+    _binary_lock: threading.Lock
+
+    def __init__(self, state: dict, map_table: list[str]):
+        self.epoch = state["epoch"]
+        self.seq = state["seq"]
+        self.etag = f'"{self.epoch}-{self.seq}"'
+        self.json_body = json.dumps(state).encode("utf-8")
+        self._state = state
+        self._map_table = map_table
+        self._binary_body = None
+        self._binary_lock = threading.Lock()
+
+    @property
+    def binary_built(self) -> bool:
+        return self._binary_body is not None
+
+    @property
+    def binary_body(self) -> bytes:
+        body = self._binary_body
+        if body is None:
+            with self._binary_lock:
+                if self._binary_body is None:
+                    self._binary_body = encode_state(self._state, self._map_table)
+                body = self._binary_body
+        return body
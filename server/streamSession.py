@@ -0,0 +1,239 @@
+import socket
+import threading
+import time
+from typing import Optional
+
+from server.playerHandler import PlayerHandler, Update, MAX_DEAD_RECKONING
+from server.rateLimiter import RateLimiter
+from server.protocol import (
+    FrameReader, ProtocolError, encode_frame,
+    HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT,
+)
+
+# With a radius, the area is queried again this often: players walk in and out
+# of it by dead reckoning alone, without sending anything
+AREA_REFRESH_INTERVAL = 0.5
+
+class StreamSession:
+    """
+    One upgraded /stream connection.
+
+    The thread calling `run()` reads client frames, while a writer thread
+    pushes player changes. Changes are coalesced per player id until the writer
+    picks them up, so a slow client receives the newest state instead of a
+    growing backlog.
+
+    When the hello frame carries a "radius", only players on the client's map
+    within that radius of its own position are pushed, positions dead
+    reckoned like an HTTP area poll. Players leaving the area are sent as
+    removed.
+
+    Position frames over the rate limit are not applied right away; the
+    newest one is kept and applied with the next allowed frame or ping.
+    """
+    player_id: int
+    radius: float | None
+
+    _handler: PlayerHandler
+    _limiter: RateLimiter | None
+    _deferred: Update | None
+    _sock: socket.socket
+    _send_lock: threading.Lock
+    _cond: threading.Condition
+    # Changed players by id, with when the change came in
+    _pending: dict[int, tuple[Optional[dict], float]]
+    _closed: bool
+    _last_sent: float
+    # Area of interest state, owned by the writer once it runs
+    _area_dirty: bool
+    _area: tuple[str, float, float] | None
+    _area_queried: float
+    _visible: set[int]
+
+    def __init__(self, handler: PlayerHandler, sock: socket.socket, limiter: RateLimiter | None = None):
+        self.player_id = -1
+        self.radius = None
+        self._handler = handler
+        self._limiter = limiter
+        self._deferred = None
+        self._sock = sock
+        self._send_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._closed = False
+        self._last_sent = time.monotonic()
+        self._area_dirty = False
+        self._area = None
+        self._area_queried = 0.0
+        self._visible = set()
+
+    def run(self) -> None:
+        self._sock.settimeout(HEARTBEAT_TIMEOUT)
+        reader = FrameReader(self._sock)
+        try:
+            hello = reader.read()
+            if not hello or hello.get("type") != "hello":
+                return
+            self.player_id = int(hello.get("id", -1))
+            if hello.get("radius") is not None:
+                self.radius = float(hello["radius"])
+            if not self._handler.heartbeat(self.player_id):
+                self.send({"type": "error", "error": "player_not_found"})
+                return
+
+            # Listen first so nothing is missed; the writer only starts once the
+            # full snapshot is out, so queued changes always arrive after it
+            self._handler.add_listener(self._on_change)
+            self.send(self._stamp(self._initial_snapshot()))
+            writer = threading.Thread(target=self._write_loop, name="StreamWriter", daemon=True)
+            writer.start()
+
+            while True:
+                msg = reader.read()
+                if msg is None:
+                    return
+                self._handle(msg)
+        except (OSError, ProtocolError, ValueError, TypeError):
+            # Timeouts land here too: the client missed its heartbeats
+            return
+        finally:
+            self._handler.remove_listener(self._on_change)
+            with self._cond:
+                self._closed = True
+                self._cond.notify()
+
+    def send(self, msg: dict) -> None:
+        data = encode_frame(msg)
+        with self._send_lock:
+            self._sock.sendall(data)
+            self._last_sent = time.monotonic()
+
+    def _handle(self, msg: dict) -> None:
+        kind = msg.get("type")
+        if kind == "position":
+            try:
+                direction = int(msg["dir"]) & 0xFF if "dir" in msg else None
+                velocity = (float(msg["vx"]), float(msg["vy"])) if "vx" in msg else None
+                update = (float(msg["x"]), float(msg["y"]), str(msg["map"]), direction, velocity)
+            except (KeyError, ValueError, TypeError):
+                # Like a 400 over HTTP: the frame is dropped, the session goes on
+                self.send({"type": "error", "error": "bad_fields"})
+                return
+            if self._limiter is not None and self._limiter.allow(self.player_id):
+                self._deferred = update
+                return
+            self._deferred = None
+            ok = self._handler.update(self.player_id, *update)
+        elif kind == "ping":
+            if self._deferred is not None:
+                # The update refreshes the player just like a heartbeat would
+                ok = self._handler.update(self.player_id, *self._deferred)
+                self._deferred = None
+            else:
+                ok = self._handler.heartbeat(self.player_id)
+            if ok:
+                self.send({"type": "pong"})
+        else:
+            return
+        if not ok:
+            self.send({"type": "error", "error": "player_not_found"})
+
+    def _initial_snapshot(self) -> dict:
+        if self.radius is None:
+            return {"type": "players", "players": self._handler.list_players(), "removed": [], "full": True}
+        self._area = self._handler.player_area(self.player_id)
+        self._area_queried = time.monotonic()
+        if self._area is None:
+            return {"type": "players", "players": {}, "removed": [], "full": True}
+        area = self._handler.area_state(*self._area, self.radius)
+        self._visible = set(area["ids"])
+        return {"type": "players", "players": area["players"], "removed": [], "full": True}
+
+    def _stamp(self, msg: dict) -> dict:
+        if self._handler.tick_rate is not None:
+            msg["tick"] = self._handler.tick
+        return msg
+
+    def _on_change(self, pid: int, state: Optional[dict]) -> None:
+        if pid == self.player_id:
+            # Our own move shifts the area of interest
+            if self.radius is not None:
+                with self._cond:
+                    self._area_dirty = True
+                    self._cond.notify()
+            return
+        with self._cond:
+            self._pending[pid] = (state, time.monotonic())
+            self._cond.notify()
+
+    def _filter_area(self, pending: dict[int, tuple[Optional[dict], float]], area_dirty: bool) -> tuple[dict, list[int]]:
+        players: dict[int, dict] = {}
+        removed: list[int] = []
+        if area_dirty:
+            self._area = self._handler.player_area(self.player_id)
+            self._area_queried = time.monotonic()
+        if self._area is None:
+            removed = list(self._visible)
+            self._visible = set()
+            return players, removed
+
+        map_name, x, y = self._area
+        if area_dirty:
+            # Re-query the area: picks up players we walked towards, drops those we left
+            area = self._handler.area_state(map_name, x, y, self.radius)
+            ids = set(area["ids"])
+            players = {pid: p for pid, p in area["players"].items() if pid not in self._visible or pid in pending}
+            removed = list(self._visible - ids)
+            self._visible = ids
+            return players, removed
+
+        r2 = self.radius * self.radius
+        now = time.monotonic()
+        for pid, (state, changed_at) in pending.items():
+            inside = False
+            if state is not None and state["map"] == map_name:
+                # Where Player.position_at() puts it by now
+                elapsed = min(now - changed_at, MAX_DEAD_RECKONING)
+                px = state["x"] + state.get("vx", 0.0) * elapsed
+                py = state["y"] + state.get("vy", 0.0) * elapsed
+                inside = (px - x) ** 2 + (py - y) ** 2 <= r2
+            if inside:
+                players[pid] = state
+                self._visible.add(pid)
+            elif pid in self._visible:
+                removed.append(pid)
+                self._visible.discard(pid)
+        return players, removed
+
+    def _write_loop(self) -> None:
+        try:
+            while True:
+                with self._cond:
+                    if not self._pending and not self._area_dirty and not self._closed:
+                        wait = HEARTBEAT_INTERVAL
+                        if self.radius is not None:
+                            wait = min(wait, max(0.0, self._area_queried + AREA_REFRESH_INTERVAL - time.monotonic()))
+                        self._cond.wait(wait)
+                    if self._closed:
+                        return
+                    pending, self._pending = self._pending, {}
+                    area_dirty, self._area_dirty = self._area_dirty, False
+
+                if self.radius is not None:
+                    area_dirty = area_dirty or time.monotonic() - self._area_queried >= AREA_REFRESH_INTERVAL
+                if self.radius is not None and (pending or area_dirty):
+                    players, removed = self._filter_area(pending, area_dirty)
+                else:
+                    players = {pid: state for pid, (state, _) in pending.items() if state is not None}
+                    removed = [pid for pid, (state, _) in pending.items() if state is None]
+
+                if players or removed:
+                    self.send(self._stamp({"type": "players", "players": players, "removed": removed, "full": False}))
+                elif time.monotonic() - self._last_sent >= HEARTBEAT_INTERVAL:
+                    self.send({"type": "ping"})
+        except OSError:
+            # Wake the reader so run() can finish
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,134 @@
+import csv
+import os
+import threading
+import time
+from collections import deque
+
+# Rates and RTT percentiles cover this many recent seconds
+WINDOW = 10.0
+# The CSV log moves to "<path>.1" once it grows past this size
+MAX_LOG_BYTES = 1024 * 1024
+
+LOG_COLUMNS = (
+    "time", "rtt_p50_ms", "rtt_p95_ms", "rtt_p99_ms", "requests_per_s",
+    "bytes_in_per_s", "bytes_out_per_s", "requests", "failures",
+    "bytes_in", "bytes_out", "snapshot_age_s",
+)
+
+def _percentile(ordered: list[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+class NetworkDiagnostics:
+    """
+    What the online client sent and received: round trip times, requests
+    (HTTP requests and stream frames), bytes each way, failed requests, and
+    how old the newest remote player snapshot is. Written by the network
+    threads and read by the game loop, so the counters sit behind a lock.
+    """
+    requests: int
+    failures: int
+    bytes_in: int
+    bytes_out: int
+    # When the server last sent us the remote players (or confirmed them unchanged)
+    last_snapshot: float | None
+
+    _rtts: deque[tuple[float, float]]
+    # (time, requests, bytes sent, bytes received)
+    _traffic: deque[tuple[float, int, int, int]]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.last_snapshot = None
+        self._rtts = deque()
+        self._traffic = deque()
+        self._lock = threading.Lock()
+
+    def record_request(self, sent: int, received: int, rtt: float | None = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self._add_traffic_locked(now, 1, sent, received)
+            if rtt is not None:
+                self._rtts.append((now, rtt))
+
+    def record_received(self, received: int) -> None:
+        """Bytes that arrived without a request of ours, like pushed stream frames."""
+        if received <= 0:
+            return
+        with self._lock:
+            self._add_traffic_locked(time.monotonic(), 0, 0, received)
+
+    def record_rtt(self, rtt: float) -> None:
+        with self._lock:
+            self._rtts.append((time.monotonic(), rtt))
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def record_snapshot(self) -> None:
+        self.last_snapshot = time.monotonic()
+
+    def _add_traffic_locked(self, now: float, requests: int, sent: int, received: int) -> None:
+        self.bytes_out += sent
+        self.bytes_in += received
+        self._traffic.append((now, requests, sent, received))
+
+    def snapshot(self) -> dict[str, float]:
+        """The current figures, rates and percentiles over the last WINDOW seconds."""
+        now = time.monotonic()
+        since = now - WINDOW
+        with self._lock:
+            while self._rtts and self._rtts[0][0] < since:
+                self._rtts.popleft()
+            while self._traffic and self._traffic[0][0] < since:
+                self._traffic.popleft()
+            rtts = sorted(rtt * 1000 for _, rtt in self._rtts)
+            requests = sum(n for _, n, _, _ in self._traffic)
+            sent = sum(s for _, _, s, _ in self._traffic)
+            received = sum(r for _, _, _, r in self._traffic)
+            stats = {
+                "requests": self.requests,
+                "failures": self.failures,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+        last = self.last_snapshot
+        stats.update(
+            rtt_p50_ms=_percentile(rtts, 50),
+            rtt_p95_ms=_percentile(rtts, 95),
+            rtt_p99_ms=_percentile(rtts, 99),
+            requests_per_s=requests / WINDOW,
+            bytes_in_per_s=received / WINDOW,
+            bytes_out_per_s=sent / WINDOW,
+            snapshot_age_s=-1.0 if last is None else now - last,
+        )
+        return stats
+
+class DiagnosticsLog:
+    """Appends NetworkDiagnostics snapshots to a CSV file, keeping one older file around."""
+    path: str
+    max_bytes: int
+
+    def __init__(self, path: str, max_bytes: int = MAX_LOG_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def write(self, stats: dict[str, float]) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            os.replace(self.path, f"{self.path}.1")
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(LOG_COLUMNS)
+            row = {**stats, "time": time.time()}
+            writer.writerow(
+                f"{row[c]:.3f}" if isinstance(row[c], float) else row[c] for c in LOG_COLUMNS
+            )
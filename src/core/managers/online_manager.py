@@ -1,71 +1,368 @@
+import random
 import requests
+from requests.adapters import HTTPAdapter
+import socket
 import threading
 import time
-from src.utils import Logger, GameSettings
+from urllib.parse import urlsplit
+from src.utils import Logger, GameSettings, Direction, Position
+from server.protocol import (
+    FrameReader, ProtocolError, encode_frame,
+    STREAM_PATH, STREAM_UPGRADE, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT,
+    BINARY_CONTENT_TYPE, MAP_UNKNOWN, COORD_SCALE, pack_dir, encode_update, decode_state, quantize_velocity,
+)
+from .remote_players import RemotePlayers
+from .network_diagnostics import NetworkDiagnostics, DiagnosticsLog
+from .session_recorder import SessionRecorder
 
-POLL_INTERVAL = 0.02
+# Poll this often while nearby players move or our own updates are queued,
+# slowing down by POLL_SLOWDOWN per quiet poll to at most IDLE_POLL_INTERVAL.
+# Remote players are interpolated between polls, so 10 Hz still looks smooth
+POLL_INTERVAL = 0.1
+IDLE_POLL_INTERVAL = 0.5
+POLL_SLOWDOWN = 1.5
+# After failed requests wait ERROR_BACKOFF * 2^(failures - 1), up to MAX_ERROR_BACKOFF, jittered
+ERROR_BACKOFF = 0.5
+MAX_ERROR_BACKOFF = 10.0
+# Most queued local updates sent in one /exchange request; older ones are dropped
+MAX_EXCHANGE_BATCH = 16
+# How long to fall back to HTTP polling before trying the stream again
+STREAM_RETRY_INTERVAL = 5.0
+# (connect, read) timeouts of every HTTP request; a dead server fails fast on connect
+REQUEST_TIMEOUT = (2.0, 5.0)
+# Kept-alive connections to the server: one each for the poller and the sender
+POOL_SIZE = 2
+# Dead reckoning: when update() gets our velocity, a position only goes out if
+# the motion changed, the prediction from the last one sent drifted this many
+# pixels, or it is this many seconds old while we keep walking
+DEAD_RECKONING_DRIFT = 8.0
+DEAD_RECKONING_HEARTBEAT = 0.5
+# Velocities closer than this, in pixels per second, count as the same motion
+DEAD_RECKONING_SPEED_TOLERANCE = 1.0
+# Seconds between rows of the ONLINE_DIAGNOSTICS_LOG CSV
+DIAGNOSTICS_LOG_INTERVAL = 1.0
+
+# x, y, map, direction byte, velocity (None when not dead reckoning)
+LocalUpdate = tuple[float, float, str, int, tuple[float, float] | None]
 
 class OnlineManager:
     list_players: list[dict]
     player_id: int
-    
+    # Newest tick the server reported, None unless it runs in tick mode
+    server_tick: int | None
+
     _stop_event: threading.Event
     _thread: threading.Thread | None
     _lock: threading.Lock
-    
+    # Keep-alive HTTP connections shared by the poller and the sender
+    _session: requests.Session
+    http_requests: int
+    # RTT, traffic and failure figures for the overlay, and the CSV they go to
+    diagnostics: NetworkDiagnostics
+    _diagnostics_log: DiagnosticsLog | None
+    _next_diagnostics_log: float
+    # Writes every request, response and stream frame to ONLINE_RECORD_PATH
+    _recorder: SessionRecorder | None
+
+    # Current wait between polls, and failed requests in a row
+    poll_interval: float
+    _failures: int
+    # Seconds a 429 asked us to wait before the next poll, 0 when not rate limited
+    _retry_after: float
+    # Set when the server no longer knows our id; the poller registers again
+    _needs_register: bool
+    # Cuts an idle poll wait short when an update is queued for /exchange
+    _poll_wake: threading.Event
+
+    # Remote players by id, kept current by deltas from the poller or the stream
+    _remote_players: dict[int, dict]
+    # Their timestamped positions for smooth drawing, guarded by _lock
+    _interpolated: RemotePlayers
+    _poll_epoch: int | None
+    _poll_seq: int
+    # Our own map and position, the centre of the area of interest
+    _interest: tuple[str, float, float] | None
+    _area_resync: bool
+    # ETag of the last full answer, so an unchanged full poll costs a bodiless 304
+    _poll_etag: str | None
+
+    # Binary protocol, switched on once the server answered a poll in binary
+    _binary_server: bool
+    _map_ids: dict[str, int]
+
+    # Local updates waiting for the next /exchange; None until we know the server has it
+    _outbox: list[LocalUpdate]
+    _exchange_supported: bool | None
+
+    # Newest local position not yet handed on by the sender thread. update() only
+    # replaces it, so the game loop never waits on the network
+    _pending_update: LocalUpdate | None
+    _send_event: threading.Event
+    _sender: threading.Thread | None
+    # Time of the last update queued while dead reckoning, with that update
+    _reckoned: tuple[float, LocalUpdate] | None
+    # Updates handed to the network, updates replaced before they could be,
+    # and frames dead reckoning did not need to send at all
+    sent_updates: int
+    collapsed_updates: int
+    reckoned_updates: int
+
+    # Streaming channel
+    _stream_sock: socket.socket | None
+    _stream_send_lock: threading.Lock
+    _last_sent_state: LocalUpdate | None
+    _next_stream_attempt: float
+    # When our unanswered stream ping went out
+    _ping_sent: float | None
+
     def __init__(self):
         self.base: str = GameSettings.ONLINE_SERVER_URL
         self.player_id = -1
         self.list_players = []
+        self.server_tick = None
 
         self._thread = None
         self._stop_event = threading.Event()
         self._lock = threading.Lock()
-        
+        record_path = GameSettings.ONLINE_RECORD_PATH
+        self._recorder = SessionRecorder(record_path) if record_path else None
+        self._session = self._create_session()
+        self.http_requests = 0
+        self.diagnostics = NetworkDiagnostics()
+        log_path = GameSettings.ONLINE_DIAGNOSTICS_LOG
+        self._diagnostics_log = DiagnosticsLog(log_path) if log_path else None
+        self._next_diagnostics_log = 0.0
+        self.poll_interval = POLL_INTERVAL
+        self._failures = 0
+        self._retry_after = 0.0
+        self._needs_register = False
+        self._poll_wake = threading.Event()
+
+        self._remote_players = {}
+        self._interpolated = RemotePlayers(GameSettings.ONLINE_INTERP_DELAY)
+        self._poll_epoch = None
+        self._poll_seq = 0
+        self._interest = None
+        self._area_resync = False
+        self._poll_etag = None
+        self._binary_server = False
+        self._map_ids = {}
+        self._outbox = []
+        self._exchange_supported = None
+        self._pending_update = None
+        self._send_event = threading.Event()
+        self._sender = None
+        self._reckoned = None
+        self.sent_updates = 0
+        self.collapsed_updates = 0
+        self.reckoned_updates = 0
+        self._stream_sock = None
+        self._stream_send_lock = threading.Lock()
+        self._last_sent_state = None
+        self._next_stream_attempt = 0.0
+        self._ping_sent = None
+        self._on_error = None
+
         Logger.info("OnlineManager initialized")
-        
+
     def enter(self):
         self.register()
         self.start()
-            
+
     def exit(self):
         self.stop()
-        
+
     def get_list_players(self) -> list[dict]:
         with self._lock:
             return list(self.list_players)
 
+    def get_interpolated_players(self) -> list[dict]:
+        """Remote players as they should be drawn this frame, ONLINE_INTERP_DELAY in the past."""
+        if GameSettings.ONLINE_INTERP_DELAY <= 0:
+            return self.get_list_players()
+        with self._lock:
+            return self._interpolated.sample(time.monotonic())
+
+    def get_visible_players(self, map_name: str, left: float, top: float, right: float, bottom: float) -> list[dict]:
+        """Remote players on `map_name` drawn inside the world rectangle, see RemotePlayers.visible()."""
+        with self._lock:
+            return self._interpolated.visible(map_name, time.monotonic(), left, top, right, bottom)
+
+    @property
+    def is_streaming(self) -> bool:
+        return self._stream_sock is not None
+
+    def network_stats(self) -> dict[str, int]:
+        """HTTP requests sent, connections opened for them, and requests that reused one."""
+        connections = 0
+        # The same adapter is mounted for http:// and https://
+        for adapter in set(self._session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            connections += sum(pools[key].num_connections for key in pools.keys())
+        return {
+            "requests": self.http_requests,
+            "connections": connections,
+            "reused": max(0, self.http_requests - connections),
+        }
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.hooks["response"].append(self._count_request)
+        if self._recorder is not None:
+            session.hooks["response"].append(self._recorder.record_http)
+        return session
+
+    def _count_request(self, resp: requests.Response, *args, **kwargs) -> None:
+        self.http_requests += 1
+        # The body is not read yet, its size comes from the header
+        body = resp.request.body
+        self.diagnostics.record_request(
+            len(body) if body else 0,
+            int(resp.headers.get("Content-Length", 0)),
+            resp.elapsed.total_seconds(),
+        )
+
+    def _write_diagnostics(self) -> None:
+        log = self._diagnostics_log
+        now = time.monotonic()
+        if log is None or now < self._next_diagnostics_log:
+            return
+        self._next_diagnostics_log = now + DIAGNOSTICS_LOG_INTERVAL
+        try:
+            log.write(self.diagnostics.snapshot())
+        except OSError as e:
+            Logger.warning(f"OnlineManager cannot write diagnostics to {log.path}: {e}")
+            self._diagnostics_log = None
+
     # ------------------------------------------------------------------
     # Threading and API Calling Below
     # ------------------------------------------------------------------
-    def register(self):
+    def register(self) -> bool:
         try:
             url = f"{self.base}/register"
-            resp = requests.get(url, timeout=5)
+            resp = self._session.get(url, timeout=REQUEST_TIMEOUT)
             resp.raise_for_status()
             data = resp.json()
             if resp.status_code == 200:
                 self.player_id = data["id"]
+                self._needs_register = False
                 Logger.info(f"OnlineManager registered with id={self.player_id}")
-            else:
-                Logger.error("Registration failed:", data)
+                return True
+            Logger.warning(f"Registration failed: {data}")
         except Exception as e:
+            self.diagnostics.record_failure()
             Logger.warning(f"OnlineManager registration error: {e}")
-        return
+        return False
 
-    def update(self, x: float, y: float, map_name: str) -> bool:
+    def _player_not_found(self) -> None:
+        # The server forgot us (timed out or restarted); the poller registers again
+        if not self._needs_register:
+            Logger.warning("OnlineManager player not found on server, registering again")
+        self._needs_register = True
+
+    def update(self, x: float, y: float, map_name: str, direction: Direction | None = None,
+               velocity: Position | None = None) -> bool:
+        """
+        Queue our position for the sender thread; never blocks on the network.
+        With a velocity, frames the others can predict are not sent at all.
+        """
+        moving = self._interest is not None and self._interest != (map_name, x, y)
+        self._interest = (map_name, x, y)
+        dir_byte = pack_dir(direction.name.lower() if direction else "none", moving)
         if self.player_id == -1:
             # Try to register again
             return False
-        
+
+        reported = None
+        if velocity is not None:
+            # On the binary format's grid, which is all the server keeps anyway
+            reported = (quantize_velocity(velocity.x) / COORD_SCALE, quantize_velocity(velocity.y) / COORD_SCALE)
+        update = (x, y, map_name, dir_byte, reported)
+        if update[4] is not None:
+            now = time.monotonic()
+            if self._predictable(update, now):
+                self.reckoned_updates += 1
+                return True
+            self._reckoned = (now, update)
+
+        with self._lock:
+            if self._pending_update is not None:
+                self.collapsed_updates += 1
+            self._pending_update = update
+        self._send_event.set()
+        return True
+
+    def _predictable(self, update: LocalUpdate, now: float) -> bool:
+        # Whether the others, extrapolating the last update we sent, still see us where we are
+        if self._reckoned is None:
+            return False
+        sent_at, (sx, sy, smap, sdir, (svx, svy)) = self._reckoned
+        x, y, map_name, dir_byte, (vx, vy) = update
+        if map_name != smap or dir_byte != sdir:
+            return False
+        if abs(vx - svx) > DEAD_RECKONING_SPEED_TOLERANCE or abs(vy - svy) > DEAD_RECKONING_SPEED_TOLERANCE:
+            return False
+        elapsed = now - sent_at
+        # Standing still too: the server only keeps players it hears from
+        if elapsed >= DEAD_RECKONING_HEARTBEAT:
+            return False
+        dx = sx + svx * elapsed - x
+        dy = sy + svy * elapsed - y
+        return dx * dx + dy * dy <= DEAD_RECKONING_DRIFT * DEAD_RECKONING_DRIFT
+
+    def _send_loop(self) -> None:
+        while not self._stop_event.is_set():
+            # Wakes up for the diagnostics log even while we stand still
+            self._send_event.wait(DIAGNOSTICS_LOG_INTERVAL if self._diagnostics_log else None)
+            self._send_event.clear()
+            self._write_diagnostics()
+            with self._lock:
+                update, self._pending_update = self._pending_update, None
+            if update is None:
+                continue
+            self.sent_updates += 1
+            self._send_update(*update)
+
+    def _send_update(self, x: float, y: float, map_name: str, dir_byte: int,
+                     velocity: tuple[float, float] | None) -> bool:
+        if self.is_streaming:
+            return self._stream_update(x, y, map_name, dir_byte, velocity)
+
+        if self._exchange_supported is not False:
+            # The poller sends it with its next /exchange round trip
+            with self._lock:
+                self._outbox.append((x, y, map_name, dir_byte, velocity))
+                del self._outbox[:-MAX_EXCHANGE_BATCH]
+            self._poll_wake.set()
+            return True
+
         url = f"{self.base}/players"
-        body = {"id": self.player_id, "x": x, "y": y, "map": map_name}
         try:
-            resp = requests.post(url, json=body, timeout=5)
-            if resp.status_code == 200:
+            if self._binary_server:
+                map_id = self._map_ids.get(map_name, MAP_UNKNOWN)
+                resp = self._session.post(
+                    url, data=encode_update(self.player_id, x, y, map_id, dir_byte, map_name, velocity),
+                    headers={"Content-Type": BINARY_CONTENT_TYPE}, timeout=REQUEST_TIMEOUT
+                )
+            else:
+                body = self._update_json(x, y, map_name, dir_byte, velocity)
+                body["id"] = self.player_id
+                resp = self._session.post(url, json=body, timeout=REQUEST_TIMEOUT)
+            if resp.status_code in (200, 204):
                 return True
+            if resp.status_code == 429:
+                # Rate limited: a newer position follows with the next frame
+                return False
+            if resp.status_code == 404 and resp.json().get("error") == "player_not_found":
+                self._player_not_found()
+                return False
+            self.diagnostics.record_failure()
             Logger.warning(f"Update failed: {resp.status_code} {resp.text}")
         except Exception as e:
+            self.diagnostics.record_failure()
             if self._on_error:
                 try:
                     self._on_error(e)
@@ -84,27 +381,404 @@ class OnlineManager:
             daemon=True
         )
         self._thread.start()
+        self._sender = threading.Thread(
+            target=self._send_loop,
+            name="OnlineManagerSender",
+            daemon=True
+        )
+        self._sender.start()
 
     def stop(self) -> None:
         self._stop_event.set()
+        self._send_event.set()
+        self._poll_wake.set()
+        sock = self._stream_sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout=2)
+        if self._sender and self._sender.is_alive():
+            self._sender.join(timeout=2)
+        # Drops the kept-alive connections; the session reconnects if we start again
+        self._session.close()
+        if self._recorder is not None:
+            self._recorder.close()
 
     def _loop(self) -> None:
-        while not self._stop_event.wait(POLL_INTERVAL):
-            self._fetch_players()
-            
-    def _fetch_players(self) -> None:
+        while not self._stop_event.is_set():
+            if self.player_id == -1 or self._needs_register:
+                if not self.register():
+                    self._wait_after_error()
+                    continue
+                self._failures = 0
+                self._last_sent_state = None
+                self._reckoned = None
+                # Open the stream for the new id right away
+                self._next_stream_attempt = 0.0
+            if GameSettings.ONLINE_STREAMING and time.monotonic() >= self._next_stream_attempt:
+                self._run_stream()
+                # Whatever ended the stream, poll over HTTP for a while before retrying
+                self._next_stream_attempt = time.monotonic() + STREAM_RETRY_INTERVAL
+                continue
+            if self._exchange_supported is not False:
+                changed = self._exchange()
+            else:
+                changed = self._fetch_players()
+            if changed is None:
+                self._wait_after_error()
+                continue
+            if self._failures:
+                Logger.info(f"OnlineManager reached the server again after {self._failures} failed requests")
+                self._failures = 0
+            self._wait_for_next_poll(changed)
+
+    def _wait_for_next_poll(self, changed: bool) -> None:
+        if self._retry_after:
+            # Rate limited: not a failure, just wait as long as the server asked
+            wait, self._retry_after = self._retry_after, 0.0
+            self._stop_event.wait(wait)
+            return
+        # Fast while nearby players move or we have updates to send, slower after every quiet poll
+        with self._lock:
+            sending = bool(self._outbox)
+        if sending or (changed and self._remote_players):
+            self.poll_interval = POLL_INTERVAL
+        else:
+            self.poll_interval = min(IDLE_POLL_INTERVAL, self.poll_interval * POLL_SLOWDOWN)
+        started = time.monotonic()
+        self._poll_wake.clear()
+        if self._poll_wake.wait(self.poll_interval):
+            # Woken by a queued update: poll soon, but never faster than POLL_INTERVAL
+            self.poll_interval = POLL_INTERVAL
+            self._stop_event.wait(max(0.0, POLL_INTERVAL - (time.monotonic() - started)))
+
+    def _wait_after_error(self) -> None:
+        self._failures += 1
+        backoff = min(MAX_ERROR_BACKOFF, ERROR_BACKOFF * 2 ** (self._failures - 1))
+        self.poll_interval = random.uniform(backoff / 2, backoff)
+        self._stop_event.wait(self.poll_interval)
+
+    def _log_failure(self, message: str) -> None:
+        self.diagnostics.record_failure()
+        # Only the first failure of a streak is worth a warning
+        if self._failures == 0:
+            Logger.warning(message)
+        else:
+            Logger.debug(message)
+
+    def _fetch_players(self) -> bool | None:
+        """Poll /players; returns whether anything changed, or None if the request failed."""
         try:
             url = f"{self.base}/players"
-            resp = requests.get(url, timeout=5)
+            params = self._poll_params()
+            resp = self._session.get(url, params=params, headers=self._poll_headers(params), timeout=REQUEST_TIMEOUT)
             resp.raise_for_status()
-            all_players = resp.json().get("players", [])
+            return self._apply_response(resp)
 
-            pid = self.player_id
-            filtered = [p for key, p in all_players.items() if int(key) != pid]
-            with self._lock:
-                self.list_players = filtered
-            
         except Exception as e:
-            Logger.warning(f"OnlineManager fetch error: {e}")
\ No newline at end of file
+            self._log_failure(f"OnlineManager fetch error: {e}")
+            return None
+
+    def _exchange(self) -> bool | None:
+        # Send our queued updates and receive everyone else's in one round trip
+        with self._lock:
+            updates, self._outbox = self._outbox, []
+        try:
+            url = f"{self.base}/exchange"
+            params = self._poll_params()
+            headers = self._poll_headers(params)
+            if self._binary_server:
+                params["id"] = self.player_id
+                headers["Content-Type"] = BINARY_CONTENT_TYPE
+                body = b"".join(
+                    encode_update(self.player_id, x, y, self._map_ids.get(m, MAP_UNKNOWN), d, m, v)
+                    for x, y, m, d, v in updates
+                )
+                resp = self._session.post(url, params=params, data=body, headers=headers, timeout=REQUEST_TIMEOUT)
+            else:
+                body = {
+                    "id": self.player_id,
+                    "updates": [self._update_json(*u) for u in updates],
+                }
+                resp = self._session.post(url, params=params, json=body, headers=headers, timeout=REQUEST_TIMEOUT)
+
+            if resp.status_code == 404:
+                error = resp.json().get("error")
+                if error == "player_not_found":
+                    self._player_not_found()
+                elif error == "not_found":
+                    Logger.info("Server has no /exchange, sending updates separately")
+                    self._exchange_supported = False
+                    self._requeue(updates)
+                else:
+                    Logger.warning(f"Exchange failed: {resp.text}")
+                return False
+            if resp.status_code == 429:
+                # Refused before anything was applied: send the updates again once allowed
+                self._requeue(updates)
+                self._retry_after = self._parse_retry_after(resp)
+                return False
+            resp.raise_for_status()
+            self._exchange_supported = True
+            return self._apply_response(resp)
+
+        except Exception as e:
+            self._requeue(updates)
+            self._log_failure(f"OnlineManager exchange error: {e}")
+            return None
+
+    @staticmethod
+    def _parse_retry_after(resp: requests.Response) -> float:
+        try:
+            return max(0.0, float(resp.headers.get("Retry-After", "")))
+        except ValueError:
+            return ERROR_BACKOFF
+
+    @staticmethod
+    def _update_json(x: float, y: float, map_name: str, dir_byte: int, velocity: tuple[float, float] | None) -> dict:
+        body = {"x": x, "y": y, "map": map_name, "dir": dir_byte}
+        if velocity is not None:
+            body["vx"], body["vy"] = velocity
+        return body
+
+    def _requeue(self, updates: list[LocalUpdate]) -> None:
+        # Put unsent updates back in front of anything queued meanwhile
+        with self._lock:
+            self._outbox = (updates + self._outbox)[-MAX_EXCHANGE_BATCH:]
+
+    def _poll_params(self) -> dict:
+        params = {}
+        if self._poll_epoch is not None and not self._area_resync:
+            params.update(since=self._poll_seq, epoch=self._poll_epoch)
+        radius = GameSettings.ONLINE_INTEREST_RADIUS
+        interest = self._interest
+        if radius and interest is not None:
+            params.update(map=interest[0], x=interest[1], y=interest[2], radius=radius)
+        return params
+
+    def _poll_headers(self, params: dict) -> dict:
+        headers = {}
+        if GameSettings.ONLINE_BINARY:
+            headers["Accept"] = f"{BINARY_CONTENT_TYPE}, application/json"
+        if self._poll_etag is not None and "since" not in params and "map" not in params:
+            headers["If-None-Match"] = self._poll_etag
+        return headers
+
+    def _apply_response(self, resp: requests.Response) -> bool:
+        """Applies a poll answer and returns whether any remote player changed."""
+        self.diagnostics.record_snapshot()
+        if resp.status_code == 304:
+            return False
+        self._poll_etag = resp.headers.get("ETag")
+        if resp.headers.get("Content-Type") == BINARY_CONTENT_TYPE:
+            data = decode_state(resp.content)
+            self._binary_server = True
+            self._map_ids = {name: i for i, name in enumerate(data["maps"])}
+        else:
+            data = resp.json()
+
+        if "ids" in data:
+            changed = self._apply_area(data.get("players", {}), data["ids"])
+        else:
+            # A server without delta support always answers with the full list
+            changed = self._apply_players(data.get("players", {}), data.get("removed", []), data.get("full", True))
+        self.server_tick = data.get("tick")
+        self._poll_epoch = data.get("epoch")
+        self._poll_seq = data.get("seq", 0)
+        return changed
+
+    # ------------------------------------------------------------------
+    # Streaming channel
+    # ------------------------------------------------------------------
+    def _run_stream(self) -> None:
+        if self.player_id == -1:
+            return
+        try:
+            sock, reader = self._open_stream()
+        except (OSError, ProtocolError) as e:
+            self.diagnostics.record_failure()
+            Logger.warning(f"OnlineManager stream unavailable, polling instead: {e}")
+            return
+
+        Logger.info("OnlineManager streaming player updates")
+        if self._recorder is not None:
+            self._recorder.record("open", id=self.player_id)
+        self._last_sent_state = None
+        # The next update() goes out instead of being dead reckoned from one sent over HTTP
+        self._reckoned = None
+        self._stream_sock = sock
+        self._ping_sent = None
+        last_received = last_ping = time.monotonic()
+        counted = 0
+        try:
+            self._stream_send({
+                "type": "hello", "id": self.player_id,
+                "radius": GameSettings.ONLINE_INTEREST_RADIUS or None,
+            })
+            # Updates queued for an /exchange that will not happen while we stream
+            with self._lock:
+                queued, self._outbox = self._outbox, []
+            if queued:
+                self._stream_update(*queued[-1])
+            while not self._stop_event.is_set():
+                try:
+                    msg = reader.read()
+                except socket.timeout:
+                    msg = {}
+                if msg is None:
+                    if not self._stop_event.is_set():
+                        Logger.warning("OnlineManager stream closed by server")
+                    return
+
+                now = time.monotonic()
+                self.diagnostics.record_received(reader.received - counted)
+                counted = reader.received
+                if msg:
+                    last_received = now
+                    # Every change is pushed right away, so any frame means our copy is current
+                    self.diagnostics.record_snapshot()
+                    if self._recorder is not None:
+                        self._recorder.record("recv", msg=msg)
+                    self._handle_stream_message(msg)
+                elif now - last_received >= HEARTBEAT_TIMEOUT:
+                    Logger.warning("OnlineManager stream timed out")
+                    return
+                # Pinging on a fixed interval, not only when idle, keeps RTT samples coming while we move
+                if now - last_ping >= HEARTBEAT_INTERVAL:
+                    last_ping = self._ping_sent = now
+                    self._stream_send({"type": "ping"})
+        except (OSError, ProtocolError) as e:
+            if not self._stop_event.is_set():
+                self.diagnostics.record_failure()
+                Logger.warning(f"OnlineManager stream error: {e}")
+        finally:
+            self._stream_sock = None
+            sock.close()
+            if self._recorder is not None:
+                self._recorder.record("close")
+
+    def _open_stream(self) -> tuple[socket.socket, FrameReader]:
+        url = urlsplit(self.base)
+        host = url.hostname or "localhost"
+        port = url.port or 80
+        sock = socket.create_connection((host, port), timeout=REQUEST_TIMEOUT[0])
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(
+                f"GET {STREAM_PATH} HTTP/1.1\r\n"
+                f"Host: {host}:{port}\r\n"
+                f"Connection: Upgrade\r\n"
+                f"Upgrade: {STREAM_UPGRADE}\r\n\r\n".encode("ascii")
+            )
+            response = b""
+            while b"\r\n\r\n" not in response:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise ProtocolError("connection closed during upgrade")
+                response += chunk
+            head, rest = response.split(b"\r\n\r\n", 1)
+            status_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+            if " 101 " not in f"{status_line} ":
+                raise ProtocolError(f"upgrade refused: {status_line}")
+            # Short reads let the loop send heartbeats while nothing arrives
+            sock.settimeout(HEARTBEAT_INTERVAL)
+            return sock, FrameReader(sock, rest)
+        except Exception:
+            sock.close()
+            raise
+
+    def _stream_send(self, msg: dict) -> None:
+        sock = self._stream_sock
+        if sock is None:
+            raise OSError("stream is not connected")
+        data = encode_frame(msg)
+        if self._recorder is not None:
+            self._recorder.record("send", msg=msg)
+        with self._stream_send_lock:
+            sock.sendall(data)
+        self.diagnostics.record_request(len(data), 0)
+
+    def _stream_update(self, x: float, y: float, map_name: str, dir_byte: int,
+                       velocity: tuple[float, float] | None) -> bool:
+        # Only changes go over the stream; the heartbeat keeps an idle player alive
+        state = (x, y, map_name, dir_byte, velocity)
+        if state == self._last_sent_state:
+            return True
+        try:
+            self._stream_send({"type": "position", **self._update_json(*state)})
+        except OSError as e:
+            self.diagnostics.record_failure()
+            Logger.warning(f"Online stream update error: {e}")
+            return False
+        self._last_sent_state = state
+        return True
+
+    def _handle_stream_message(self, msg: dict) -> None:
+        kind = msg.get("type")
+        if kind == "players":
+            self.server_tick = msg.get("tick")
+            self._apply_players(msg.get("players", {}), msg.get("removed", []), msg.get("full", False))
+        elif kind == "pong":
+            if self._ping_sent is not None:
+                self.diagnostics.record_rtt(time.monotonic() - self._ping_sent)
+                self._ping_sent = None
+        elif kind == "error":
+            if msg.get("error") == "player_not_found":
+                self._player_not_found()
+                # Ends the stream; the poller registers again and reconnects
+                self._stream_sock.shutdown(socket.SHUT_RDWR)
+                return
+            Logger.warning(f"OnlineManager stream error from server: {msg.get('error')}")
+
+    def _apply_players(self, players: dict, removed: list, full: bool) -> bool:
+        # Polling and streaming both run on the OnlineManager thread, so _remote_players needs no lock
+        if not full and not players and not removed:
+            return False
+        previous = self._remote_players
+        updated = {int(key): p for key, p in players.items()}
+        updated.pop(self.player_id, None)
+        if full:
+            remote = dict(updated)
+            gone = previous.keys() - remote.keys()
+            changed = remote != previous
+        else:
+            remote = previous
+            remote.update(updated)
+            gone = {int(key) for key in removed}
+            for pid in gone:
+                remote.pop(pid, None)
+            changed = True
+        self._publish(remote, updated, gone)
+        return changed
+
+    def _apply_area(self, players: dict, ids: list[int]) -> bool:
+        # "ids" is everyone in our area; unchanged entries come from what we already have
+        incoming = {int(key): p for key, p in players.items()}
+        previous = self._remote_players
+        remote = {}
+        missing = False
+        for pid in ids:
+            if pid == self.player_id:
+                continue
+            p = incoming.get(pid) or previous.get(pid)
+            if p is None:
+                # Walked towards a player that has not moved, ask for the whole area next time
+                missing = True
+                continue
+            remote[pid] = p
+        self._area_resync = missing
+        updated = {pid: p for pid, p in incoming.items() if pid in remote}
+        gone = previous.keys() - remote.keys()
+        changed = remote.keys() != previous.keys() or bool(updated)
+        self._publish(remote, updated, gone)
+        return changed
+
+    def _publish(self, remote: dict[int, dict], updated: dict[int, dict], removed: set[int]) -> None:
+        remote.pop(self.player_id, None)
+        self._remote_players = remote
+        with self._lock:
+            self.list_players = list(remote.values())
+            self._interpolated.observe(updated, removed, time.monotonic())
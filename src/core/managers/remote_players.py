@@ -0,0 +1,162 @@
+from collections import deque
+from typing import Iterable
+from server.protocol import unpack_dir
+
+# Newest positions kept per remote player
+MAX_SAMPLES = 8
+# Keep moving a player along its last velocity for at most this long when samples are late
+MAX_EXTRAPOLATION = 0.25
+# Same for a player that reports its velocity and so only sends when its motion
+# changes, at least every DEAD_RECKONING_HEARTBEAT seconds
+MAX_DEAD_RECKONING = 1.0
+# A player that sent nothing for a while was standing still; assume its next
+# step started this long before it arrived
+STEP_INTERVAL = 0.1
+
+class RemotePlayer:
+    """
+    Timestamped positions of one remote player, sampled at a render time
+    that lags behind the newest sample so there is usually a pair to
+    interpolate between.
+    """
+    state: dict
+    map: str
+    samples: deque[tuple[float, float, float]]
+    # Last direction it faced ("none" in the state keeps the previous one),
+    # and since when it has been walking, for its walking animation
+    facing: str
+    moving_since: float | None
+
+    def __init__(self, state: dict, now: float):
+        self.state = state
+        self.map = state["map"]
+        self.samples = deque([(now, float(state["x"]), float(state["y"]))], maxlen=MAX_SAMPLES)
+        self.facing = "down"
+        self.moving_since = None
+        self._update_motion(now)
+
+    def add(self, state: dict, now: float) -> None:
+        x, y = float(state["x"]), float(state["y"])
+        was_moving = self.is_moving()
+        self.state = state
+        self._update_motion(now)
+        if state["map"] != self.map:
+            # Teleported to another map: nothing to interpolate from
+            self.map = state["map"]
+            self.samples.clear()
+            self.samples.append((now, x, y))
+            return
+        last_time, last_x, last_y = self.samples[-1]
+        if (x, y) == (last_x, last_y):
+            return
+        if now - last_time > 2 * STEP_INTERVAL and not was_moving:
+            # Stood still until just before this step, instead of drifting over the whole pause
+            self.samples.append((now - STEP_INTERVAL, last_x, last_y))
+        self.samples.append((now, x, y))
+
+    def is_moving(self) -> bool:
+        return "vx" in self.state or unpack_dir(int(self.state.get("dir", 0)))[1]
+
+    def _update_motion(self, now: float) -> None:
+        facing, _ = unpack_dir(int(self.state.get("dir", 0)))
+        if facing != "none":
+            self.facing = facing
+        if not self.is_moving():
+            self.moving_since = None
+        elif self.moving_since is None:
+            self.moving_since = now
+
+    def position_at(self, t: float) -> tuple[float, float]:
+        samples = self.samples
+        if t <= samples[0][0]:
+            return samples[0][1], samples[0][2]
+
+        newest_time, newest_x, newest_y = samples[-1]
+        if t >= newest_time:
+            if "vx" in self.state:
+                # Dead reckoning from the reported velocity
+                ahead = min(t - newest_time, MAX_DEAD_RECKONING)
+                return newest_x + self.state["vx"] * ahead, newest_y + self.state["vy"] * ahead
+            if not self.is_moving() or len(samples) < 2:
+                return newest_x, newest_y
+            prev_time, prev_x, prev_y = samples[-2]
+            span = newest_time - prev_time
+            ahead = min(t - newest_time, MAX_EXTRAPOLATION)
+            return newest_x + (newest_x - prev_x) / span * ahead, newest_y + (newest_y - prev_y) / span * ahead
+
+        for (t0, x0, y0), (t1, x1, y1) in zip(samples, list(samples)[1:]):
+            if t0 <= t <= t1:
+                k = (t - t0) / (t1 - t0)
+                return x0 + (x1 - x0) * k, y0 + (y1 - y0) * k
+        return newest_x, newest_y
+
+class RemotePlayers:
+    """
+    Remote players by id and by map, updated with only the entries that
+    changed in each player list the server sends, so drawing one map never
+    looks at the players on the others.
+    """
+    delay: float
+    _players: dict[int, RemotePlayer]
+    _by_map: dict[str, dict[int, RemotePlayer]]
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._players = {}
+        self._by_map = {}
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def observe(self, updated: dict[int, dict], removed: Iterable[int], now: float) -> None:
+        players = self._players
+        for pid in removed:
+            player = players.pop(pid, None)
+            if player is not None:
+                self._unindex(pid, player.map)
+        for pid, state in updated.items():
+            player = players.get(pid)
+            if player is None:
+                player = players[pid] = RemotePlayer(state, now)
+                self._by_map.setdefault(player.map, {})[pid] = player
+            elif player.state is not state:
+                old_map = player.map
+                player.add(state, now)
+                if player.map != old_map:
+                    self._unindex(pid, old_map)
+                    self._by_map.setdefault(player.map, {})[pid] = player
+
+    def _unindex(self, pid: int, map_name: str) -> None:
+        on_map = self._by_map[map_name]
+        del on_map[pid]
+        if not on_map:
+            del self._by_map[map_name]
+
+    def position_at(self, player: RemotePlayer, now: float) -> tuple[float, float]:
+        if self.delay <= 0:
+            _, x, y = player.samples[-1]
+            return x, y
+        return player.position_at(now - self.delay)
+
+    def sample(self, now: float) -> list[dict]:
+        """Every player as drawn at `now`: the server state with x and y interpolated."""
+        result = []
+        for player in self._players.values():
+            x, y = self.position_at(player, now)
+            result.append({**player.state, "x": x, "y": y})
+        return result
+
+    def visible(self, map_name: str, now: float, left: float, top: float, right: float, bottom: float) -> list[dict]:
+        """
+        Players on `map_name` whose drawn position lies inside the given
+        world rectangle, with "facing" and "walking" (seconds since they
+        started walking, None while standing) added for their animation.
+        """
+        result = []
+        for player in self._by_map.get(map_name, {}).values():
+            x, y = self.position_at(player, now)
+            if left <= x < right and top <= y < bottom:
+                since = player.moving_since
+                result.append({**player.state, "x": x, "y": y, "facing": player.facing,
+                               "walking": None if since is None else now - since})
+        return result
@@ -0,0 +1,112 @@
+'''
+Recording of what an OnlineManager exchanges with the server, for replaying
+it with benchmarks/replay.py. The file is gzipped JSON lines, one event per
+line, "t" being seconds since the recorder was created:
+
+    {"t": 0.51, "kind": "http", "method": "POST", "path": "/exchange?since=3",
+     "request": {...}, "status": 200, "headers": {...}, "response": {...}, "elapsed": 0.002}
+    {"t": 0.60, "kind": "open", "id": 3}          stream connected as player 3
+    {"t": 0.61, "kind": "send", "msg": {...}}     stream frame to the server
+    {"t": 0.62, "kind": "recv", "msg": {...}}     stream frame from the server
+    {"t": 3.00, "kind": "close"}                  stream ended
+
+A body is {"type": content type, "text": ...} when it is UTF-8 and
+{"type": ..., "base64": ...} otherwise.
+'''
+import base64
+import gzip
+import json
+import threading
+import time
+
+import requests
+
+# Response headers the replaying server sends back
+KEPT_HEADERS = ("Content-Type", "ETag", "Retry-After")
+
+def encode_body(data: bytes | str | None, content_type: str | None) -> dict | None:
+    if not data:
+        return None
+    body = {"type": content_type} if content_type else {}
+    if isinstance(data, str):
+        body["text"] = data
+        return body
+    try:
+        body["text"] = data.decode("utf-8")
+    except UnicodeDecodeError:
+        body["base64"] = base64.b64encode(data).decode("ascii")
+    return body
+
+def decode_body(body: dict | None) -> bytes:
+    if body is None:
+        return b""
+    if "base64" in body:
+        return base64.b64decode(body["base64"])
+    return body["text"].encode("utf-8")
+
+def read_recording(path: str) -> list[dict]:
+    """All events of a recording, in the order they happened."""
+    events = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                events.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            # Recorded by a game that was killed: keep what made it to disk
+            pass
+    events.sort(key=lambda e: e["t"])
+    return events
+
+class SessionRecorder:
+    """
+    Appends events to a recording. The file is opened on the first event
+    and closed by close(), so every start()/stop() of the OnlineManager
+    adds one complete gzip member. Events come from the poller, the sender
+    and the stream threads, hence the lock.
+    """
+    path: str
+    _start: float
+    _file: gzip.GzipFile | None
+    _created: bool
+    _lock: threading.Lock
+
+    def __init__(self, path: str):
+        self.path = path
+        self._start = time.monotonic()
+        self._file = None
+        self._created = False
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, **fields) -> None:
+        line = json.dumps({"t": round(time.monotonic() - self._start, 4), "kind": kind, **fields},
+                          separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                # A new recorder starts a new recording, later members are appended
+                self._file = gzip.open(self.path, "at" if self._created else "wt", encoding="utf-8")
+                self._created = True
+            self._file.write(line + "\n")
+
+    def record_http(self, resp: requests.Response, *args, **kwargs) -> None:
+        """Session response hook."""
+        request = resp.request
+        event = {
+            "method": request.method,
+            "path": request.path_url,
+            "status": resp.status_code,
+            "headers": {name: resp.headers[name] for name in KEPT_HEADERS if name in resp.headers},
+            "elapsed": round(resp.elapsed.total_seconds(), 4),
+        }
+        sent = encode_body(request.body, request.headers.get("Content-Type"))
+        if sent is not None:
+            event["request"] = sent
+        received = encode_body(resp.content, resp.headers.get("Content-Type"))
+        if received is not None:
+            event["response"] = received
+        self.record("http", **event)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
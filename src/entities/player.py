@@ -10,9 +10,12 @@ from typing import override
 class Player(Entity):
     speed: float = 4.0 * GameSettings.TILE_SIZE
     game_manager: GameManager
+    # Pixels per second the player walks at, 0 along an axis a collision blocked
+    velocity: Position
     def __init__(self, x: float, y: float, game_manager: GameManager) -> None:
         super().__init__(x, y, game_manager)
         self.cooldown = 0.0
+        self.velocity = Position(0, 0)
 
     def _set_direction(self, direction: Direction):
         if self.direction == direction:
@@ -51,7 +54,8 @@ class Player(Entity):
         if movement_vector.length_squared() > 0:
             movement_vector = movement_vector.normalize()
 
-        to_move = self.speed * dt * 1.5
+        walk_speed = self.speed * 1.5
+        to_move = walk_speed * dt
     
 
         self.position.x += movement_vector.x * to_move 
@@ -61,7 +65,8 @@ class Player(Entity):
                               GameSettings.TILE_SIZE,
                               GameSettings.TILE_SIZE)
         
-        if self.game_manager.current_map.check_collision(player_rect):
+        blocked_x = self.game_manager.current_map.check_collision(player_rect)
+        if blocked_x:
             self.position.x -= movement_vector.x * to_move
             self.position.x = self._snap_to_grid(self.position.x)
 
@@ -70,10 +75,18 @@ class Player(Entity):
         player_rect.x = self.position.x
         player_rect.y = self.position.y
 
-        if self.game_manager.current_map.check_collision(player_rect):
+        blocked_y = self.game_manager.current_map.check_collision(player_rect)
+        if blocked_y:
             self.position.y -= movement_vector.y * to_move
             self.position.y = self._snap_to_grid(self.position.y) #make it so that it snaps to the grid perfectly
 
+        # From the walking speed rather than the distance moved / dt, which carries
+        # float noise and would read as a new velocity every frame
+        self.velocity = Position(
+            0.0 if blocked_x else movement_vector.x * walk_speed,
+            0.0 if blocked_y else movement_vector.y * walk_speed,
+        )
+
         # Check teleportation
         if self.cooldown > 0:
             self.cooldown -= dt
@@ -0,0 +1,67 @@
+import pygame as pg
+from src.core import OnlineManager
+from src.core.services import resource_manager
+
+# The text is rendered again this often, not every frame
+REFRESH_INTERVAL = 0.25
+FONT_SIZE = 18
+PADDING = 8
+TEXT_COLOR = (255, 255, 255)
+BACKGROUND = (0, 0, 0, 160)
+
+class NetworkOverlay:
+    """OnlineManager network diagnostics in the top-left corner of the screen."""
+    visible: bool
+    font: pg.font.Font
+    surface: pg.Surface | None
+    _since_refresh: float
+
+    def __init__(self):
+        self.visible = False
+        self.font = resource_manager.get_font("Minecraft.ttf", FONT_SIZE)
+        self.surface = None
+        self._since_refresh = REFRESH_INTERVAL
+
+    def toggle(self) -> None:
+        self.visible = not self.visible
+        self._since_refresh = REFRESH_INTERVAL
+
+    def update(self, dt: float, online_manager: OnlineManager | None) -> None:
+        if not self.visible:
+            return
+        self._since_refresh += dt
+        if self._since_refresh < REFRESH_INTERVAL:
+            return
+        self._since_refresh = 0.0
+        self.surface = self._render(self._lines(online_manager))
+
+    def _lines(self, online_manager: OnlineManager | None) -> list[str]:
+        if online_manager is None:
+            return ["Offline"]
+        stats = online_manager.diagnostics.snapshot()
+        age = stats["snapshot_age_s"]
+        channel = "stream" if online_manager.is_streaming else f"poll every {online_manager.poll_interval:.2f} s"
+        return [
+            f"Player {online_manager.player_id}  {channel}",
+            f"RTT p50/p95/p99  {stats['rtt_p50_ms']:.1f} / {stats['rtt_p95_ms']:.1f} / {stats['rtt_p99_ms']:.1f} ms",
+            f"Requests  {stats['requests_per_s']:.1f}/s  {stats['requests']} total  {stats['failures']} failed",
+            f"In  {stats['bytes_in_per_s'] / 1024:.1f} KB/s   Out  {stats['bytes_out_per_s'] / 1024:.1f} KB/s",
+            f"Snapshot age  {'-' if age < 0 else f'{age:.2f} s'}",
+            f"Remote players  {len(online_manager.list_players)}",
+        ]
+
+    def _render(self, lines: list[str]) -> pg.Surface:
+        texts = [self.font.render(line, True, TEXT_COLOR) for line in lines]
+        width = max(t.get_width() for t in texts) + 2 * PADDING
+        height = sum(t.get_height() for t in texts) + 2 * PADDING
+        surface = pg.Surface((width, height), pg.SRCALPHA)
+        surface.fill(BACKGROUND)
+        y = PADDING
+        for text in texts:
+            surface.blit(text, (PADDING, y))
+            y += text.get_height()
+        return surface
+
+    def draw(self, screen: pg.Surface) -> None:
+        if self.visible and self.surface is not None:
+            screen.blit(self.surface, (PADDING, PADDING))
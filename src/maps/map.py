@@ -1,8 +1,15 @@
 import pygame as pg
 import pytmx
+from collections import OrderedDict
 
 from src.utils import load_tmx, Position, GameSettings, PositionCamera, Teleport
 
+# The map is prebaked in square chunks of this many tiles, baked when they first come into view
+CHUNK_TILES = 8
+# Most baked chunks kept; the least recently drawn ones are dropped first.
+# Twice what a screen needs, so walking back and forth does not bake again
+MAX_CACHED_CHUNKS = 24
+
 class Map:
     # Map Properties
     path_name: str
@@ -11,7 +18,16 @@ class Map:
     spawn: Position
     teleporters: list[Teleport]
     # Rendering Properties
-    _surface: pg.Surface
+    # Baked chunks by (column, row), None for a chunk without any tile
+    _chunks: OrderedDict[tuple[int, int], pg.Surface | None]
+    _chunk_size: int
+    _chunk_cols: int
+    _chunk_rows: int
+    # Tile images scaled to TILE_SIZE, by gid
+    _tile_images: dict[int, pg.Surface | None]
+    # One byte per tile, row by row, non-zero where a collision or house layer has a tile
+    _blocked: bytearray
+    # The same tiles as rects, for debug drawing and anyone iterating them
     _collision_map: list[pg.Rect]
     _bushmap: list[pg.Rect]
 
@@ -24,13 +40,14 @@ class Map:
         self.teleporters = tp
         self._raw_data = raw_data or {}  # ← Store it
 
-        pixel_w = self.tmxdata.width * GameSettings.TILE_SIZE
-        pixel_h = self.tmxdata.height * GameSettings.TILE_SIZE
-
-        # Prebake the map
-        self._surface = pg.Surface((pixel_w, pixel_h), pg.SRCALPHA)
-        self._render_all_layers(self._surface)
+        # Chunks are baked lazily in draw()
+        self._chunks = OrderedDict()
+        self._chunk_size = CHUNK_TILES * GameSettings.TILE_SIZE
+        self._chunk_cols = -(-self.tmxdata.width // CHUNK_TILES)
+        self._chunk_rows = -(-self.tmxdata.height // CHUNK_TILES)
+        self._tile_images = {}
         # Prebake the collision map
+        self._blocked = self._create_collision_grid()
         self._collision_map = self._create_collision_map()
         self._bushmap = self._create_bushmap()
 
@@ -38,15 +55,33 @@ class Map:
         return
 
     def draw(self, screen: pg.Surface, camera: PositionCamera):
-        screen.blit(self._surface, camera.transform_position(Position(0, 0)))
+        # Only the chunks overlapping the screen
+        size = self._chunk_size
+        first_col = max(0, camera.x // size)
+        first_row = max(0, camera.y // size)
+        last_col = min(self._chunk_cols - 1, (camera.x + screen.get_width() - 1) // size)
+        last_row = min(self._chunk_rows - 1, (camera.y + screen.get_height() - 1) // size)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                chunk = self._get_chunk(col, row)
+                if chunk is not None:
+                    screen.blit(chunk, camera.transform_position(Position(col * size, row * size)))
         
         # Draw the hitboxes collision map
         if GameSettings.DRAW_HITBOXES:
-            for rect in self._collision_map:
-                pg.draw.rect(screen, (255, 0, 0), camera.transform_rect(rect), 1)
+            view = pg.Rect(camera.x, camera.y, screen.get_width(), screen.get_height())
+            tile = GameSettings.TILE_SIZE
+            x0, y0, x1, y1 = self._tile_range(view)
+            width = self.tmxdata.width
+            for y in range(y0, y1):
+                for x in range(x0, x1):
+                    if self._blocked[y * width + x]:
+                        rect = pg.Rect(x * tile, y * tile, tile, tile)
+                        pg.draw.rect(screen, (255, 0, 0), camera.transform_rect(rect), 1)
 
             for rect in self._bushmap:
-                pg.draw.rect(screen, (255, 0, 0), camera.transform_rect(rect), 1)
+                if view.colliderect(rect):
+                    pg.draw.rect(screen, (255, 0, 0), camera.transform_rect(rect), 1)
 
         
     def check_collision(self, rect: pg.Rect) -> bool:
@@ -55,10 +90,32 @@ class Map:
         Return True if collide if rect param collide with self._collision_map
         Hint: use API colliderect and iterate each rectangle to check
         '''
-        for coli_rect in self._collision_map:
-            if rect.colliderect(coli_rect):
+        # Only the tiles under the rect, the same overlap test as colliderect
+        x0, y0, x1, y1 = self._tile_range(rect)
+        blocked = self._blocked
+        width = self.tmxdata.width
+        for y in range(y0, y1):
+            row = y * width
+            if any(blocked[row + x0:row + x1]):
                 return True
         return False
+
+    def is_blocked(self, tile_x: int, tile_y: int) -> bool:
+        """Whether the tile has collision; tiles outside the map do not."""
+        if 0 <= tile_x < self.tmxdata.width and 0 <= tile_y < self.tmxdata.height:
+            return bool(self._blocked[tile_y * self.tmxdata.width + tile_x])
+        return False
+
+    def _tile_range(self, rect: pg.Rect) -> tuple[int, int, int, int]:
+        # Tiles overlapped by the rect, clipped to the map: columns [x0, x1) and rows [y0, y1)
+        if rect.width <= 0 or rect.height <= 0:
+            return 0, 0, 0, 0
+        tile = GameSettings.TILE_SIZE
+        x0 = max(0, rect.left // tile)
+        y0 = max(0, rect.top // tile)
+        x1 = min(self.tmxdata.width, (rect.right - 1) // tile + 1)
+        y1 = min(self.tmxdata.height, (rect.bottom - 1) // tile + 1)
+        return x0, y0, max(x0, x1), max(y0, y1)
         
     def check_teleport(self, pos: Position) -> Teleport | None:
         '''[TODO HACKATHON 6] 
@@ -79,41 +136,76 @@ class Map:
                 return tele
         return None
 
-    def _render_all_layers(self, target: pg.Surface) -> None:
+    def _get_chunk(self, col: int, row: int) -> pg.Surface | None:
+        key = (col, row)
+        if key in self._chunks:
+            self._chunks.move_to_end(key)
+            return self._chunks[key]
+        chunk = self._bake_chunk(col, row)
+        self._chunks[key] = chunk
+        if len(self._chunks) > MAX_CACHED_CHUNKS:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def _bake_chunk(self, col: int, row: int) -> pg.Surface | None:
+        tile = GameSettings.TILE_SIZE
+        x0, y0 = col * CHUNK_TILES, row * CHUNK_TILES
+        x1 = min(x0 + CHUNK_TILES, self.tmxdata.width)
+        y1 = min(y0 + CHUNK_TILES, self.tmxdata.height)
+        surface = None
         for layer in self.tmxdata.visible_layers:
-            if isinstance(layer, pytmx.TiledTileLayer):
-                self._render_tile_layer(target, layer)
-            # elif isinstance(layer, pytmx.TiledImageLayer) and layer.image:
-            #     target.blit(layer.image, (layer.x or 0, layer.y or 0))
- 
-    def _render_tile_layer(self, target: pg.Surface, layer: pytmx.TiledTileLayer) -> None:
-        for x, y, gid in layer:
-            if gid == 0:
+            # Image layers are not drawn
+            if not isinstance(layer, pytmx.TiledTileLayer):
                 continue
+            for y in range(y0, y1):
+                data = layer.data[y]
+                for x in range(x0, x1):
+                    image = self._tile_image(data[x])
+                    if image is None:
+                        continue
+                    if surface is None:
+                        surface = pg.Surface(((x1 - x0) * tile, (y1 - y0) * tile), pg.SRCALPHA)
+                    surface.blit(image, ((x - x0) * tile, (y - y0) * tile))
+        return surface
+
+    def _tile_image(self, gid: int) -> pg.Surface | None:
+        if gid == 0:
+            return None
+        if gid not in self._tile_images:
             image = self.tmxdata.get_tile_image_by_gid(gid)
-            if image is None:
-                continue
-
-            image = pg.transform.scale(image, (GameSettings.TILE_SIZE, GameSettings.TILE_SIZE))
-            target.blit(image, (x * GameSettings.TILE_SIZE, y * GameSettings.TILE_SIZE))
+            if image is not None:
+                image = pg.transform.scale(image, (GameSettings.TILE_SIZE, GameSettings.TILE_SIZE))
+            self._tile_images[gid] = image
+        return self._tile_images[gid]
     
-    def _create_collision_map(self) -> list[pg.Rect]:
-        rects = []
+    def _create_collision_grid(self) -> bytearray:
+        width = self.tmxdata.width
+        blocked = bytearray(width * self.tmxdata.height)
         for layer in self.tmxdata.visible_layers:
             if isinstance(layer, pytmx.TiledTileLayer) and ("collision" in layer.name.lower() or "house" in layer.name.lower()):
                 for x, y, gid in layer:
                     if gid != 0:
-                        '''
-                        [TODO HACKATHON 4]
-                        rects.append(pg.Rect(...))
-                        Append the collision rectangle to the rects[] array
-                        Remember scale the rectangle with the TILE_SIZE from settings
-                        '''
-                        rects.append(pg.Rect(
-                            x * GameSettings.TILE_SIZE,
-                            y * GameSettings.TILE_SIZE,
-                            GameSettings.TILE_SIZE, GameSettings.TILE_SIZE
-                        ))
+                        blocked[y * width + x] = 1
+        return blocked
+
+    def _create_collision_map(self) -> list[pg.Rect]:
+        '''
+        [TODO HACKATHON 4]
+        rects.append(pg.Rect(...))
+        Append the collision rectangle to the rects[] array
+        Remember scale the rectangle with the TILE_SIZE from settings
+        '''
+        # One rect per blocked tile of the grid
+        rects = []
+        width = self.tmxdata.width
+        for i, blocked in enumerate(self._blocked):
+            if blocked:
+                y, x = divmod(i, width)
+                rects.append(pg.Rect(
+                    x * GameSettings.TILE_SIZE,
+                    y * GameSettings.TILE_SIZE,
+                    GameSettings.TILE_SIZE, GameSettings.TILE_SIZE
+                ))
         return rects
     
     def _create_bushmap(self) -> list[pg.Rect]:
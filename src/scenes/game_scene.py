@@ -4,19 +4,28 @@ from src.scenes.scene import Scene
 from src.core import GameManager, OnlineManager
 from src.utils import Logger, PositionCamera, GameSettings, Position
 from src.core.services import sound_manager, input_manager
-from src.sprites import Sprite
+from src.sprites import Sprite, Animation
 from typing import override
 from src.interface.components import Button, Popup, Checkbox, Slider, MonsterListComponent, ItemListComponent
 from src.interface.game_ui_manager import GameSceneUIManager
+from src.interface.network_overlay import NetworkOverlay
 
 from src.entities.enemy_trainer import EnemyTrainer   # Existing trainer import
 from src.entities.bush import BushEncounter
 
+# Walking animation of remote players, one set of frames shared by all of them
+ONLINE_SPRITE_SHEET = "character/ow2.png"
+ONLINE_SPRITE_ROWS = ["down", "left", "right", "up"]
+ONLINE_SPRITE_KEYFRAMES = 4
+ONLINE_SPRITE_LOOP = 1.0
+
 class GameScene(Scene):
     game_manager: GameManager
     online_manager: OnlineManager | None
-    sprite_online: Sprite
+    online_frames: dict[str, list[pg.Surface]]
     ui_manager: GameSceneUIManager
+    # Network diagnostics, toggled with F3
+    network_overlay: NetworkOverlay
 
     #stuff in the bags
     wild_encounters: list['BushEncounter']
@@ -32,6 +41,7 @@ class GameScene(Scene):
         
         # Initialize UI Manager
         self.ui_manager = GameSceneUIManager(self)
+        self.network_overlay = NetworkOverlay()
 
 
 
@@ -50,7 +60,10 @@ class GameScene(Scene):
             self.online_manager = OnlineManager()
         else:
             self.online_manager = None
-        self.sprite_online = Sprite("ingame_ui/options1.png", (GameSettings.TILE_SIZE, GameSettings.TILE_SIZE))
+        self.online_frames = Animation.frames(
+            ONLINE_SPRITE_SHEET, ONLINE_SPRITE_ROWS, ONLINE_SPRITE_KEYFRAMES,
+            (GameSettings.TILE_SIZE, GameSettings.TILE_SIZE)
+        )
 
     def _init_state(self) -> None:
         """Initialize scene state variables."""
@@ -158,11 +171,16 @@ class GameScene(Scene):
             _ = self.online_manager.update(
                 self.game_manager.player.position.x, 
                 self.game_manager.player.position.y,
-                self.game_manager.current_map.path_name
+                self.game_manager.current_map.path_name,
+                self.game_manager.player.direction,
+                self.game_manager.player.velocity,
             )
 
         # Update UI
         self.ui_manager.update(dt)
+        if input_manager.key_pressed(pg.K_F3):
+            self.network_overlay.toggle()
+        self.network_overlay.update(dt, self.online_manager)
         
     def trigger_battle(self, enemy_trainer: 'enemy_trainers'):
         from src.core.services import scene_manager
@@ -183,6 +201,20 @@ class GameScene(Scene):
         )
 
 
+    def _draw_online_players(self, screen: pg.Surface, camera: PositionCamera) -> None:
+        # Only players whose tile overlaps the screen are sampled and drawn
+        tile = GameSettings.TILE_SIZE
+        visible = self.online_manager.get_visible_players(
+            self.game_manager.current_map.path_name,
+            camera.x - tile, camera.y - tile,
+            camera.x + GameSettings.SCREEN_WIDTH, camera.y + GameSettings.SCREEN_HEIGHT
+        )
+        for player in visible:
+            frames = self.online_frames.get(player["facing"], self.online_frames[ONLINE_SPRITE_ROWS[0]])
+            walking = player["walking"]
+            idx = 0 if walking is None else int(walking / ONLINE_SPRITE_LOOP * ONLINE_SPRITE_KEYFRAMES) % ONLINE_SPRITE_KEYFRAMES
+            screen.blit(frames[idx], camera.transform_position(Position(player["x"], player["y"])))
+
     @override
     def draw(self, screen: pg.Surface):        
         if self.game_manager.player:
@@ -202,13 +234,8 @@ class GameScene(Scene):
         self.game_manager.bag.draw(screen)
         
         if self.online_manager and self.game_manager.player:
-            list_online = self.online_manager.get_list_players()
-            for player in list_online:
-                if player["map"] == self.game_manager.current_map.path_name:
-                    cam = self.game_manager.player.camera
-                    pos = cam.transform_position_as_position(Position(player["x"], player["y"]))
-                    self.sprite_online.update_pos(pos)
-                    self.sprite_online.draw(screen)
+            self._draw_online_players(screen, camera)
 
         # Draw UI
-        self.ui_manager.draw(screen)
\ No newline at end of file
+        self.ui_manager.draw(screen)
+        self.network_overlay.draw(screen)
\ No newline at end of file
@@ -1,10 +1,14 @@
 import pygame as pg
 
 from .sprite import Sprite
+from src.core.services import resource_manager
 from src.utils import GameSettings, Logger, PositionCamera
 from typing import Optional
 
 class Animation(Sprite):
+    # Scaled frames by (image, rows, keyframes, size), shared by every animation cut from the same sheet
+    _frame_cache: dict[tuple[str, tuple[str, ...], int, tuple[int, int]], dict[str, list[pg.Surface]]] = {}
+
     # Animations
     animations: dict[str, list[pg.Surface]]
     cur_row: str
@@ -20,29 +24,41 @@ class Animation(Sprite):
         loop: float = 1                     # loop in second
     ):
         super().__init__(image_path)
-        sheet_w, sheet_h = self.image.get_size()
-        frame_w = sheet_w // n_keyframes
-        frame_h = sheet_h // len(rows)
-        
+        self.animations = Animation.frames(image_path, rows, n_keyframes, size)
+        self.accumulator = 0
+        self.cur_row = rows[0]
+        self.loop = loop
+        self.n_keyframes = n_keyframes
+        self.rect = pg.Rect(0, 0, GameSettings.TILE_SIZE, GameSettings.TILE_SIZE)
+
+    @classmethod
+    def frames(cls, image_path: str, rows: list[str], n_keyframes: int, size: tuple[int, int]) -> dict[str, list[pg.Surface]]:
+        """The frames of each row of a sprite sheet, cut and scaled once per sheet and size."""
+        key = (image_path, tuple(rows), n_keyframes, tuple(size))
+        cached = cls._frame_cache.get(key)
+        if cached is not None:
+            return cached
+
         if (len(rows) <= 0 or n_keyframes <= 0):
             Logger.error("Invalid number of rows")
-        
-        self.animations = {}
+
+        image = resource_manager.get_image(image_path)
+        sheet_w, sheet_h = image.get_size()
+        frame_w = sheet_w // n_keyframes
+        frame_h = sheet_h // len(rows)
+
+        animations = {}
         for r, name in enumerate(rows):
             anim : list[pg.Surface] = []
             for c in range(n_keyframes):
-                frame = self.image.subsurface(pg.Rect(
+                frame = image.subsurface(pg.Rect(
                     c * frame_w, r * frame_h,
                     frame_w, frame_h
                 ))
                 anim.append(pg.transform.smoothscale(frame, size))
-            self.animations[name] = anim
-            
-        self.accumulator = 0
-        self.cur_row = rows[0]
-        self.loop = loop
-        self.n_keyframes = n_keyframes
-        self.rect = pg.Rect(0, 0, GameSettings.TILE_SIZE, GameSettings.TILE_SIZE)
+            animations[name] = anim
+        cls._frame_cache[key] = animations
+        return animations
             
     def switch(self, name: str):
         if name not in self.animations:
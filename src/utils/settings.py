@@ -16,5 +16,11 @@ class Settings:
     # Online
     IS_ONLINE: bool = False
     ONLINE_SERVER_URL: str = "http://localhost:8989"
+    ONLINE_STREAMING: bool = True   # Push updates over /stream, polling is the fallback
+    ONLINE_INTEREST_RADIUS: int = 1024  # Only receive players this many pixels around us, 0 for everyone
+    ONLINE_BINARY: bool = True      # Ask the server for the compact binary encoding when polling
+    ONLINE_INTERP_DELAY: float = 0.2    # Draw remote players this many seconds in the past, smoothed; 0 draws raw positions
+    ONLINE_DIAGNOSTICS_LOG: str = ""    # Append network diagnostics to this CSV every second, "" to disable
+    ONLINE_RECORD_PATH: str = ""        # Record all traffic with the server to this file for benchmarks.replay, "" to disable
     
 GameSettings = Settings()
\ No newline at end of file